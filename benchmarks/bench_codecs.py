@@ -0,0 +1,57 @@
+"""
+Compares the serialization codecs on a payload mix similar to what the
+repository stores: JSON documents posted to /create, raw bytes, Python
+containers produced by DDO functions, and functions stored by FDOs.
+
+Usage: python benchmarks/bench_codecs.py [repeat]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ddolib import serialization
+
+
+def payload_mix():
+    record = {"name": "sample", "tags": ["a", "b", "c"], "score": 0.75, "valid": True, "parent": None}
+    return {
+        "json_small": record,
+        "json_large": {"records": [dict(record, id=i) for i in range(5000)]},
+        "bytes": os.urandom(256 * 1024),
+        "tuple_table": [(i, float(i) / 3, str(i)) for i in range(5000)],
+        "function": lambda x: x * 2,
+    }
+
+
+def bench(codec, value, repeat):
+    payload = serialization.get_codec(codec).encode(value)
+    lossless = callable(value) or serialization.get_codec(codec).decode(payload) == value
+    start = time.perf_counter()
+    for _ in range(repeat):
+        serialization.get_codec(codec).encode(value)
+    encode_time = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        serialization.get_codec(codec).decode(payload)
+    decode_time = (time.perf_counter() - start) / repeat
+    return len(payload), encode_time, decode_time, lossless
+
+
+def main(repeat=20):
+    print(f"{'payload':<14}{'codec':<8}{'bytes':>10}{'encode ms':>12}{'decode ms':>12}")
+    for name, value in payload_mix().items():
+        auto, _ = serialization.encode(value)
+        for codec in serialization.available_codecs():
+            try:
+                size, encode_time, decode_time, lossless = bench(codec, value, repeat)
+            except Exception:
+                continue
+            marker = " *" if codec == auto else (" (lossy)" if not lossless else "")
+            print(f"{name:<14}{codec:<8}{size:>10}{encode_time * 1000:>12.3f}{decode_time * 1000:>12.3f}{marker}")
+    print("* codec chosen by automatic selection")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
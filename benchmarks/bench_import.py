@@ -0,0 +1,76 @@
+"""
+Measures the cost of `import ddolib` with `python -X importtime` in a fresh
+interpreter, lists the slowest modules, and fails when the import exceeds
+the budget, pulls in an optional heavy dependency, or creates files.
+
+The import runs in an empty temporary directory, so a database file created
+as a side effect of importing is detected.
+
+Usage: python benchmarks/bench_import.py [--budget-ms MS] [--repeat N] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules only needed by the web server, the asyncio repository or the visualizations.
+HEAVY_MODULES = ("flask", "matplotlib", "networkx", "adjustText", "streamlit", "aiosqlite", "aiomysql")
+
+PROBE = "import sys, ddolib; print(','.join(m for m in {modules!r} if m in sys.modules))"
+
+
+def import_once(directory):
+    environment = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(modules=HEAVY_MODULES)],
+        cwd=directory, env=environment, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            timings[name.strip()] = int(cumulative) / 1000.0
+        except ValueError:
+            continue  # header line
+    loaded = [module for module in completed.stdout.strip().split(",") if module]
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="maximum cumulative import time of ddolib")
+    parser.add_argument("--repeat", type=int, default=5, help="imports measured; the fastest counts")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(args.repeat):
+            runs.append(import_once(directory))
+        created = os.listdir(directory)
+    timings, loaded = min(runs, key=lambda run: run[0].get("ddolib", float("inf")))
+    total = timings.get("ddolib", float("nan"))
+
+    print(f"import ddolib: {total:.1f} ms (best of {args.repeat}, budget {args.budget_ms:.0f} ms)")
+    print(f"{'module':<40} {'cumulative ms':>14}")
+    for name, elapsed in sorted(timings.items(), key=lambda item: -item[1])[1:args.top + 1]:
+        print(f"{name:<40} {elapsed:>14.1f}")
+
+    failures = []
+    if not total <= args.budget_ms:
+        failures.append(f"import took {total:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    if loaded:
+        failures.append(f"optional dependencies imported eagerly: {', '.join(loaded)}")
+    if created:
+        failures.append(f"files created by the import: {', '.join(created)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Measures the memory held by many in-memory digital objects and relationships:
+a plain class with a per-instance __dict__ (the layout before __slots__),
+the slotted DigitalObject and Relationship classes, and the columnar
+DigitalObjectBatch and RelationshipSet collections.
+
+Usage: python benchmarks/bench_memory.py [count]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ddolib import DigitalObject, Relationship, DigitalObjectBatch, RelationshipSet
+
+
+class DictDigitalObject:
+    def __init__(self, data, metadata, doid=None):
+        self._data = data
+        self._metadata = metadata
+        self._doid = doid
+
+
+class DictRelationship:
+    def __init__(self, from_ddo_doids, to_ddo_doids, metadata, doid):
+        self._from_ddo_doids = from_ddo_doids
+        self._to_ddo_doids = to_ddo_doids
+        self._metadata = metadata
+        self._doid = doid
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    # Shared payload and metadata, so the figures compare the per-object overhead only.
+    data = {"value": 1}
+    metadata = {"kind": "sample"}
+    doids = [f"doid-{i:08d}" for i in range(count)]
+    edges = [([doids[i]], [doids[(i + 1) % count], doids[(i + 7) % count]]) for i in range(count)]
+
+    cases = [
+        ("objects: __dict__ class", lambda: [DictDigitalObject(data, metadata, f"doid-{i:08d}") for i in range(count)]),
+        ("objects: slotted DigitalObject", lambda: [DigitalObject(data, metadata, f"doid-{i:08d}") for i in range(count)]),
+        ("objects: DigitalObjectBatch", lambda: _batch(count, data, metadata)),
+        ("relationships: __dict__ class", lambda: [DictRelationship(list(src), list(dst), metadata, f"rel-{i:08d}")
+                                                    for i, (src, dst) in enumerate(edges)]),
+        ("relationships: slotted Relationship", lambda: [Relationship(list(src), list(dst), metadata, persist=False,
+                                                                      doid=f"rel-{i:08d}")
+                                                         for i, (src, dst) in enumerate(edges)]),
+        ("relationships: RelationshipSet", lambda: _relationship_set(edges, metadata)),
+    ]
+    print(f"{count} items, shared payload and metadata")
+    print(f"{'layout':<38} {'total MB':>9} {'bytes/item':>11}")
+    for name, build in cases:
+        size = measure(build)
+        print(f"{name:<38} {size / 2**20:>9.1f} {size / count:>11.1f}")
+
+
+def _batch(count, data, metadata):
+    batch = DigitalObjectBatch()
+    for i in range(count):
+        batch.append(f"doid-{i:08d}", metadata, data)
+    return batch
+
+
+def _relationship_set(edges, metadata):
+    relationships = RelationshipSet()
+    for i, (src, dst) in enumerate(edges):
+        relationships.add(f"rel-{i:08d}", src, dst, metadata)
+    return relationships
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures the write throughput of a SQLite repository when each digital object
+is created together with a relationship to the previous one: every write
+committed on its own, each object and its relationship in one
+repository.transaction(), and all of them in a single transaction; each with
+SQLite's defaults and with the "fast" and "durable" tuning profiles.
+
+Commits/s counts the commits issued, objects/s the objects written.
+
+Usage: python benchmarks/bench_transactions.py [count]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ddolib import DigitalObjectRepository, DigitalObject, Relationship
+
+
+def write(repo, i):
+    repo.save(DigitalObject({"value": i}, {"kind": "sample"}, f"doid-{i:08d}"))
+    if i:
+        Relationship([f"doid-{i - 1:08d}"], [f"doid-{i:08d}"], {"type": "next"}, repo=repo)
+
+
+def autocommit(repo, count):
+    for i in range(count):
+        write(repo, i)
+    return 2 * count - 1
+
+
+def per_object(repo, count):
+    for i in range(count):
+        with repo.transaction():
+            write(repo, i)
+    return count
+
+
+def single(repo, count):
+    with repo.transaction():
+        for i in range(count):
+            write(repo, i)
+    return 1
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    modes = [("autocommit", autocommit), ("transaction per object", per_object), ("one transaction", single)]
+    print(f"{count} objects, each with a relationship to the previous one")
+    print(f"{'profile':<10} {'mode':<24} {'seconds':>8} {'commits/s':>10} {'objects/s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in (None, "fast", "durable"):
+            for name, run in modes:
+                path = os.path.join(directory, f"{profile}-{run.__name__}.db")
+                with DigitalObjectRepository(f"sqlite:///{path}", sqlite_profile=profile) as repo:
+                    start = time.perf_counter()
+                    commits = run(repo, count)
+                    elapsed = time.perf_counter() - start
+                print(f"{profile or 'default':<10} {name:<24} {elapsed:>8.2f} "
+                      f"{commits / elapsed:>10.0f} {count / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
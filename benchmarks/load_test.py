@@ -0,0 +1,129 @@
+"""
+Load test for the DDOInstance HTTP API. Sends concurrent POST /create
+requests, then GET /retrieve for every created doid, and reports the
+throughput and p50/p99 latency of each endpoint.
+
+Without --url an in-process multi-threaded server is started on a
+temporary SQLite repository. To measure the multi-process mode, start
+the server separately, e.g.
+
+    python -c "from ddolib import DDOInstance; DDOInstance(repo_url='sqlite:///load.db').start_server(
+        port=5000, environment='production', workers=4)"
+
+and pass --url http://127.0.0.1:5000.
+
+Usage: python benchmarks/load_test.py [--url URL] [--requests N] [--concurrency C] [--payload-size BYTES]
+"""
+import argparse
+import itertools
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ddolib import DDOInstance
+from ddolib.server import make_threaded_server
+
+
+class Client:
+    """Keeps one HTTP connection per thread."""
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+        elapsed = time.perf_counter() - start
+        if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+            connection.close()
+            self.local.connection = None
+        return response.status, payload, elapsed
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_phase(name, calls, concurrency):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status, result, elapsed in pool.map(lambda call: call(), calls):
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+    wall = time.perf_counter() - start
+    print(f"{name:<10} {len(latencies):>8} {len(latencies) / wall:>10.1f} "
+          f"{percentile(latencies, 0.50) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} {errors:>7}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="base URL of a running server; starts one in-process if omitted")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--payload-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = instance = None
+    if args.url is None:
+        directory = tempfile.mkdtemp()
+        instance = DDOInstance(repo_url=f"sqlite:///{os.path.join(directory, 'load.db')}")
+        server = make_threaded_server(instance.create_app(), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.url = f"http://127.0.0.1:{server.server_port}"
+
+    client = Client(args.url)
+    blob = "x" * args.payload_size
+    counter = itertools.count()
+    doids = []
+
+    def create():
+        # The default sequential doids never collide; a distinct payload per request keeps the run valid against
+        # servers using id_mode="hash" or "content" as well, where equal data would get the same doid.
+        body = json.dumps({"data": {"n": next(counter), "blob": blob}, "metadata": {"source": "load_test"}})
+        status, payload, elapsed = client.request("POST", "/create", body)
+        if status == 201:
+            doids.append(json.loads(payload)["doid"])
+        return status, payload, elapsed
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}, against {args.url}")
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    run_phase("/create", [create] * args.requests, args.concurrency)
+    run_phase("/retrieve", [lambda doid=doid: client.request("GET", f"/retrieve/{doid}") for doid in doids],
+              args.concurrency)
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        instance.close()
+
+
+if __name__ == "__main__":
+    main()
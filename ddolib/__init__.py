@@ -1,9 +1,36 @@
-from .core import DigitalObject,Relationship,DigitalObjectRepository,IdentifierResolutionService
+import importlib
+from .core import DigitalObject,LazyDigitalObject,Relationship,RelationshipBuffer,DigitalObjectRepository,IdentifierResolutionService,BatchResult
 from .dos import DataDigitalObject,FunctionDigitalObject, InstanceDigitalObject
-from .ddoinstance import DDOInstance
 from .config import Config
-from .connetion import storage_manager
-#from .utils 
-__all__ = ['DigitalObject', 'DataDigitalObject', 'FunctionDigitalObject', 'DDOInstance',
-           'Relationship',  'InstanceDigitalObject','Config','storage_manager','DigitalObjectRepository'
-           ,'IdentifierResolutionService']
\ No newline at end of file
+from .cache import ObjectCache
+from .query import QueryResult
+from .batch import DigitalObjectBatch, RelationshipSet
+from .pipeline import Pipeline, DAGExecutor
+#from .utils
+
+# Imported on first access: the web server (flask), the asyncio drivers and the
+# shared StorageManager, which opens a database, are not needed by every user of the library.
+_LAZY = {
+    'DDOInstance': '.ddoinstance',
+    'AsyncDigitalObjectRepository': '.asyncrepo',
+    'storage_manager': '.connetion',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        if name != 'storage_manager':
+            globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+__all__ = ['DigitalObject', 'LazyDigitalObject', 'DataDigitalObject', 'FunctionDigitalObject', 'DDOInstance',
+           'Relationship', 'RelationshipBuffer', 'InstanceDigitalObject','Config','storage_manager','DigitalObjectRepository'
+           ,'IdentifierResolutionService','BatchResult','ObjectCache','QueryResult','DigitalObjectBatch','RelationshipSet','Pipeline','DAGExecutor',
+           'AsyncDigitalObjectRepository']
@@ -0,0 +1,365 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.engine import make_url
+from .core import DigitalObject, DigitalObjectRepository, BatchResult
+from .engine import is_sql_url
+from .schema import bootstrap_connection
+from .utils import chunked
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    create_async_engine = None
+
+# Async DBAPI drivers used for the plain URLs accepted by DigitalObjectRepository.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def to_async_url(db_url):
+    """
+    Rewrites a database URL to use an asyncio driver.
+
+    Parameters:
+    db_url (str): A sqlite:// or mysql:// URL, or a URL that already names a driver.
+
+    Returns:
+    str: The URL with an async driver, e.g. sqlite+aiosqlite:///repo.db.
+    """
+    url = make_url(db_url)
+    if "+" in url.drivername:
+        return db_url
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        raise ValueError(f"No asyncio driver known for {url.drivername}.")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+class AsyncDigitalObjectRepository:
+    """
+    Asyncio counterpart of DigitalObjectRepository.
+
+    SQL runs on SQLAlchemy's async engine (aiosqlite for SQLite, aiomysql for
+    MySQL), while serialization, compression and decoding run in an executor
+    so the event loop is never blocked by CPU-bound work. A semaphore bounds
+    the number of operations touching the database at once. Filesystem URLs
+    are served by running the synchronous file store in the executor.
+
+    Attributes:
+    repo_db_url (str): URL of the repository.
+    repo (DigitalObjectRepository): Synchronous repository providing codecs, compression,
+        deduplication and the cache; it opens no engine of its own for SQL URLs.
+    max_concurrency (int): Maximum number of operations in flight against the database.
+    """
+    def __init__(self, url, max_concurrency=64, executor=None, pool_size=5, max_overflow=10,
+                 pool_pre_ping=True, pool_recycle=-1, **options):
+        """
+        Initializes an AsyncDigitalObjectRepository.
+
+        Parameters:
+        url (str): URL of the repository.
+        max_concurrency (int, optional): Maximum number of operations in flight against the database.
+        executor (concurrent.futures.Executor, optional): Executor for (de)serialization; a thread pool
+            owned by the repository is created if omitted.
+        pool_size (int, optional): Number of connections kept open in the pool.
+        max_overflow (int, optional): Extra connections allowed above pool_size under load.
+        pool_pre_ping (bool, optional): Whether to test connections for liveness on checkout.
+        pool_recycle (int, optional): Seconds after which a connection is replaced, -1 to disable.
+        options (dict, optional): cache, codec, compression, compression_threshold and dedup, as
+            accepted by DigitalObjectRepository.
+        """
+        self.repo_db_url = url
+        sql = is_sql_url(url)
+        self.repo = DigitalObjectRepository(None if sql else url, pool_size=pool_size, max_overflow=max_overflow,
+                                            pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle, **options)
+        self.max_concurrency = max_concurrency
+        # Created on the running loop by get_engine: on Python < 3.10 they bind to a loop when constructed.
+        self._loop = None
+        self._semaphore = None
+        self._engine_lock = None
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(thread_name_prefix="ddolib-codec")
+        self._engine = None
+        if sql and create_async_engine is None:
+            raise ImportError("AsyncDigitalObjectRepository requires sqlalchemy[asyncio]: pip install ddolib[async].")
+
+    async def get_engine(self):
+        """
+        Returns the async engine, creating it and bootstrapping the schema on first use.
+
+        Returns:
+        AsyncEngine: The pooled async engine.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._engine_lock = asyncio.Lock()
+        if self._engine is not None:
+            return self._engine
+        async with self._engine_lock:
+            if self._engine is None:
+                async_url = to_async_url(self.repo_db_url)
+                engine = create_async_engine(async_url, **self.repo.engines.engine_options(async_url))
+                async with engine.begin() as connection:
+                    await connection.run_sync(bootstrap_connection)
+                self._engine = engine
+        return self._engine
+
+    async def close(self):
+        """
+        Closes the connection pool and the executor owned by the repository.
+        """
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+        self.repo.close()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _is_sql(self):
+        return is_sql_url(self.repo_db_url)
+
+    async def _read(self, func, *args):
+        engine = await self.get_engine()
+        async with self._semaphore:
+            async with engine.connect() as connection:
+                return await connection.run_sync(func, *args)
+
+    async def _write(self, func, *args):
+        engine = await self.get_engine()
+        async with self._semaphore:
+            async with engine.begin() as connection:
+                return await connection.run_sync(func, *args)
+
+    def _decode_object(self, doid, payload, metadata, codec, compressor):
+        do = DigitalObject(data=self.repo._decode_data(payload, codec, compressor), metadata=metadata, doid=doid)
+        if self.repo.cache is not None:
+            self.repo.cache.put((self.repo_db_url, doid), do, len(payload))
+        return do
+
+    def _encode_object(self, do):
+        row = self.repo._encode_data(do.data)
+        row.update(doid=do.doid, metadata=do.metadata)
+        return row
+
+    async def load(self, doid):
+        """
+        Loads a DigitalObject.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        DigitalObject: The object, or False if it does not exist or cannot be decoded.
+        """
+        if not self._is_sql():
+            return await self._run(self.repo.load, doid)
+        if self.repo.cache is not None:
+            cached = self.repo.cache.get((self.repo_db_url, doid))
+            if cached is not None:
+                return cached
+        try:
+            row = await self._read(self.repo._fetch_row, doid)
+            if row is None:
+                logging.error(f"Can't find doid {doid} in repository.")
+                return False
+            return await self._run(self._decode_object, doid, *row)
+        except Exception as e:
+            logging.error(f"Failed to load DigitalObject from database: {e}")
+            return False
+
+    async def retrieve(self, doid):
+        return await self.load(doid)
+
+    async def save(self, do):
+        """
+        Saves a new DigitalObject.
+
+        Parameters:
+        do (DigitalObject): The object to save; it must have a doid.
+
+        Returns:
+        bool: True if the object was saved.
+        """
+        if do.doid is None:
+            logging.debug(f"Doid is needed for create new do in repository.")
+            return False
+        if not self._is_sql():
+            return await self._run(self.repo.save, do)
+        try:
+            row = await self._run(self._encode_object, do)
+            await self._write(self.repo._insert_rows, [row])
+        except Exception as e:
+            logging.error(f"Failed to save DigitalObject to database: {e}")
+            return False
+        self.repo._invalidate(self.repo_db_url, do.doid)
+        return True
+
+    async def create(self, do):
+        return await self.save(do)
+
+    async def update(self, doid, newdo, if_match=None):
+        """
+        Replaces the data and metadata of a DigitalObject.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        newdo (DigitalObject): Object holding the new data and metadata.
+        if_match (str, optional): Only update if this is still the object's etag.
+
+        Returns:
+        bool: True if the object existed, matched if_match and was updated.
+        """
+        if not self._is_sql():
+            return await self._run(self.repo.update, doid, newdo, None, if_match)
+        try:
+            row = await self._run(self.repo._encode_data, newdo.data)
+            row.update(metadata=newdo.metadata)
+            rowcount = await self._write(self.repo._update_row, doid, row, if_match)
+        except Exception as e:
+            logging.error(f"Failed to update DigitalObject in database: {e}")
+            return False
+        self.repo._invalidate(self.repo_db_url, doid)
+        if rowcount == 0:
+            logging.warning(f"No rows were updated for doid={doid}.")
+            return False
+        return True
+
+    async def delete(self, doid):
+        """
+        Deletes a DigitalObject.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        bool: True if the object existed and was deleted.
+        """
+        if not self._is_sql():
+            return await self._run(self.repo.delete, doid)
+        try:
+            rowcount = await self._write(self.repo._delete_row, doid)
+        except Exception as e:
+            logging.error(f"Failed to delete DigitalObject from database: {e}")
+            return False
+        self.repo._invalidate(self.repo_db_url, doid)
+        if rowcount == 0:
+            logging.warning(f"No DigitalObject with doid={doid} found in the database.")
+            return False
+        return True
+
+    async def save_many(self, dos, batch_size=500):
+        """
+        Saves many DigitalObjects, one transaction per batch; see DigitalObjectRepository.save_many.
+
+        Parameters:
+        dos (iterable of DigitalObject): The objects to save.
+        batch_size (int, optional): Number of rows written per transaction.
+
+        Returns:
+        BatchResult: The doids that were saved and the error of each failed item.
+        """
+        if not self._is_sql():
+            return await self._run(self.repo.save_many, list(dos), batch_size)
+        result = BatchResult()
+        for chunk in chunked(dos, batch_size):
+            rows = []
+            for do in chunk:
+                if do.doid is None:
+                    result.add_failure(None, "Doid is needed for create new do in repository.")
+                    continue
+                try:
+                    rows.append(await self._run(self._encode_object, do))
+                except Exception as e:
+                    result.add_failure(do.doid, f"Failed to serialize data: {e}")
+            if not rows:
+                continue
+            saved = len(result.succeeded)
+            try:
+                await self._write(self.repo._insert_rows, rows)
+                result.succeeded.extend(row["doid"] for row in rows)
+            except Exception as e:
+                logging.debug(f"Batch insert failed, retrying row by row: {e}")
+                await self._write(self.repo._insert_rows_individually, rows, result)
+            for doid in result.succeeded[saved:]:
+                self.repo._invalidate(self.repo_db_url, doid)
+        return result
+
+    async def load_many(self, doids, batch_size=500):
+        """
+        Loads many DigitalObjects; see DigitalObjectRepository.load_many.
+
+        Parameters:
+        doids (iterable of str): The identifiers to load.
+        batch_size (int, optional): Number of doids looked up per query.
+
+        Returns:
+        list: One entry per requested doid, in input order; the DigitalObject or None.
+        """
+        doids = list(doids)
+        if not self._is_sql():
+            return await self._run(self.repo.load_many, doids, batch_size)
+        found = {}
+        pending = dict.fromkeys(doids)
+        if self.repo.cache is not None:
+            for doid in list(pending):
+                cached = self.repo.cache.get((self.repo_db_url, doid))
+                if cached is not None:
+                    found[doid] = cached
+                    del pending[doid]
+        for chunk in chunked(pending, batch_size):
+            rows = await self._read(self.repo._fetch_rows, chunk)
+            for doid, *row in rows:
+                try:
+                    found[doid] = await self._run(self._decode_object, doid, *row)
+                except Exception as e:
+                    logging.error(f"Failed to load DigitalObject with doid={doid}: {e}")
+        return [found.get(doid) for doid in doids]
+
+    async def delete_many(self, doids, batch_size=500):
+        """
+        Deletes many DigitalObjects, one transaction per batch; see DigitalObjectRepository.delete_many.
+
+        Parameters:
+        doids (iterable of str): The identifiers to delete.
+        batch_size (int, optional): Number of doids deleted per transaction.
+
+        Returns:
+        BatchResult: The doids that were deleted and the error of each failed item.
+        """
+        if not self._is_sql():
+            return await self._run(self.repo.delete_many, list(doids), batch_size)
+        result = BatchResult()
+        for chunk in chunked(doids, batch_size):
+            try:
+                existing = await self._write(self.repo._delete_rows, chunk)
+            except Exception as e:
+                logging.error(f"Failed to delete batch of DigitalObjects from database: {e}")
+                for doid in chunk:
+                    result.add_failure(doid, str(e))
+                continue
+            for doid in existing:
+                self.repo._invalidate(self.repo_db_url, doid)
+            for doid in chunk:
+                if doid in existing:
+                    result.succeeded.append(doid)
+                    existing.discard(doid)
+                else:
+                    result.add_failure(doid, "No DigitalObject with this doid found in the database.")
+        return result
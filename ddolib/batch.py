@@ -0,0 +1,228 @@
+from array import array
+
+
+class StringColumn:
+    """
+    Append-only column of strings stored as one UTF-8 buffer and an offsets array.
+
+    Holding a million doids this way costs a few bytes of overhead each,
+    instead of a separate str object per doid.
+    """
+    __slots__ = ("_buffer", "_offsets")
+
+    def __init__(self, values=()):
+        self._buffer = bytearray()
+        self._offsets = array("Q", [0])
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        self._buffer += value.encode("utf-8")
+        self._offsets.append(len(self._buffer))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringColumn index out of range")
+        return self._buffer[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        buffer = bytes(self._buffer)
+        offsets = self._offsets
+        for index in range(len(offsets) - 1):
+            yield buffer[offsets[index]:offsets[index + 1]].decode("utf-8")
+
+
+class DigitalObjectBatch:
+    """
+    Columnar collection of digital objects: doids, metadata and data are kept in parallel columns.
+
+    Iterating yields plain (doid, metadata, data) tuples; a DigitalObject is
+    only built when an item is indexed, so analyses over many objects do not
+    pay for one Python object per row.
+    """
+    __slots__ = ("_doids", "_metadata", "_data")
+
+    def __init__(self):
+        self._doids = StringColumn()
+        self._metadata = []
+        self._data = []
+
+    @classmethod
+    def from_objects(cls, objects):
+        """
+        Builds a batch from DigitalObjects.
+
+        Parameters:
+        objects (iterable of DigitalObject): The objects; None entries are skipped.
+
+        Returns:
+        DigitalObjectBatch: The batch.
+        """
+        batch = cls()
+        for obj in objects:
+            if obj is not None:
+                batch.append(obj.doid, obj.metadata, obj.data)
+        return batch
+
+    def append(self, doid, metadata, data):
+        self._doids.append(doid)
+        self._metadata.append(metadata)
+        self._data.append(data)
+
+    @property
+    def doids(self):
+        return self._doids
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    @property
+    def data(self):
+        return self._data
+
+    def __len__(self):
+        return len(self._metadata)
+
+    def __iter__(self):
+        return zip(self._doids, self._metadata, self._data)
+
+    def __getitem__(self, index):
+        from .core import DigitalObject
+        return DigitalObject(self._data[index], self._metadata[index], self._doids[index])
+
+    def objects(self):
+        """
+        Materializes the batch as DigitalObjects.
+
+        Returns:
+        list of DigitalObject: One object per row, in order.
+        """
+        return [self[index] for index in range(len(self))]
+
+    def __repr__(self):
+        return f"DigitalObjectBatch(objects={len(self)})"
+
+
+class RelationshipSet:
+    """
+    Columnar collection of relationships.
+
+    Each node doid is interned once in a node table; the from/to lists of the
+    relationships are stored as integer node ids in flat arrays with offsets,
+    which is also the layout graph libraries and renderers consume.
+    """
+    __slots__ = ("_doids", "_nodes", "_node_ids", "_from_nodes", "_from_offsets", "_to_nodes", "_to_offsets",
+                 "_metadata")
+
+    def __init__(self):
+        self._doids = StringColumn()
+        self._nodes = []
+        self._node_ids = {}
+        self._from_nodes = array("i")
+        self._from_offsets = array("Q", [0])
+        self._to_nodes = array("i")
+        self._to_offsets = array("Q", [0])
+        self._metadata = []
+
+    @classmethod
+    def from_relationships(cls, relationships):
+        """
+        Builds a set from Relationship objects.
+
+        Parameters:
+        relationships (iterable of Relationship): The relationships.
+
+        Returns:
+        RelationshipSet: The set.
+        """
+        relationships_set = cls()
+        for relationship in relationships:
+            relationships_set.add(relationship.doid, relationship.from_ddo_doids, relationship.to_ddo_doids,
+                                  relationship.metadata)
+        return relationships_set
+
+    def _node_id(self, doid):
+        node_id = self._node_ids.get(doid)
+        if node_id is None:
+            node_id = self._node_ids[doid] = len(self._nodes)
+            self._nodes.append(doid)
+        return node_id
+
+    def add(self, doid, from_ddo_doids, to_ddo_doids, metadata=None):
+        """
+        Adds a relationship.
+
+        Parameters:
+        doid (str): The identifier of the relationship.
+        from_ddo_doids (list of str): The originating data object identifiers.
+        to_ddo_doids (list of str): The target data object identifiers.
+        metadata (dict, optional): Metadata associated with the relationship.
+        """
+        self._doids.append(doid)
+        self._from_nodes.extend(self._node_id(node) for node in from_ddo_doids or [])
+        self._from_offsets.append(len(self._from_nodes))
+        self._to_nodes.extend(self._node_id(node) for node in to_ddo_doids or [])
+        self._to_offsets.append(len(self._to_nodes))
+        self._metadata.append(metadata)
+
+    @property
+    def nodes(self):
+        """
+        Returns the node table.
+
+        Returns:
+        list of str: Every doid referenced by a relationship, indexed by node id.
+        """
+        return self._nodes
+
+    def _members(self, nodes, offsets, index):
+        return [self._nodes[node] for node in nodes[offsets[index]:offsets[index + 1]]]
+
+    def __len__(self):
+        return len(self._metadata)
+
+    def __getitem__(self, index):
+        from .core import Relationship
+        if index < 0:
+            index += len(self)
+        return Relationship(self._members(self._from_nodes, self._from_offsets, index),
+                            self._members(self._to_nodes, self._to_offsets, index),
+                            self._metadata[index], persist=False, doid=self._doids[index])
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def edge_arrays(self):
+        """
+        Returns the edges as two parallel arrays of node ids, one (from, to) pair per entry.
+
+        Returns:
+        tuple of array: Source node ids and target node ids; see nodes for the doids.
+        """
+        sources = array("i")
+        targets = array("i")
+        for index in range(len(self)):
+            to_nodes = self._to_nodes[self._to_offsets[index]:self._to_offsets[index + 1]]
+            for node in self._from_nodes[self._from_offsets[index]:self._from_offsets[index + 1]]:
+                sources.extend([node] * len(to_nodes))
+                targets.extend(to_nodes)
+        return sources, targets
+
+    def edges(self):
+        """
+        Returns the edges as doid pairs.
+
+        Returns:
+        list of tuple: (from doid, to doid), one per pair of each relationship.
+        """
+        sources, targets = self.edge_arrays()
+        return [(self._nodes[src], self._nodes[dst]) for src, dst in zip(sources, targets)]
+
+    def __repr__(self):
+        return f"RelationshipSet(relationships={len(self)}, nodes={len(self._nodes)})"
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ObjectCache:
+    """
+    Bounded, in-process LRU cache of loaded DigitalObjects.
+
+    Entries are bounded both by count and by the size of their serialized
+    payload, and optionally expire after a time-to-live. Cached objects are
+    shared between callers, so they should be treated as read-only.
+
+    Attributes:
+    max_entries (int): Maximum number of cached objects.
+    max_bytes (int): Maximum total serialized size of cached objects.
+    ttl (float): Seconds an entry stays valid, or None for no expiry.
+    hits (int): Number of lookups answered from the cache.
+    misses (int): Number of lookups that fell through to the repository.
+    evictions (int): Number of entries dropped to respect the size bounds.
+    expirations (int): Number of entries dropped because their TTL passed.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=None):
+        """
+        Initializes an ObjectCache.
+
+        Parameters:
+        max_entries (int, optional): Maximum number of cached objects.
+        max_bytes (int, optional): Maximum total serialized size of cached objects.
+        ttl (float, optional): Seconds an entry stays valid, or None for no expiry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached object for a key and marks it as recently used.
+
+        Parameters:
+        key (hashable): The cache key.
+
+        Returns:
+        DigitalObject: The cached object, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size):
+        """
+        Stores an object, evicting least recently used entries if needed.
+
+        Parameters:
+        key (hashable): The cache key.
+        value (DigitalObject): The object to cache.
+        size (int): Serialized size of the object in bytes.
+        """
+        if size > self.max_bytes or self.max_entries < 1:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Drops a key from the cache if present.
+
+        Parameters:
+        key (hashable): The cache key.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """
+        Drops every entry, keeping the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """
+        Returns the cache counters and current occupancy.
+
+        Returns:
+        dict: hits, misses, evictions, expirations, hit_rate, entries and bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
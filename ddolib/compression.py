@@ -0,0 +1,198 @@
+import lzma
+import threading
+import time
+import zlib
+
+
+class Compressor:
+    """
+    A named pair of functions compressing bytes and restoring them.
+
+    Attributes:
+    name (str): The tag stored with each row compressed by this compressor.
+    """
+    def __init__(self, name, compress, decompress):
+        """
+        Initializes a Compressor.
+
+        Parameters:
+        name (str): The tag stored with each row compressed by this compressor.
+        compress (function): Turns bytes into compressed bytes.
+        decompress (function): Restores bytes produced by compress.
+        """
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+    def __repr__(self):
+        return f"Compressor(name={self.name})"
+
+
+_compressors = {}
+
+
+def register_compressor(compressor):
+    """
+    Registers a compressor under its name, replacing any compressor with the same name.
+
+    Parameters:
+    compressor (Compressor): The compressor to register.
+    """
+    _compressors[compressor.name] = compressor
+
+
+def get_compressor(name):
+    """
+    Returns a registered compressor.
+
+    Parameters:
+    name (str): The compressor name.
+
+    Returns:
+    Compressor: The registered compressor.
+    """
+    try:
+        return _compressors[name]
+    except KeyError:
+        raise ValueError(f"Unknown compressor {name}.")
+
+
+def available_compressors():
+    """
+    Returns the names of all registered compressors.
+
+    Returns:
+    list of str: The compressor names.
+    """
+    return list(_compressors)
+
+
+class CompressionStats:
+    """
+    Counters describing how much a repository's compression saves and costs.
+
+    Attributes:
+    compressed (int): Payloads stored compressed.
+    skipped (int): Payloads stored raw because they were below the threshold or did not shrink.
+    bytes_in (int): Serialized size of the compressed payloads before compression.
+    bytes_out (int): Size of the compressed payloads as stored.
+    compress_time (float): Seconds spent compressing.
+    decompress_time (float): Seconds spent decompressing.
+    decompressed (int): Payloads decompressed on load.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every counter back to zero.
+        """
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_time = 0.0
+        self.decompress_time = 0.0
+        self.decompressed = 0
+
+    def record_compress(self, size_in, size_out, elapsed, kept):
+        with self._lock:
+            self.compress_time += elapsed
+            if kept:
+                self.compressed += 1
+                self.bytes_in += size_in
+                self.bytes_out += size_out
+            else:
+                self.skipped += 1
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record_decompress(self, elapsed):
+        with self._lock:
+            self.decompressed += 1
+            self.decompress_time += elapsed
+
+    @property
+    def ratio(self):
+        """
+        Returns the compressed-to-original size ratio of compressed payloads.
+
+        Returns:
+        float: bytes_out / bytes_in, or 1.0 if nothing was compressed.
+        """
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    def as_dict(self):
+        """
+        Returns the counters and the ratio as a dictionary.
+
+        Returns:
+        dict: The current statistics.
+        """
+        with self._lock:
+            return {
+                "compressed": self.compressed,
+                "skipped": self.skipped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": self.ratio,
+                "compress_time": self.compress_time,
+                "decompressed": self.decompressed,
+                "decompress_time": self.decompress_time,
+            }
+
+
+def compress(payload, name, threshold, stats=None):
+    """
+    Compresses a payload if it is at least `threshold` bytes and compression shrinks it.
+
+    Parameters:
+    payload (bytes): The serialized payload.
+    name (str): The compressor to use, or None to store raw.
+    threshold (int): Minimum payload size worth compressing.
+    stats (CompressionStats, optional): Counters to update.
+
+    Returns:
+    tuple: (compressor name or None, stored bytes).
+    """
+    if name is None or len(payload) < threshold:
+        if name is not None and stats is not None:
+            stats.record_skip()
+        return None, payload
+    start = time.perf_counter()
+    packed = get_compressor(name).compress(payload)
+    elapsed = time.perf_counter() - start
+    kept = len(packed) < len(payload)
+    if stats is not None:
+        stats.record_compress(len(payload), len(packed), elapsed, kept)
+    if not kept:
+        return None, payload
+    return name, packed
+
+
+def decompress(payload, name, stats=None):
+    """
+    Restores a payload stored by compress.
+
+    Parameters:
+    payload (bytes): The stored bytes.
+    name (str): The compressor tag stored with the row, or None for raw payloads.
+    stats (CompressionStats, optional): Counters to update.
+
+    Returns:
+    bytes: The serialized payload.
+    """
+    if name is None:
+        return payload
+    start = time.perf_counter()
+    raw = get_compressor(name).decompress(payload)
+    if stats is not None:
+        stats.record_decompress(time.perf_counter() - start)
+    return raw
+
+
+register_compressor(Compressor("zlib", zlib.compress, zlib.decompress))
+register_compressor(Compressor("lzma", lzma.compress, lzma.decompress))
@@ -1,35 +1,81 @@
 import json
-import matplotlib.pyplot as plt
-import networkx as nx
-from sqlalchemy import create_engine, MetaData, Table, Column, String, LargeBinary, JSON, text
+import os
+import threading
+from sqlalchemy import MetaData, Table, Column, String, LargeBinary, JSON, text
 from sqlalchemy.orm import sessionmaker
 from .config import Config
 from .core import DigitalObjectRepository,IdentifierResolutionService
+from .engine import default_engines
 import sqlite3
-from matplotlib.lines import Line2D
-from adjustText import adjust_text
 import dill
 
 class StorageManager:
-    def __init__(self):
+    def __init__(self, id_mode="sequential", engines=None):
+        """
+        Initializes a StorageManager on the configured storage URL.
+
+        Parameters:
+        id_mode (str, optional): Doid generation mode, one of IdentifierResolutionService.MODES.
+        engines (EngineRegistry, optional): Connection pools to use; defaults to the shared
+            engine.default_engines, which DDOInstance also uses.
+        """
+        if engines is None:
+            engines = default_engines
         self.config = Config()
-        self.engine = create_engine(self.config.storage_url)
+        self.id_mode = id_mode
+        self.do_repo = DigitalObjectRepository(self.config.storage_url, engines=engines)
+        self.engine = self.do_repo.get_engine()
         self.metadata = MetaData()
         self.metadata.create_all(self.engine)
         self.Session = sessionmaker(bind=self.engine)
         self.session = self.Session()
-        self.do_repo = DigitalObjectRepository(self.config.storage_url)
-        self.irs = IdentifierResolutionService(self.do_repo)
+        self.irs = IdentifierResolutionService(self.do_repo, mode=self.id_mode)
+        self._renderer = None
 
     # 不可用，待修改
     def update_storage_url(self, new_url=None):
         self.config.db_url = new_url or self.config.storage_url
-        self.engine = create_engine(self.config.db_url)
+        self.session.close()
+        self.do_repo.repo_db_url = self.config.db_url
+        self.engine = self.do_repo.get_engine()
         self.metadata.bind = self.engine
         self.Session.configure(bind=self.engine)
         self.session = self.Session()
-        self.do_repo = DigitalObjectRepository(self.config.storage_url)
-        self.irs = IdentifierResolutionService(self.do_repo)
+        self.irs = IdentifierResolutionService(self.do_repo, mode=self.id_mode)
+
+    def close(self):
+        self.session.close()
+        self.do_repo.close()
+
+    def draw_relationship_network(self, show_ddo_metadata=False, show_fdo_metadata=True, show_rel_metadata=False,
+                                  doid=None, hops=2, path='network.html', max_nodes=1000, strategy='cluster'):
+        """
+        Renders the relationship network to an HTML page with NetworkRenderer.
+
+        The renderer, and with it the layout and fragment caches, is kept on
+        the manager, so repeated calls only redo the work for what changed.
+
+        Parameters:
+        show_ddo_metadata (bool, optional): Show the metadata of data objects as tooltips.
+        show_fdo_metadata (bool, optional): Show the metadata of function objects as tooltips.
+        show_rel_metadata (bool, optional): Label edges with the relationship descriptions.
+        doid (str, optional): Centre of a neighbourhood view; None for the whole network.
+        hops (int, optional): Radius of the neighbourhood in relationship edges.
+        path (str, optional): The HTML file to write.
+        max_nodes (int, optional): Maximum number of nodes drawn before the graph is clustered or sampled.
+        strategy (str, optional): 'cluster' or 'sample'.
+
+        Returns:
+        dict: The statistics returned by NetworkRenderer.render.
+        """
+        from .visualization import NetworkRenderer
+        renderer = self._renderer
+        if renderer is None or renderer.url != self.do_repo.repo_db_url:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.network_cache')
+            renderer = self._renderer = NetworkRenderer(self.do_repo, cache_dir=cache_dir)
+        renderer.max_nodes = max_nodes
+        return renderer.render(path, doid=doid, hops=hops, strategy=strategy, show_ddo_metadata=show_ddo_metadata,
+                               show_fdo_metadata=show_fdo_metadata, show_rel_metadata=show_rel_metadata)
 
     def view_database(self):
         conn = sqlite3.connect(self.config.db_url.replace('sqlite:///', ''))
@@ -55,4 +101,30 @@ class StorageManager:
         
         conn.close()
     
-storage_manager = StorageManager()
\ No newline at end of file
+_storage_manager = None
+_storage_manager_lock = threading.Lock()
+
+
+def get_storage_manager():
+    """
+    Returns the shared StorageManager, creating it on first use.
+
+    Importing ddolib therefore neither opens an engine nor creates the
+    configured database file.
+
+    Returns:
+    StorageManager: The shared instance.
+    """
+    global _storage_manager
+    if _storage_manager is None:
+        with _storage_manager_lock:
+            if _storage_manager is None:
+                _storage_manager = StorageManager()
+    return _storage_manager
+
+
+def __getattr__(name):
+    # `from ddolib.connetion import storage_manager` keeps working, constructing the instance at that point.
+    if name == "storage_manager":
+        return get_storage_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
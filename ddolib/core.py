@@ -1,10 +1,34 @@
 import uuid
 import dill
-import os,json,time
+import io
+import os,json,re,time
 import logging
-from sqlalchemy import create_engine, update,MetaData, Table, Column, String, LargeBinary, JSON, text
-from sqlalchemy.sql import insert
 import hashlib
+import threading
+from collections import Counter
+from .engine import EngineRegistry, default_engines, is_sql_url, active_transaction, open_transaction, begin, connect
+from .schema import (select_digital_object, insert_digital_object, update_digital_object,
+                     delete_digital_object, insert_relationship, select_digital_objects_in,
+                     delete_digital_objects_in, select_payload_refs, select_payload_refs_in,
+                     update_inline_object, update_inline_object_if_match, delete_inline_object,
+                     insert_blob, increment_blob_refs, decrement_blob_refs, delete_unreferenced_blob,
+                     delete_unreferenced_blobs, recount_blob_refs, select_stream_info, select_payload_info,
+                     select_payload_range, select_payload_format, select_object_chunk, select_object_chunks,
+                     insert_object_chunk, delete_object_chunks, delete_object_chunks_in,
+                     update_digital_object_if_match, select_etag,
+                     insert_relationship_edge, relationship_edge_rows, select_object_metadata, select_doid,
+                     select_relationships, select_object_metadata_in, select_relationships_in, select_edge_rows_to)
+from .utils import chunked
+from .cache import ObjectCache
+from . import serialization
+from . import compression as compression_module
+from .identifiers import SequentialIdGenerator, content_doid, object_etag
+from .filestore import get_store
+from .streams import DEFAULT_CHUNK_SIZE, ChunkedReader, FileSliceReader, rechunk
+from . import lineage
+from . import query as query_module
+from .query import QueryResult
+from .batch import DigitalObjectBatch, RelationshipSet
 
 class DigitalObject:
     """
@@ -16,6 +40,9 @@ class DigitalObject:
     doid (str): System-internal unique identifier for the digital object.
     doid (str): External unique identifier for the digital object, assigned by a registration service.
     """
+    # No per-instance __dict__, so millions of objects can be held for analysis.
+    __slots__ = ("_data", "_metadata", "_doid")
+
     def __init__(self, data, metadata, doid=None):
         """
         Initializes a DigitalObject.
@@ -74,11 +101,18 @@ class DigitalObject:
         except Exception as e:
             return f"<unprintable object: {e}>"
 
+    def __setstate__(self, state):
+        # Pickles of slotted objects carry (None, slots); those written before __slots__ carry a plain dict.
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
     def get_doid(self,IRS):
         if self.doid:
             logging.error(f"The do already has a doid {self.doid}.")
             return False
-        gdoid = IRS.generate(self.data)
+        gdoid = IRS.generate(self.data, self.metadata)
         if gdoid:
             self._doid = gdoid
         else:
@@ -117,120 +151,704 @@ class DigitalObject:
         return self._doid
     
 
+class LazyDigitalObject(DigitalObject):
+    """
+    DigitalObject whose data is fetched and decoded on first access.
+
+    The metadata and doid are available immediately; reading `data` loads the
+    payload once and keeps it.
+    """
+    __slots__ = ("_fetch_data",)
+
+    def __init__(self, metadata, doid, fetch_data):
+        """
+        Initializes a LazyDigitalObject.
+
+        Parameters:
+        metadata (dict): Metadata associated with the digital object.
+        doid (str): Identifier of the digital object.
+        fetch_data (function): Called with the doid on first access to `data`, returns the decoded data.
+        """
+        super().__init__(None, metadata, doid)
+        self._fetch_data = fetch_data
+
+    @property
+    def loaded(self):
+        """
+        Returns whether the data has been fetched.
+
+        Returns:
+        bool: True once `data` has been read.
+        """
+        return self._fetch_data is None
+
+    @property
+    def data(self):
+        """
+        Returns the data of the digital object, fetching it on first access.
+
+        Returns:
+        any: The data of the digital object.
+        """
+        if self._fetch_data is not None:
+            self._data = self._fetch_data(self._doid)
+            self._fetch_data = None
+        return self._data
+
+    def __str__(self):
+        # Printing a handle must not fetch its data.
+        return repr(self) if not self.loaded else super().__str__()
+
+    def __repr__(self):
+        if not self.loaded:
+            metadata_str = self._safe_str(self.metadata, json_format=True)
+            return f"LazyDigitalObject(data=<not loaded>, metadata={metadata_str},doid={self.doid})"
+        return super().__repr__()
+
+
+class BatchResult:
+    """
+    Per-item outcome of a batch repository operation.
+
+    Attributes:
+    succeeded (list of str): The doids that were processed successfully, in input order.
+    failed (list of tuple): (doid, error message) pairs for the items that failed.
+    """
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+
+    def add_failure(self, doid, error):
+        logging.error(f"Batch operation failed for doid={doid}: {error}")
+        self.failed.append((doid, error))
+
+    @property
+    def ok(self):
+        """
+        Returns whether every item in the batch succeeded.
+
+        Returns:
+        bool: True if no item failed.
+        """
+        return not self.failed
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f"BatchResult(succeeded={len(self.succeeded)}, failed={len(self.failed)})"
+
+
 class DigitalObjectRepository:
-    def __init__(self, url=None):  
-        self.repo_db_url = url 
+    """
+    Repository storing DigitalObjects in a SQL database, or in a FileObjectStore
+    when the URL is a filesystem path.
+
+    Attributes:
+    repo_db_url (str): Default URL of the repository database.
+    engines (EngineRegistry): Pooled engines owned by the repository, keyed by URL.
+    cache (ObjectCache): Optional read-through cache of loaded objects, or None.
+    codec (str): Serialization codec for new payloads, or "auto" to pick the cheapest that fits.
+    compression (str): Compressor applied to new payloads, or None to store them raw.
+    compression_threshold (int): Minimum serialized size in bytes before compression is attempted.
+    compression_stats (CompressionStats): Compression ratio and time spent compressing and decompressing.
+    dedup (bool): Whether payloads are stored once per content hash in the blobs table and shared
+        between objects. Use the same setting for every repository opened on a database.
+    """
+    def __init__(self, url=None, pool_size=5, max_overflow=10, pool_pre_ping=True, pool_recycle=-1, engines=None,
+                 cache=None, codec="auto", compression=None, compression_threshold=4096, dedup=False,
+                 sqlite_profile=None):
+        """
+        Initializes a DigitalObjectRepository.
+
+        Parameters:
+        url (str, optional): Default URL of the repository database.
+        pool_size (int, optional): Number of connections kept open per engine.
+        max_overflow (int, optional): Extra connections allowed above pool_size under load.
+        pool_pre_ping (bool, optional): Whether to test connections for liveness on checkout.
+        pool_recycle (int, optional): Seconds after which a connection is replaced, -1 to disable.
+        engines (EngineRegistry, optional): Registry to share with another owner instead of creating one;
+            its pools are then left open by close.
+        cache (ObjectCache or bool, optional): Read-through cache for load, invalidated by update and
+            delete; True creates an ObjectCache with default bounds.
+        codec (str, optional): Serialization codec for new payloads, one of serialization.available_codecs()
+            or "auto". The codec is stored per row, so load always uses the matching decoder.
+        compression (str, optional): Compressor for new payloads, one of compression.available_compressors().
+            The compressor is stored per row, so load decompresses automatically.
+        compression_threshold (int, optional): Payloads smaller than this many bytes are stored raw.
+        dedup (bool, optional): Store payloads content-addressed and reference counted, so identical
+            payloads are written once and shared.
+        sqlite_profile (str or dict, optional): Opt-in SQLite tuning applied when a connection is opened,
+            "fast" or "durable" (see engine.SQLITE_PROFILES) or a dict of pragmas. Ignored when engines is given.
+        """
+        if codec != serialization.AUTO:
+            serialization.get_codec(codec)
+        if compression is not None:
+            compression_module.get_compressor(compression)
+        self.repo_db_url = url
+        self.codec = codec
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_stats = compression_module.CompressionStats()
+        self.dedup = dedup
+        if cache is True:
+            cache = ObjectCache()
+        elif cache is False:
+            cache = None
+        self.cache = cache
+        self._owns_engines = engines is None
+        if engines is None:
+            engines = EngineRegistry(pool_size=pool_size, max_overflow=max_overflow,
+                                     pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                     sqlite_profile=sqlite_profile)
+        self.engines = engines
+        if is_sql_url(url):
+            # 打开仓库时一次性建表/迁移
+            self.get_engine(url)
+
+    def get_engine(self, url=None):
+        """
+        Returns the pooled engine for a database URL.
+
+        Parameters:
+        url (str, optional): The database URL, defaults to the repository URL.
+
+        Returns:
+        Engine: The engine shared by all operations on that URL.
+        """
+        return self.engines.get(url or self.repo_db_url)
+
+    def close(self):
+        """
+        Closes all connection pools owned by the repository.
+        """
+        if self._owns_engines:
+            self.engines.close()
+        if self.cache is not None:
+            self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _encode_data(self, data, metadata=None, content_id=False):
+        codec, payload = serialization.encode(data, self.codec)
+        # 内容标识在压缩前根据即将写入的序列化字节计算，不再单独序列化一次
+        doid = content_doid(payload, metadata) if content_id else None
+        compressor, payload = compression_module.compress(payload, self.compression, self.compression_threshold,
+                                                          self.compression_stats)
+        row = {"data": payload, "codec": codec, "compression": compressor, "blob_hash": None,
+               "stream_size": None, "chunk_size": None}
+        if content_id:
+            row["doid"] = doid
+        return row
+
+    def _encode_object(self, do, content_id=False):
+        # Encodes a new object's row; with content_id an object without a doid is given its content doid.
+        row = self._encode_data(do.data, do.metadata, content_id and do.doid is None)
+        if "doid" in row:
+            do._doid = row["doid"]
+        row.update(doid=do.doid, metadata=do.metadata)
+        return row
+
+    def _store_blobs(self, connection, rows):
+        # Moves the payloads of rows into the blob table and returns rows referencing them instead.
+        if not self.dedup:
+            return rows
+        counts = Counter()
+        payloads = {}
+        stored = []
+        for row in rows:
+            digest = content_doid(row['data'])
+            counts[digest] += 1
+            payloads.setdefault(digest, row["data"])
+            stored.append(dict(row, data=None, blob_hash=digest))
+        for digest, count in counts.items():
+            result = connection.execute(increment_blob_refs, {"b_hash": digest, "count": count})
+            if result.rowcount == 0:
+                connection.execute(insert_blob, {"hash": digest, "data": payloads[digest], "refcount": count})
+            else:
+                logging.debug(f"Blob {digest} already stored, skipping payload write.")
+        return stored
+
+    def _release_blobs(self, connection, hashes):
+        # Drops one reference per hash and deletes blobs that are no longer referenced.
+        counts = Counter(digest for digest in hashes if digest)
+        for digest, count in counts.items():
+            connection.execute(decrement_blob_refs, {"b_hash": digest, "count": count})
+            connection.execute(delete_unreferenced_blob, {"hash": digest})
+
+    # Connection-level SQL helpers shared by the synchronous methods and AsyncDigitalObjectRepository.
+
+    def _insert_rows(self, connection, rows):
+        rows = [dict(row, etag=object_etag(row["data"], row["metadata"])) for row in rows]
+        connection.execute(insert_digital_object, self._store_blobs(connection, rows))
+
+    def _update_row(self, connection, doid, row, if_match=None):
+        # Returns the number of updated rows; 0 if if_match is given and is not the current etag.
+        row = dict(row, etag=object_etag(row["data"], row["metadata"]), b_doid=doid)
+        if if_match is not None:
+            row["b_etag"] = if_match
+        if self.dedup:
+            row = self._store_blobs(connection, [row])[0]
+        # A row keeping its payload inline is replaced in one statement.
+        inline = update_inline_object if if_match is None else update_inline_object_if_match
+        rowcount = connection.execute(inline, row).rowcount
+        if rowcount:
+            return rowcount
+        # The old payload may be a shared blob or chunks even if this repository does not deduplicate.
+        old = connection.execute(select_payload_refs, {"doid": doid}).fetchone()
+        if old is not None and (if_match is None or old[2] == if_match):
+            statement = update_digital_object if if_match is None else update_digital_object_if_match
+            rowcount = connection.execute(statement, row).rowcount
+        if not rowcount:
+            if self.dedup:
+                # The row is missing or the etag did not match: give back the reference taken for the new payload.
+                self._release_blobs(connection, [row["blob_hash"]])
+            return 0
+        blob_hash, stream_size, _ = old
+        if stream_size is not None:
+            connection.execute(delete_object_chunks, {"doid": doid})
+        self._release_blobs(connection, [blob_hash])
+        return rowcount
+
+    def _delete_row(self, connection, doid):
+        # Returns the number of deleted rows.
+        rowcount = connection.execute(delete_inline_object, {"doid": doid}).rowcount
+        if rowcount:
+            return rowcount
+        # Blob references are released whatever self.dedup is: rows may come from a deduplicating writer.
+        old = connection.execute(select_payload_refs, {"doid": doid}).fetchone()
+        if old is None:
+            return 0
+        blob_hash, stream_size, _ = old
+        rowcount = connection.execute(delete_digital_object, {"doid": doid}).rowcount
+        if stream_size is not None:
+            connection.execute(delete_object_chunks, {"doid": doid})
+        self._release_blobs(connection, [blob_hash])
+        return rowcount
+
+    def _delete_rows(self, connection, doids):
+        # Returns the set of doids that existed and were deleted.
+        # Blob references are released whatever self.dedup is: rows may come from a deduplicating writer.
+        refs = connection.execute(select_payload_refs_in, {"doids": doids}).fetchall()
+        existing = {doid for doid, _, _ in refs}
+        if existing:
+            connection.execute(delete_digital_objects_in, {"doids": list(existing)})
+        streamed = [doid for doid, _, stream_size in refs if stream_size is not None]
+        if streamed:
+            connection.execute(delete_object_chunks_in, {"doids": streamed})
+        self._release_blobs(connection, [blob_hash for _, blob_hash, _ in refs])
+        return existing
+
+    def _fetch_row(self, connection, doid):
+        # Returns (payload, metadata, codec, compression), or None if the doid does not exist.
+        row = connection.execute(select_digital_object, {"doid": doid}).fetchone()
+        if row is None:
+            return None
+        payload, metadata, codec, compressor, stream_size = row
+        if stream_size is not None:
+            # 分块存储的对象整体读入
+            payload = b"".join(connection.execute(select_object_chunks, {"doid": doid}).scalars())
+        metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+        return payload, metadata, codec, compressor
+
+    def _fetch_rows(self, connection, doids):
+        # Returns a list of (doid, payload, metadata, codec, compression) for the doids that exist.
+        rows = []
+        for doid, payload, metadata, codec, compressor, stream_size in connection.execute(
+                select_digital_objects_in, {"doids": doids}).fetchall():
+            if stream_size is not None:
+                payload = b"".join(connection.execute(select_object_chunks, {"doid": doid}).scalars())
+            metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+            rows.append((doid, payload, metadata, codec, compressor))
+        return rows
+
+    def _decode_data(self, payload, codec, compressor=None):
+        payload = compression_module.decompress(payload, compressor, self.compression_stats)
+        return serialization.decode(payload, codec)
+
+    def _invalidate(self, db_url, doid):
+        if self.cache is not None:
+            self.cache.invalidate((db_url, doid))
+            transaction = active_transaction(db_url)
+            if transaction is not None:
+                transaction.touched.append((self.cache, (db_url, doid)))
+
+    def _begin(self, db_url):
+        # A connection for a write, shared with the transaction open on db_url in this thread if any.
+        return begin(self.get_engine(db_url), db_url)
+
+    def _connect(self, db_url):
+        return connect(self.get_engine(db_url), db_url)
+
+    def _raise_in_transaction(self, db_url):
+        # Inside a transaction a failed write raises, so the whole unit of work is rolled back.
+        if active_transaction(db_url) is not None:
+            raise
+
+    def transaction(self, url=None):
+        """
+        Groups repository writes into one unit of work.
+
+        Inside the with-block, save, update, delete, save_many, delete_many,
+        save_stream and Relationship.save on the same database, in the same
+        thread, run on one connection and are committed together when the
+        block exits; if the block raises, all of them are rolled back. A write
+        that fails raises instead of returning False, so the unit is never
+        committed half done. Reads in the block see its uncommitted writes, and
+        a nested transaction() joins the enclosing one.
+
+        Parameters:
+        url (str, optional): The database URL, defaults to the repository URL.
+
+        Returns:
+        context manager: Yields the open Transaction.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            raise ValueError(f"Transactions are only supported on SQL repositories, not {db_url}.")
+        return open_transaction(self.get_engine(db_url), db_url)
 
     #retrieve
-    def load(self, doid, url=None):
+    def load(self, doid, url=None, lazy=False):
+        """
+        Loads a DigitalObject.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+        lazy (bool, optional): Read only the metadata now and return a LazyDigitalObject that fetches
+            and decodes the data on first access.
+
+        Returns:
+        DigitalObject: The object, or False if it does not exist or cannot be decoded.
+        """
         db_url = url or self.repo_db_url
         logging.debug(f"Loading DigitalObject with doid={doid} from {db_url}")
-        if db_url.startswith("sqlite://") or db_url.startswith("mysql://"):
-            engine = create_engine(db_url)
-            with engine.connect() as connection:
+        if self.cache is not None:
+            cached = self.cache.get((db_url, doid))
+            if cached is not None:
+                return cached
+        if lazy:
+            metadata = self.load_metadata(doid, db_url)
+            if metadata is None:
+                logging.error(f"Can't find doid {doid} in repository.")
+                return False
+            return self._lazy_object(doid, metadata, db_url)
+        if is_sql_url(db_url):
+            with self._connect(db_url) as connection:
                 try:
-                    result = connection.execute(text("SELECT data, metadata FROM digital_objects WHERE doid = :doid"), {"doid": doid})  
-                    row = result.fetchone()  
+                    row = self._fetch_row(connection, doid)
                     if row:  
-                        loaded_object_data = dill.loads(row[0])  
-                        metadata = json.loads(row[1]) if isinstance(row[1], str) else row[1]  
-                        #   row[0] is data,row[1] is metadata.
-                        return DigitalObject( 
+                        payload, metadata, codec, compressor = row
+                        loaded_object_data = self._decode_data(payload, codec, compressor)  
+                        do = DigitalObject( 
                             data=loaded_object_data,  
                             metadata=metadata,  
                             doid=doid  
                         ) 
+                        if self.cache is not None:
+                            self.cache.put((db_url, doid), do, len(payload))
+                        return do
                     else:
                         logging.error(f"Can't find doid {doid} in repository.")
                         return False
                 except Exception as e:  
                     logging.error(f"Failed to load DigitalObject from database: {e}")
                     return False
-        else: #未调整
-            filename = os.path.join(db_url, f"{doid}.dill")
-            with open(filename, 'rb') as file:
-                loaded_object = dill.load(file)
+        else:
+            return self._load_file(doid, db_url)
+
+    def _lazy_object(self, doid, metadata, db_url):
+        def fetch_data(doid):
+            do = self.load(doid, db_url)
+            if not do:
+                raise LookupError(f"DigitalObject with doid={doid} could not be loaded from {db_url}.")
+            return do.data
+        return LazyDigitalObject(metadata, doid, fetch_data)
+
+    def load_metadata(self, doid, url=None):
+        """
+        Returns the metadata of a DigitalObject without reading its data.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        dict: The metadata, or None if the object does not exist.
+        """
+        db_url = url or self.repo_db_url
+        if self.cache is not None:
+            cached = self.cache.get((db_url, doid))
+            if cached is not None:
+                return cached.metadata
+        if not is_sql_url(db_url):
+            metadata = self.get_file_store(db_url).read_metadata(doid)
+            if metadata is None and os.path.exists(os.path.join(db_url, f"{doid}.dill")):
+                # 旧版 .dill 文件没有单独的元数据，只能整体读取
+                do = self._load_file(doid, db_url)
+                return do.metadata if do else None
+            return metadata
+        with self._connect(db_url) as connection:
+            row = connection.execute(select_object_metadata, {"doid": doid}).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]) if isinstance(row[0], str) else row[0]
+
+    def load_metadata_many(self, doids, batch_size=500, url=None):
+        """
+        Returns the metadata of many DigitalObjects without reading their data.
+
+        Parameters:
+        doids (iterable of str): The identifiers of the objects.
+        batch_size (int, optional): Number of doids looked up per query.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        dict: Metadata by doid, for the objects that exist.
+        """
+        db_url = url or self.repo_db_url
+        doids = list(doids)
+        if not is_sql_url(db_url):
+            found = {doid: self.load_metadata(doid, db_url) for doid in doids}
+            return {doid: metadata for doid, metadata in found.items() if metadata is not None}
+        found = {}
+        with self._connect(db_url) as connection:
+            for chunk in chunked(dict.fromkeys(doids), batch_size):
+                for doid, metadata in connection.execute(select_object_metadata_in, {"doids": chunk}):
+                    found[doid] = json.loads(metadata) if isinstance(metadata, str) else metadata
+        return found
+
+    def exists(self, doid, url=None):
+        """
+        Returns whether a DigitalObject exists, without reading its data or metadata.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bool: True if the object exists.
+        """
+        db_url = url or self.repo_db_url
+        if self.cache is not None and self.cache.get((db_url, doid)) is not None:
+            return True
+        if not is_sql_url(db_url):
+            return self.get_file_store(db_url).exists(doid) or os.path.exists(os.path.join(db_url, f"{doid}.dill"))
+        with self._connect(db_url) as connection:
+            return connection.execute(select_doid, {"doid": doid}).first() is not None
+
+    def list_objects(self, filters=None, order_by=None, batch_size=1000, url=None):
+        """
+        Lists DigitalObjects as LazyDigitalObject handles whose data is only read when accessed.
+
+        Pages through query, so only `batch_size` handles' metadata is fetched at a time.
+
+        Parameters:
+        filters (dict, optional): Metadata filters, as for query.
+        order_by (str, optional): Metadata path to sort by, as for query.
+        batch_size (int, optional): Number of objects fetched per query.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        generator: LazyDigitalObject handles.
+        """
+        db_url = url or self.repo_db_url
+        cursor = None
+        while True:
+            page = self.query(filters, order_by, batch_size, cursor, db_url)
+            for doid, metadata in page:
+                yield self._lazy_object(doid, metadata, db_url)
+            cursor = page.cursor
+            if cursor is None:
+                return
+
+    def get_file_store(self, url=None):
+        """
+        Returns the file store for a filesystem repository location.
+
+        Parameters:
+        url (str, optional): Directory of the store, defaults to the repository URL.
+
+        Returns:
+        FileObjectStore: The store shared by all repositories using that directory.
+        """
+        return get_store(url or self.repo_db_url)
+
+    def _load_file(self, doid, root):
+        try:
+            record = self.get_file_store(root).read(doid, self._decode_data)
+            if record is None:
+                # 兼容旧版直接 dill 序列化的 {doid}.dill 文件
+                filename = os.path.join(root, f"{doid}.dill")
+                if not os.path.exists(filename):
+                    logging.error(f"Can't find doid {doid} in repository.")
+                    return False
+                with open(filename, 'rb') as file:
+                    loaded_object = dill.load(file)
                 return DigitalObject(
                     data=loaded_object.data,
                     metadata=loaded_object.metadata,
                     doid=loaded_object.doid
                 )
+            data, metadata = record
+        except Exception as e:
+            logging.error(f"Failed to load DigitalObject from file store: {e}")
+            return False
+        do = DigitalObject(data=data, metadata=metadata, doid=doid)
+        if self.cache is not None:
+            self.cache.put((root, doid), do, os.path.getsize(self.get_file_store(root).object_path(doid)))
+        return do
+
+    def _save_file(self, do, root, content_id=False):
+        try:
+            row = self._encode_object(do, content_id)
+            if not self.get_file_store(root).write(do.doid, do.metadata, row["codec"], row["compression"], row["data"]):
+                logging.error(f"DigitalObject with doid={do.doid} already exists in file store.")
+                return False
+        except Exception as e:
+            logging.error(f"Failed to save DigitalObject to file store: {e}")
+            return False
+        logging.debug(f"DigitalObject with doid={do.doid} saved to file store {root}.")
+        return True
+
+    def _update_file(self, doid, newdo, root, if_match=None):
+        try:
+            row = self._encode_data(newdo.data)
+            updated = self.get_file_store(root).write(doid, newdo.metadata, row["codec"], row["compression"],
+                                                      row["data"], overwrite=True, if_match=if_match)
+        except Exception as e:
+            logging.error(f"Failed to update DigitalObject in file store: {e}")
+            return False
+        self._invalidate(root, doid)
+        if not updated:
+            logging.warning(f"No DigitalObject with doid={doid} found in file store.")
+        return updated
+
+    def _delete_file(self, doid, root):
+        try:
+            deleted = self.get_file_store(root).remove(doid)
+        except Exception as e:
+            logging.error(f"Failed to delete DigitalObject from file store: {e}")
+            return False
+        self._invalidate(root, doid)
+        if not deleted:
+            logging.warning(f"No DigitalObject with doid={doid} found in file store.")
+        return deleted
 
     #create
-    def save(self,do,url=None):
+    def save(self,do,url=None,content_id=False):
+        """
+        Saves a new DigitalObject.
+
+        Parameters:
+        do (DigitalObject): The object; it needs a doid unless content_id is set.
+        url (str, optional): The URL of the repository.
+        content_id (bool, optional): Give an object without a doid the doid `sha256-<digest>` of its
+            serialized payload and metadata, hashed from the bytes being written, and set it on the object.
+
+        Returns:
+        bool: True if the object was saved.
+        """
         db_url = url or self.repo_db_url
-        if do.doid is None:
+        if do.doid is None and not content_id:
             logging.debug(f"Doid is needed for create new do in repository.")
             return False
         logging.debug(f"Saving DigitalObject with doid={do.doid} to {db_url}")
-        if db_url.startswith("sqlite://") or db_url.startswith("mysql://"):
+        if is_sql_url(db_url):
             try:
-                engine = create_engine(db_url)
-                with engine.connect() as connection:
-                    serialized_data = dill.dumps(do.data)
-                    logging.debug(f"Serialized data: {serialized_data[:50]}...")  # 输出序列化数据的前50个字符
-                    
-                    metadata = MetaData()
-                    digital_objects_table = Table(
-                                                    'digital_objects', metadata,
-                                                    Column('doid', String, primary_key=True),
-                                                    Column('data', LargeBinary),
-                                                    Column('metadata', JSON))
-                    
-                    # 确保表结构已存在
-                    metadata.create_all(engine)
-                    
-                    # 构建插入语句
-                    stmt = insert(digital_objects_table).values(doid=do.doid, data=serialized_data, metadata=do.metadata)
-                    result = connection.execute(stmt)
-                    connection.commit()  # 提交事务
-                    logging.debug(f"Rows affected: {result.rowcount}")
-                    logging.debug(f"DigitalObject with doid={do.doid} saved to database.")
+                row = self._encode_object(do, content_id)
+                logging.debug(f"Serialized data ({row['codec']}): {row['data'][:50]}...")  # 输出序列化数据的前50个字符
+                # 表结构在引擎创建时已初始化，这里只发出一条 INSERT
+                with self._begin(db_url) as connection:
+                    self._insert_rows(connection, [row])
+                self._invalidate(db_url, do.doid)
+                logging.debug(f"DigitalObject with doid={do.doid} saved to database.")
             except Exception as e:
                 logging.error(f"Failed to save DigitalObject to database: {e}")
+                self._raise_in_transaction(db_url)
+                return False
             return True
         else:
-            return False
+            return self._save_file(do, db_url, content_id)
          
-    def update(self, doid, newdo, url=None):  
+    def update(self, doid, newdo, url=None, if_match=None):  
+        """
+        Replaces the data and metadata of a DigitalObject.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        newdo (DigitalObject): Object holding the new data and metadata.
+        url (str, optional): The URL of the repository.
+        if_match (str, optional): Only update if this is still the object's etag, see get_etag.
+
+        Returns:
+        bool: True if the object was updated; False if it does not exist, the etag did not match
+        or the write failed.
+        """
         db_url = url or self.repo_db_url 
         logging.debug(f"Updating DigitalObject with doid={doid} in {db_url}")  
-        if db_url.startswith("sqlite://") or db_url.startswith("mysql://"):  
+        if is_sql_url(db_url):  
             try:  
-                engine = create_engine(db_url)  
-                with engine.connect() as connection:  
-                    # 序列化新数据  
-                    serialized_data = dill.dumps(newdo.data)  
-                    logging.debug(f"Serialized data: {serialized_data[:50]}...")  # 输出序列化数据的前50个字符
-                    # 假设 new_metadata 已经是 JSON 格式，如果不是，则需要先转换为 JSON  
-                       
-                    metadata = MetaData()  
-                    digital_objects_table = Table(  
-                        'digital_objects', metadata,  
-                        Column('doid', String, primary_key=True),  
-                        Column('data', LargeBinary),  
-                        Column('metadata', JSON)  
-                    )  
-                      
-                    # 构建更新语句  
-                    stmt = update(digital_objects_table).where(digital_objects_table.c.doid == doid).values(  
-                        data=serialized_data,  
-                        metadata=newdo.metadata  
-                    )  
-                    result = connection.execute(stmt)  
-                    connection.commit()  # 提交事务  
-                    logging.debug(f"Rows updated: {result.rowcount}")  
-                    if result.rowcount == 0:  
-                        logging.warning(f"No rows were updated for doid={doid}.")
-                        return False  
-                    else:  
-                        logging.debug(f"DigitalObject with doid={doid} updated in database.")  
-                        return True 
+                # 序列化新数据  
+                row = self._encode_data(newdo.data)  
+                logging.debug(f"Serialized data ({row['codec']}): {row['data'][:50]}...")  # 输出序列化数据的前50个字符
+                row.update(metadata=newdo.metadata)
+                with self._begin(db_url) as connection:  
+                    rowcount = self._update_row(connection, doid, row, if_match)  
+                self._invalidate(db_url, doid)
+                logging.debug(f"Rows updated: {rowcount}")  
+                if rowcount == 0:  
+                    logging.warning(f"No rows were updated for doid={doid}.")
+                    return False  
+                else:  
+                    logging.debug(f"DigitalObject with doid={doid} updated in database.")  
+                    return True 
             except Exception as e:  
                 logging.error(f"Failed to update DigitalObject in database: {e}")  
+                self._raise_in_transaction(db_url)
                 return False   
         else:
-            return False
+            return self._update_file(doid, newdo, db_url, if_match)
+
+    def get_etag(self, doid, url=None):
+        """
+        Returns the entity tag of a DigitalObject without reading its payload.
+
+        The etag changes with every write, so it can be compared with a client's
+        copy (If-None-Match) or required for an update (If-Match). In a database
+        it is a hash of the stored payload and metadata, stored with the row;
+        rows written before etags existed get theirs from the schema migration.
+        In a file store it is derived from the object file's inode, size and
+        modification time.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        str: The etag, or None if the object does not exist.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            return self.get_file_store(db_url).etag(doid)
+        with self._connect(db_url) as connection:
+            row = connection.execute(select_etag, {"doid": doid}).fetchone()
+            if row is None:
+                return None
+            if row[0] is not None:
+                return row[0]
+            # Written by a version without etags after the migration ran: computed here but not stored,
+            # since this is a read.
+            stored = self._fetch_row(connection, doid)
+        if stored is None:
+            return None
+        return object_etag(stored[0], stored[1])
       
     def retrieve(self, doid, url=None):  
         """  
@@ -252,30 +870,599 @@ class DigitalObjectRepository:
         db_url = url or self.repo_db_url
         logging.debug(f"Deleting DigitalObject with doid={doid} from {db_url}")  
   
-        if db_url.startswith("sqlite://") or db_url.startswith("mysql://"):  
+        if is_sql_url(db_url):  
             try:  
-                engine = create_engine(db_url)  
-                with engine.connect() as connection:  
-                    # 构造SQL删除语句  
-                    stmt = text("DELETE FROM digital_objects WHERE doid = :doid")  
-                    result = connection.execute(stmt, {"doid": doid})  
-  
-                    # 提交事务  
-                    connection.commit()  
-  
-                    logging.debug(f"Rows affected: {result.rowcount}")  
-                    if result.rowcount == 0:  
-                        logging.warning(f"No DigitalObject with doid={doid} found in the database.")  
-                        return False
-                    else:  
-                        logging.debug(f"DigitalObject with doid={doid} deleted from database.")  
-                        return True
+                with self._begin(db_url) as connection:  
+                    rowcount = self._delete_row(connection, doid)  
+                self._invalidate(db_url, doid)
+                logging.debug(f"Rows affected: {rowcount}")  
+                if rowcount == 0:  
+                    logging.warning(f"No DigitalObject with doid={doid} found in the database.")  
+                    return False
+                else:  
+                    logging.debug(f"DigitalObject with doid={doid} deleted from database.")  
+                    return True
   
             except Exception as e:  
                 logging.error(f"Failed to delete DigitalObject from database: {e}") 
+                self._raise_in_transaction(db_url)
                 return False
         else:
-            return False 
+            return self._delete_file(doid, db_url)
+
+    def save_many(self, dos, batch_size=500, url=None, content_ids=False):
+        """
+        Saves many DigitalObjects, one transaction and one executemany per batch.
+
+        If a batch fails as a whole (for example because one doid already
+        exists), it is retried row by row inside the same transaction so that
+        every item gets its own outcome.
+
+        Parameters:
+        dos (iterable of DigitalObject): The digital objects to save.
+        batch_size (int, optional): Number of rows written per transaction.
+        url (str, optional): The URL of the repository database.
+        content_ids (bool, optional): Give objects without a doid their content doid, as save does.
+
+        Returns:
+        BatchResult: The doids that were saved and the error of each failed item.
+        """
+        db_url = url or self.repo_db_url
+        result = BatchResult()
+        if not is_sql_url(db_url):
+            for do in dos:
+                if self._save_file(do, db_url, content_ids):
+                    result.succeeded.append(do.doid)
+                else:
+                    result.add_failure(do.doid, "Failed to save DigitalObject to file store.")
+            return result
+        for chunk in chunked(dos, batch_size):
+            rows = []
+            for do in chunk:
+                if do.doid is None and not content_ids:
+                    result.add_failure(None, "Doid is needed for create new do in repository.")
+                    continue
+                try:
+                    rows.append(self._encode_object(do, content_ids))
+                except Exception as e:
+                    result.add_failure(do.doid, f"Failed to serialize data: {e}")
+            if not rows:
+                continue
+            logging.debug(f"Saving batch of {len(rows)} DigitalObjects to {db_url}")
+            saved = len(result.succeeded)
+            try:
+                with self._begin(db_url) as connection:
+                    self._insert_rows(connection, rows)
+                result.succeeded.extend(row["doid"] for row in rows)
+            except Exception as e:
+                # A failed executemany may have written part of the batch, which only a rollback undoes.
+                self._raise_in_transaction(db_url)
+                logging.debug(f"Batch insert failed, retrying row by row: {e}")
+                with self.get_engine(db_url).begin() as connection:
+                    self._insert_rows_individually(connection, rows, result)
+            for doid in result.succeeded[saved:]:
+                self._invalidate(db_url, doid)
+        return result
+
+    def _insert_rows_individually(self, connection, rows, result):
+        for row in rows:
+            savepoint = connection.begin_nested()
+            try:
+                self._insert_rows(connection, [row])
+                savepoint.commit()
+                result.succeeded.append(row["doid"])
+            except Exception as e:
+                savepoint.rollback()
+                result.add_failure(row["doid"], str(e))
+
+    def load_many(self, doids, batch_size=500, url=None, columnar=False):
+        """
+        Loads many DigitalObjects with one SELECT ... WHERE doid IN (...) per batch.
+
+        Parameters:
+        doids (iterable of str): The identifiers to load.
+        batch_size (int, optional): Number of doids looked up per query.
+        url (str, optional): The URL of the repository database.
+        columnar (bool, optional): Return the found objects as a DigitalObjectBatch instead of a list.
+
+        Returns:
+        list: One entry per requested doid, in input order; the DigitalObject,
+        or None if the doid is missing or its data cannot be decoded.
+        With columnar=True, a DigitalObjectBatch of the found objects, in input order.
+        """
+        db_url = url or self.repo_db_url
+        doids = list(doids)
+        if columnar:
+            return DigitalObjectBatch.from_objects(self.load_many(doids, batch_size, db_url))
+        if not is_sql_url(db_url):
+            return [self.load(doid, db_url) or None for doid in doids]
+        found = {}
+        pending = dict.fromkeys(doids)
+        if self.cache is not None:
+            for doid in list(pending):
+                cached = self.cache.get((db_url, doid))
+                if cached is not None:
+                    found[doid] = cached
+                    del pending[doid]
+        with self._connect(db_url) as connection:
+            for chunk in chunked(pending, batch_size):
+                for doid, data, metadata, codec, compression in self._fetch_rows(connection, chunk):
+                    try:
+                        found[doid] = DigitalObject(
+                            data=self._decode_data(data, codec, compression),
+                            metadata=metadata,
+                            doid=doid
+                        )
+                        if self.cache is not None:
+                            self.cache.put((db_url, doid), found[doid], len(data))
+                    except Exception as e:
+                        logging.error(f"Failed to load DigitalObject with doid={doid}: {e}")
+        missing = len(doids) - sum(1 for doid in doids if doid in found)
+        if missing:
+            logging.warning(f"{missing} of {len(doids)} requested DigitalObjects were not found.")
+        return [found.get(doid) for doid in doids]
+
+    def delete_many(self, doids, batch_size=500, url=None):
+        """
+        Deletes many DigitalObjects, one transaction per batch.
+
+        Parameters:
+        doids (iterable of str): The identifiers to delete.
+        batch_size (int, optional): Number of doids deleted per transaction.
+        url (str, optional): The URL of the repository database.
+
+        Returns:
+        BatchResult: The doids that were deleted and the error of each failed item.
+        """
+        db_url = url or self.repo_db_url
+        result = BatchResult()
+        if not is_sql_url(db_url):
+            for doid in doids:
+                if self._delete_file(doid, db_url):
+                    result.succeeded.append(doid)
+                else:
+                    result.add_failure(doid, "No DigitalObject with this doid found in file store.")
+            return result
+        for chunk in chunked(doids, batch_size):
+            try:
+                with self._begin(db_url) as connection:
+                    existing = self._delete_rows(connection, chunk)
+                for doid in existing:
+                    self._invalidate(db_url, doid)
+            except Exception as e:
+                logging.error(f"Failed to delete batch of DigitalObjects from database: {e}")
+                self._raise_in_transaction(db_url)
+                for doid in chunk:
+                    result.add_failure(doid, str(e))
+                continue
+            for doid in chunk:
+                if doid in existing:
+                    result.succeeded.append(doid)
+                    # 同一批次中重复的 doid 只算一次
+                    existing.discard(doid)
+                else:
+                    result.add_failure(doid, "No DigitalObject with this doid found in the database.")
+        return result
+
+    def collect_garbage(self, url=None):
+        """
+        Deletes blobs that are no longer referenced by any DigitalObject.
+
+        delete and update already drop blobs whose last reference goes away.
+        This recounts every blob's references from the stored objects first, so
+        blobs whose refcount drifted, e.g. after an interrupted writer, are swept up too.
+
+        Parameters:
+        url (str, optional): The URL of the repository database.
+
+        Returns:
+        int: Number of blobs deleted.
+        """
+        with self._begin(url or self.repo_db_url) as connection:
+            connection.execute(recount_blob_refs)
+            result = connection.execute(delete_unreferenced_blobs)
+        logging.debug(f"Collected {result.rowcount} unreferenced blobs.")
+        return result.rowcount
+
+    def save_stream(self, doid, chunks, metadata=None, chunk_size=DEFAULT_CHUNK_SIZE, url=None):
+        """
+        Creates a DigitalObject whose bytes payload is written incrementally.
+
+        The incoming bytes are regrouped into fixed-size chunks and written as
+        they arrive, so at most one chunk is held in memory. In a database the
+        chunks go to the object_chunks table inside a single transaction; in a
+        file store they are appended to the object file before it is published.
+
+        Parameters:
+        doid (str): Identifier of the new object.
+        chunks (iterable of bytes): The payload, in pieces of any size.
+        metadata (dict, optional): Metadata of the object.
+        chunk_size (int, optional): Size of the stored chunks in bytes.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bool: True if the object was created.
+        """
+        db_url = url or self.repo_db_url
+        metadata = metadata if metadata is not None else {}
+        logging.debug(f"Streaming DigitalObject with doid={doid} to {db_url}")
+        try:
+            if not is_sql_url(db_url):
+                if not self.get_file_store(db_url).write_stream(doid, metadata, rechunk(chunks, chunk_size)):
+                    logging.error(f"DigitalObject with doid={doid} already exists in file store.")
+                    return False
+                return True
+            with self._begin(db_url) as connection:
+                connection.execute(insert_digital_object, {
+                    "doid": doid, "data": None, "metadata": metadata, "codec": "bytes", "compression": None,
+                    "blob_hash": None, "stream_size": 0, "chunk_size": chunk_size})
+                size = 0
+
+                def written():
+                    nonlocal size
+                    for seq, chunk in enumerate(rechunk(chunks, chunk_size)):
+                        connection.execute(insert_object_chunk, {"doid": doid, "seq": seq, "data": chunk})
+                        size += len(chunk)
+                        yield chunk
+                etag = object_etag(written(), metadata)
+                connection.execute(update_digital_object, {"b_doid": doid, "stream_size": size, "etag": etag})
+            logging.debug(f"Streamed {size} bytes for doid={doid}.")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to stream DigitalObject to repository: {e}")
+            self._raise_in_transaction(db_url)
+            return False
+
+    def is_byte_stream(self, doid, url=None):
+        """
+        Returns whether a DigitalObject's payload is raw bytes, without reading the payload.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bool: True for objects written by save_stream or stored with the bytes codec, False for
+        other objects, None if the object does not exist in a database.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            return self.get_file_store(db_url).payload_range(doid) is not None
+        with self._connect(db_url) as connection:
+            row = connection.execute(select_payload_format, {"doid": doid}).fetchone()
+        if row is None:
+            return None
+        stream_size, codec = row
+        return stream_size is not None or codec == "bytes"
+
+    def open_stream(self, doid, url=None):
+        """
+        Opens a DigitalObject's bytes payload as a seekable, read-only file object.
+
+        Objects written by save_stream are read chunk by chunk; other objects
+        stored with the bytes codec and no compression are read in ranges of
+        DEFAULT_CHUNK_SIZE bytes from their payload column. A compressed bytes
+        payload cannot be read in ranges and is decompressed whole.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        io.BufferedReader: The reader, with a `size` attribute on its `raw` member, or None if the
+        object does not exist or is not a raw bytes payload.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            location = self.get_file_store(db_url).payload_range(doid)
+            if location is None:
+                return None
+            return io.BufferedReader(FileSliceReader(*location))
+        engine = self.get_engine(db_url)
+        with self._connect(db_url) as connection:
+            info = connection.execute(select_stream_info, {"doid": doid}).fetchone()
+            payload_info = None
+            if info is not None and info[0] is None:
+                payload_info = connection.execute(select_payload_info, {"doid": doid}).fetchone()
+        if info is None:
+            return None
+        if payload_info is not None:
+            size, codec, compressor = payload_info
+            if codec != "bytes":
+                return None
+            if compressor is not None:
+                do = self.load(doid, db_url)
+                if not do:
+                    return None
+                return io.BufferedReader(ChunkedReader(lambda seq: do.data, len(do.data), max(len(do.data), 1)))
+            chunk_size = DEFAULT_CHUNK_SIZE
+
+            def fetch_chunk(seq):
+                with engine.connect() as connection:
+                    return connection.execute(select_payload_range, {
+                        "doid": doid, "start": seq * chunk_size + 1, "length": chunk_size}).scalar() or b""
+            return io.BufferedReader(ChunkedReader(fetch_chunk, size or 0, chunk_size), buffer_size=chunk_size)
+        size, chunk_size = info
+
+        def fetch_chunk(seq):
+            with engine.connect() as connection:
+                return connection.execute(select_object_chunk, {"doid": doid, "seq": seq}).scalar() or b""
+        return io.BufferedReader(ChunkedReader(fetch_chunk, size, chunk_size), buffer_size=chunk_size)
+
+    def read_range(self, doid, start, length, url=None):
+        """
+        Reads a byte range of a DigitalObject's bytes payload without loading the rest.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        start (int): Offset of the first byte.
+        length (int): Maximum number of bytes to read.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bytes: The requested bytes, shorter at the end of the payload, or None if the object
+        cannot be streamed.
+        """
+        reader = self.open_stream(doid, url)
+        if reader is None:
+            return None
+        with reader:
+            reader.seek(start)
+            return reader.read(length)
+
+    def _neighbours(self, connection, direction, db_url):
+        if connection is not None:
+            return lineage.sql_neighbours(connection, direction)
+        return lineage.adjacency_neighbours(self.get_file_store(db_url).edges(), direction)
+
+    def _lineage(self, direction, doid, depth, url):
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            return lineage.traverse(self._neighbours(None, direction, db_url), doid, depth)
+        with self._connect(db_url) as connection:
+            return lineage.traverse(self._neighbours(connection, direction, db_url), doid, depth)
+
+    def upstream(self, doid, depth=None, url=None):
+        """
+        Returns the DigitalObjects a DigitalObject was derived from, directly or transitively.
+
+        Follows relationships from their to_ddo_doids back to their from_ddo_doids
+        using the indexed relationship_edges table, one query per level.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        depth (int, optional): Maximum number of relationship hops; None for the whole lineage.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        dict: Ancestor doids mapped to their distance in hops, nearest first.
+        """
+        return self._lineage(lineage.UPSTREAM, doid, depth, url)
+
+    def downstream(self, doid, depth=None, url=None):
+        """
+        Returns the DigitalObjects derived from a DigitalObject, directly or transitively.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        depth (int, optional): Maximum number of relationship hops; None for all descendants.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        dict: Descendant doids mapped to their distance in hops, nearest first.
+        """
+        return self._lineage(lineage.DOWNSTREAM, doid, depth, url)
+
+    def shortest_path(self, source, target, url=None):
+        """
+        Returns a shortest chain of relationships leading from one DigitalObject to another.
+
+        Parameters:
+        source (str): The doid the path starts from.
+        target (str): The doid the path leads to, following relationships from source to target.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        list of str: The doids along the path, source and target included, or None if there is none.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            return lineage.shortest_path(self._neighbours(None, lineage.DOWNSTREAM, db_url),
+                                         self._neighbours(None, lineage.UPSTREAM, db_url), source, target)
+        with self._connect(db_url) as connection:
+            return lineage.shortest_path(self._neighbours(connection, lineage.DOWNSTREAM, db_url),
+                                         self._neighbours(connection, lineage.UPSTREAM, db_url), source, target)
+
+    def query(self, filters=None, order_by=None, limit=None, cursor=None, url=None):
+        """
+        Finds DigitalObjects by their metadata, without reading or decoding payloads.
+
+        Filters compare metadata fields addressed by dotted paths, e.g.
+        {"author.name": "ada", "year": (">=", 2020), "kind": ("in", ["raw", "clean"])}.
+        Supported operators are ==, !=, <, <=, >, >= and in; a bare value means ==.
+        In SQLite fields are read with json_extract, so paths declared with
+        create_metadata_index are answered from an index; see explain.
+
+        Results come in pages of `limit` rows. Pass the returned cursor to get
+        the next page; pages are keyed on the sort value and doid, so they stay
+        consistent while objects are added.
+
+        Parameters:
+        filters (dict, optional): Metadata path mapped to a value or an (operator, value) tuple.
+        order_by (str, optional): Metadata path to sort by, prefixed with "-" for descending order;
+            results are sorted by doid otherwise.
+        limit (int, optional): Maximum number of results per page.
+        cursor (str, optional): Cursor of the previous page.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        QueryResult: The (doid, metadata) rows of the page and the cursor of the next page.
+        """
+        db_url = url or self.repo_db_url
+        fetch = limit + 1 if limit is not None else None
+        if is_sql_url(db_url):
+            statement = query_module.build_query(filters, order_by, fetch, cursor)
+            with self._connect(db_url) as connection:
+                rows = [(row[0], json.loads(row[1]) if isinstance(row[1], str) else row[1],
+                         row[2] if order_by else None) for row in connection.execute(statement)]
+        else:
+            store = self.get_file_store(db_url)
+            records = ((doid, store.read_metadata(doid)) for doid in store.doids())
+            rows = query_module.filter_records(records, filters, order_by, fetch, cursor)
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = query_module.encode_cursor(rows[-1][2], rows[-1][0])
+        return QueryResult([(doid, metadata) for doid, metadata, _ in rows], next_cursor)
+
+    def explain(self, filters=None, order_by=None, url=None):
+        """
+        Shows how the database would run a query, and which indexes it would use.
+
+        Parameters:
+        filters (dict, optional): As for query.
+        order_by (str, optional): As for query.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        dict: "sql" (the statement), "plan" (list of plan lines) and "indexes" (names of the indexes used,
+        empty when the table is scanned).
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url):
+            return {"sql": None, "plan": ["SCAN file store metadata"], "indexes": []}
+        engine = self.get_engine(db_url)
+        compiled = query_module.build_query(filters, order_by).compile(
+            dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+        sql = str(compiled)
+        params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+        sqlite = engine.dialect.name == "sqlite"
+        with engine.connect() as connection:
+            prefix = "EXPLAIN "
+            if sqlite:
+                # EXPLAIN does not check the schema cookie, so a statement cached before an index was
+                # created or dropped would report the old plan; the schema version keeps the text unique.
+                schema_version = connection.exec_driver_sql("PRAGMA schema_version").scalar()
+                prefix = f"EXPLAIN QUERY PLAN /* schema {schema_version} */ "
+            rows = connection.exec_driver_sql(prefix + sql, params).fetchall()
+        if sqlite:
+            plan = [row[-1] for row in rows]
+            # A SCAN walking the primary key index only to produce doid order still reads every row;
+            # only SEARCH lines, and scans of a metadata index that serve its sort order, use an index.
+            indexes = [match.group(1) for line in plan
+                       for match in [re.search(r"USING (?:COVERING )?INDEX (\w+)", line)]
+                       if match and (line.startswith("SEARCH") or query_module.is_metadata_index(match.group(1)))]
+        else:
+            plan = [str(dict(row._mapping)) for row in rows]
+            # type "index" is a full scan of the index, as good as a table scan.
+            indexes = [row._mapping["key"] for row in rows
+                       if row._mapping.get("key") and row._mapping.get("type") != "index"]
+        return {"sql": sql, "plan": plan, "indexes": indexes}
+
+    def create_metadata_index(self, path, url=None):
+        """
+        Declares an indexed metadata path, so queries filtering or sorting on it avoid a table scan.
+
+        The index is a SQLite expression index on json_extract(metadata, '$.<path>'),
+        maintained by SQLite on every write.
+
+        Parameters:
+        path (str): Dotted path of a metadata field, e.g. "author.name".
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bool: True if the index exists afterwards; False for databases other than SQLite and for file stores.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url) or self.get_engine(db_url).dialect.name != "sqlite":
+            logging.error(f"Metadata indexes are only supported on SQLite repositories.")
+            return False
+        with self._begin(db_url) as connection:
+            connection.exec_driver_sql(query_module.create_index_sql(path))
+        logging.debug(f"Created metadata index on {path} in {db_url}")
+        return True
+
+    def drop_metadata_index(self, path, url=None):
+        """
+        Removes the index of a metadata path.
+
+        Parameters:
+        path (str): Dotted path of a metadata field.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        bool: True if the index is gone afterwards; False for databases other than SQLite and for file stores.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url) or self.get_engine(db_url).dialect.name != "sqlite":
+            logging.error(f"Metadata indexes are only supported on SQLite repositories.")
+            return False
+        with self._begin(db_url) as connection:
+            connection.exec_driver_sql(query_module.drop_index_sql(path))
+        return True
+
+    def metadata_indexes(self, url=None):
+        """
+        Returns the indexed metadata paths.
+
+        Parameters:
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        list of str: The dotted paths with an index.
+        """
+        db_url = url or self.repo_db_url
+        if not is_sql_url(db_url) or self.get_engine(db_url).dialect.name != "sqlite":
+            return []
+        with self._connect(db_url) as connection:
+            names = connection.execute(query_module.list_indexes_sql()).scalars()
+            return [query_module.path_from_index_name(name) for name in names]
+
+    def relationships(self, url=None, to_doids=None):
+        """
+        Reads the relationships of the repository into a columnar RelationshipSet.
+
+        Parameters:
+        url (str, optional): The URL of the repository.
+        to_doids (iterable of str, optional): Only read relationships targeting one of these doids,
+            found through the relationship_edges index on SQL repositories.
+
+        Returns:
+        RelationshipSet: The relationships.
+        """
+        db_url = url or self.repo_db_url
+        targets = set(to_doids) if to_doids is not None else None
+        relationships = RelationshipSet()
+        if is_sql_url(db_url):
+            with self._connect(db_url) as connection:
+                if targets is None:
+                    rows = connection.execute(select_relationships)
+                else:
+                    relationship_doids = {row[2] for chunk in chunked(targets, 500)
+                                          for row in connection.execute(select_edge_rows_to, {"doids": chunk})}
+                    rows = [row for chunk in chunked(relationship_doids, 500)
+                            for row in connection.execute(select_relationships_in, {"doids": chunk})]
+                for doid, from_ddo_doids, to_ddo_doids, metadata in rows:
+                    relationships.add(doid, from_ddo_doids, to_ddo_doids, metadata)
+        else:
+            for doid, from_ddo_doids, to_ddo_doids, metadata in self.get_file_store(db_url).relationships():
+                if targets is None or targets.intersection(to_ddo_doids or []):
+                    relationships.add(doid, from_ddo_doids, to_ddo_doids, metadata)
+        return relationships
+
+    def relationship_buffer(self, batch_size=1000, flush_interval=5.0, url=None):
+        """
+        Returns a RelationshipBuffer writing to this repository.
+
+        Parameters:
+        batch_size (int, optional): Number of pending relationships that triggers a flush.
+        flush_interval (float, optional): Seconds after which pending relationships are flushed, None to disable.
+        url (str, optional): The URL of the repository.
+
+        Returns:
+        RelationshipBuffer: The buffer; use it as a context manager or close it to write the last batch.
+        """
+        return RelationshipBuffer(url, self, batch_size, flush_interval)
   
 # 待修改
 class Relationship:
@@ -287,7 +1474,10 @@ class Relationship:
     to_ddo_doids (list of str): The target data object identifiers.
     metadata (dict): Metadata associated with the relationship, including description.
     """
-    def __init__(self, from_ddo_doids, to_ddo_doids, metadata, url=None):
+    __slots__ = ("_from_ddo_doids", "_to_ddo_doids", "_metadata", "_doid")
+
+    def __init__(self, from_ddo_doids, to_ddo_doids, metadata, url=None, repo=None, persist=True, buffer=None,
+                 doid=None):
         """
         Initializes a Relationship.
 
@@ -295,12 +1485,24 @@ class Relationship:
         from_ddo_doids (list of str): The originating data object identifiers.
         to_ddo_doids (list of str): The target data object identifiers.
         metadata (dict): Metadata associated with the relationship.
+        url (str, optional): The URL or path to the storage location.
+        repo (DigitalObjectRepository, optional): Repository whose pooled engines are reused for the write.
+        persist (bool, optional): Whether to store the relationship; False only builds the object,
+            which can be saved later with save or RelationshipBuffer.add.
+        buffer (RelationshipBuffer, optional): Buffer that writes the relationship with the next batch
+            instead of in a transaction of its own; url and repo are then ignored.
+        doid (str, optional): Identifier of a relationship read back from storage; a new one is generated if omitted.
         """
         self._from_ddo_doids = from_ddo_doids
         self._to_ddo_doids = to_ddo_doids
         self._metadata = metadata
-        self._doid = self._generate_internal_id()
-        self.save(url)
+        self._doid = doid or self._generate_internal_id()
+        if not persist:
+            return
+        if buffer is not None:
+            buffer.add(self)
+        else:
+            self.save(url, repo)
 
     @property
     def from_ddo_doids(self):
@@ -321,31 +1523,47 @@ class Relationship:
     def _generate_internal_id(self):
         return str(uuid.uuid4())
     
-    def save(self, url=None):
-        db_url = url 
-        logging.debug(f"Saving Relationship with doid={self.doid} to {db_url}")
-        if db_url.startswith("sqlite://") or db_url.startswith("mysql://"):
-            engine = create_engine(db_url)
-            with engine.connect() as connection:
-                metadata = MetaData()
-                relationships_table = Table(
-                                                'relationships', metadata,
-                                                Column('doid', String, primary_key=True),
-                                                Column('from_ddo_doids', JSON),
-                                                Column('to_ddo_doids', JSON),
-                                                Column('metadata', JSON))
-                metadata.create_all(engine)
-                stmt = insert(relationships_table).values(doid=self.doid, from_ddo_doids=self.from_ddo_doids, to_ddo_doids=self.to_ddo_doids, metadata=self.metadata)
-                connection.execute(stmt)
-                connection.commit()
-                logging.debug(f"Relationship with doid={self.doid} saved to database.")
+    def save(self, url=None, repo=None):
+        return Relationship.save_many([self], url, repo)
+
+    @staticmethod
+    def save_many(relationships, url=None, repo=None):
+        """
+        Saves relationships in a single transaction, with one executemany per table.
+
+        Parameters:
+        relationships (list of Relationship): The relationships to save.
+        url (str, optional): The URL or path to the storage location.
+        repo (DigitalObjectRepository, optional): Repository whose pooled engines are reused for the write.
+
+        Returns:
+        bool: True once the relationships are written.
+        """
+        db_url = url or (repo.repo_db_url if repo else None)
+        if not relationships:
+            return True
+        logging.debug(f"Saving {len(relationships)} Relationships to {db_url}")
+        if is_sql_url(db_url):
+            engine = repo.get_engine(db_url) if repo else default_engines.get(db_url)
+            edges = []
+            for relationship in relationships:
+                edges.extend(relationship_edge_rows(relationship.doid, relationship.from_ddo_doids,
+                                                    relationship.to_ddo_doids))
+            # Inside DigitalObjectRepository.transaction the rows join its unit of work.
+            with begin(engine, db_url) as connection:
+                connection.execute(insert_relationship, [
+                    {"doid": relationship.doid, "from_ddo_doids": relationship.from_ddo_doids,
+                     "to_ddo_doids": relationship.to_ddo_doids, "metadata": relationship.metadata}
+                    for relationship in relationships])
+                if edges:
+                    connection.execute(insert_relationship_edge, edges)
+            logging.debug(f"{len(relationships)} Relationships saved to database.")
         else:
-            if not os.path.exists(db_url):
-                os.makedirs(db_url)
-            filename = os.path.join(db_url, f"{self.doid}.dill")
-            with open(filename, 'wb') as file:
-                dill.dump(self, file)
-            logging.debug(f"Relationship with doid={self.doid} saved to file {filename}.")
+            store = repo.get_file_store(db_url) if repo else get_store(db_url)
+            for relationship in relationships:
+                filename = store.write_relationship(relationship.doid, relationship.from_ddo_doids,
+                                                    relationship.to_ddo_doids, relationship.metadata)
+                logging.debug(f"Relationship with doid={relationship.doid} saved to file {filename}.")
         return True
 
     def __repr__(self):
@@ -358,24 +1576,177 @@ class Relationship:
         return f"Relationship(from_ddo_doids={self.from_ddo_doids}, to_ddo_doids={self.to_ddo_doids}, metadata={self.metadata})"
 
 
+class RelationshipBuffer:
+    """
+    Write buffer that saves Relationships in batches.
+
+    Relationships are held in memory and written with Relationship.save_many,
+    one transaction per batch, when `batch_size` are pending, when the oldest
+    pending one has waited `flush_interval` seconds, on flush(), and when the
+    buffer is closed or its with-block exits. Relationships still pending when
+    the process dies without closing the buffer are lost.
+
+    Attributes:
+    url (str): The URL or path to the storage location.
+    repo (DigitalObjectRepository): Repository whose pooled engines are reused for the writes, or None.
+    batch_size (int): Number of pending relationships that triggers a flush.
+    flush_interval (float): Seconds after which pending relationships are flushed, None to disable.
+    """
+    def __init__(self, url=None, repo=None, batch_size=1000, flush_interval=5.0):
+        """
+        Initializes a RelationshipBuffer.
+
+        Parameters:
+        url (str, optional): The URL or path to the storage location, defaults to the repository URL.
+        repo (DigitalObjectRepository, optional): Repository whose pooled engines are reused for the writes.
+        batch_size (int, optional): Number of pending relationships that triggers a flush.
+        flush_interval (float, optional): Seconds after which pending relationships are flushed, None to disable.
+        """
+        self.url = url
+        self.repo = repo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def add(self, relationship):
+        """
+        Queues a relationship for the next batch, flushing if the batch is full.
+
+        Parameters:
+        relationship (Relationship): The relationship to save.
+        """
+        with self._lock:
+            self._pending.append(relationship)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None and self.flush_interval is not None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error(f"Failed to flush buffered Relationships: {e}")
+
+    def flush(self):
+        """
+        Writes all pending relationships now.
+
+        Returns:
+        int: Number of relationships written.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            try:
+                Relationship.save_many(pending, self.url, self.repo)
+            except Exception:
+                # Keep the batch so a later flush can retry it.
+                self._pending = pending + self._pending
+                raise
+            return len(pending)
+
+    def close(self):
+        """
+        Flushes pending relationships and stops the flush timer.
+        """
+        self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
 class IdentifierResolutionService:  
-    def __init__(self, repository):  
+    """
+    Service generating doids for new DigitalObjects and resolving doids to objects.
+
+    Modes:
+    "hash": `<millis>_<sha256 of str(data)>`, the original scheme.
+    "sequential": monotonic, sortable ids from timestamp, node id and counter; the payload is never read.
+    "content": `sha256-<digest>` of the payload serialized with the repository codec and the metadata,
+        so equal objects get equal ids. Saving with `repository.save(do, content_id=True)` computes it
+        from the bytes being written instead of serializing the payload twice.
+    """
+    MODES = ("hash", "sequential", "content")
+
+    def __init__(self, repository, mode="hash", node_id=None):  
+        """
+        Initializes an IdentifierResolutionService.
+
+        Parameters:
+        repository (DigitalObjectRepository): Repository used for resolution.
+        mode (str, optional): Id generation mode, one of MODES.
+        node_id (int, optional): 32-bit node id for sequential ids, unique per generating process.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown id generation mode {mode}, expected one of {self.MODES}.")
         self.repository = repository
+        self.mode = mode
+        self._sequential = SequentialIdGenerator(node_id)
 
-    def generate(self,data):  
+    def generate(self,data,metadata=None):  
         """  
         生成一个基于当前时间和数据的唯一标识符。  
   
         参数:  
             data (object): 需要生成标识符的数据对象。  
+            metadata (dict, optional): 对象的元数据，content 模式下参与哈希。  
   
         返回:  
             str: 生成的唯一标识符。  
         """  
+        if self.mode == "sequential":
+            return self._sequential.generate()
+        if self.mode == "content":
+            codec = getattr(self.repository, "codec", serialization.AUTO)
+            _, payload = serialization.encode(data, codec)
+            return self.content_id(payload, metadata)
         timestamp = str(int(time.time() * 1000))   
         data_hash = hashlib.sha256(str(data).encode()).hexdigest()     
         unique_id = f"{timestamp}_{data_hash}"  
         return unique_id  
+
+    def generate_many(self, n):
+        """
+        Generates `n` sequential ids at once for bulk ingest.
+
+        Ids come from the sequential generator whatever the mode, since no payload is involved.
+
+        Parameters:
+        n (int): Number of ids.
+
+        Returns:
+        list of str: The new ids, in increasing order.
+        """
+        return self._sequential.generate_many(n)
+
+    def content_id(self, payload, metadata=None):
+        """
+        Returns the content-hash doid of already-serialized bytes.
+
+        Parameters:
+        payload (bytes or iterable of bytes): The serialized payload or its chunks.
+        metadata (dict, optional): Metadata hashed after the payload.
+
+        Returns:
+        str: `sha256-<digest>`.
+        """
+        return content_doid(payload, metadata)
     
     def resolution(self, doid, url=None):  
         """  
@@ -1,106 +1,430 @@
 from .dos import DataDigitalObject
 from .core import DigitalObjectRepository,IdentifierResolutionService
-from flask import Flask, jsonify, request, abort
+from .engine import default_engines
+from .memo import Memoizer
+from .server import serve_threaded, serve_workers
+from .streams import iter_range
+from .utils import chunked
+from collections import Counter
+import functools
+from flask import Flask, Response, current_app, jsonify, request, abort, redirect, stream_with_context, url_for
+import json
 import logging
+import os
+import re
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _ndjson_items(stream):
+    # 逐行解析请求体，无法解析的行产生 None，由调用方报告为该条目的错误
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def _batch_items(key):
+    """
+    Returns the items of a batch request: the `key` list of a JSON body, or the
+    lines of an NDJSON body, parsed one at a time as the body is read.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        return _ndjson_items(request.stream)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get(key), list):
+        abort(400, description=f"Expected a JSON object with a '{key}' list, or an NDJSON body")
+    return iter(body[key])
+
+
+def _ndjson_response(results):
+    """
+    Streams result dicts as NDJSON, one line per item, as they are produced.
+    """
+    def lines():
+        for result in results:
+            try:
+                line = current_app.json.dumps(result)
+            except TypeError as e:
+                error = {key: result[key] for key in ("index", "doid") if key in result}
+                error.update(status=500, error=f"Data is not JSON serializable: {e}")
+                line = current_app.json.dumps(error)
+            yield line + "\n"
+    return Response(stream_with_context(lines()), mimetype=NDJSON_MIMETYPE)
 
 class DDOInstance:
-    def __init__(self, repo=None, IRS=None, repo_url=None):  
+    def __init__(self, repo=None, IRS=None, repo_url=None, cache=None, id_mode="sequential", engines=None):  
+        """
+        Initializes a DDOInstance.
+
+        Parameters:
+        repo (DigitalObjectRepository, optional): The repository to serve.
+        IRS (IdentifierResolutionService, optional): Service generating doids; id_mode is ignored when given.
+        repo_url (str, optional): URL of a repository to open instead of repo.
+        cache (ObjectCache or bool, optional): Read-through cache of a repository opened from repo_url.
+        id_mode (str, optional): Doid generation mode of the default IRS, one of
+            IdentifierResolutionService.MODES. "sequential" never collides; "hash" is the original scheme.
+        engines (EngineRegistry, optional): Pools of a repository opened from repo_url; defaults to the
+            shared engine.default_engines, so instances and StorageManagers on one database share a pool.
+        """
+        if engines is None:
+            engines = default_engines
         if repo_url:  
-            self.repo = DigitalObjectRepository(repo_url)    
+            self.repo = DigitalObjectRepository(repo_url, cache=cache, engines=engines)    
             if IRS is None:  
-                self.IRS = IdentifierResolutionService(self.repo) 
+                self.IRS = IdentifierResolutionService(self.repo, mode=id_mode) 
             else:  
                 self.IRS = IRS  
         elif repo:    
             self.repo = repo  
             if IRS is None:  
-                self.IRS = IdentifierResolutionService(self.repo)
+                self.IRS = IdentifierResolutionService(self.repo, mode=id_mode)
             else:  
                 self.IRS = IRS  
         else:   
             raise ValueError("Either 'repo' or 'repo_url' must be provided.")
-        
-    def start_server(self, host='127.0.0.1', port=5000,protocol='http',environment='development'):
-        if protocol == 'http':
-            # 待办：使用gunicorn实现生产环境
-            app = Flask(__name__)
-
-            @app.route('/hello', methods=['GET'])
-            def handle_hello():
-                return jsonify({"message": "Hello from Digital Object Repository!"})
-
-            @app.route('/create', methods=['POST'])
-            def handle_create():
-                try:
-                    data = request.json['data']
-                    metadata = request.json['metadata']
-                    do = DataDigitalObject(data=data, metadata=metadata, IRS=self.IRS)
-                    if self.repo.save(do):
-                        return jsonify({"message": "Digital Object created", "doid": do.doid}), 201
-                    else:
-                        return jsonify({"error": "Failed to create Digital Object"}), 500
-                except KeyError:
-                    abort(400, description="Missing data or metadata in request")
-
-            @app.route('/retrieve/<doid>', methods=['GET'])
-            def handle_retrieve(doid):
+
+    def _content_ids(self):
+        return getattr(self.IRS, "mode", None) == "content"
+
+    def _new_ddo(self, data, metadata, doid=None):
+        # 内容寻址模式下 doid 由 save 根据写入的字节计算，避免重复序列化
+        if doid or self._content_ids():
+            return DataDigitalObject(data, metadata, doid=doid)
+        return DataDigitalObject(data, metadata, self.IRS)
+
+    def close(self):
+        """
+        Closes the connection pools of the underlying repository.
+        """
+        self.repo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def create_app(self):
+        """
+        Builds the Flask WSGI application serving this instance's repository.
+
+        Returns:
+        Flask: The application, ready to be run by any WSGI server.
+        """
+        app = Flask(__name__)
+
+        @app.route('/hello', methods=['GET'])
+        def handle_hello():
+            return jsonify({"message": "Hello from Digital Object Repository!"})
+
+        @app.route('/create', methods=['POST'])
+        def handle_create():
+            try:
+                data = request.json['data']
+                metadata = request.json['metadata']
+                do = self._new_ddo(data, metadata)
+                if self.repo.save(do, content_id=self._content_ids()):
+                    return jsonify({"message": "Digital Object created", "doid": do.doid}), 201
+                else:
+                    return jsonify({"error": "Failed to create Digital Object"}), 500
+            except KeyError:
+                abort(400, description="Missing data or metadata in request")
+
+        @app.route('/retrieve/<doid>', methods=['GET'])
+        def handle_retrieve(doid):
+            # 先只读取 ETag，客户端副本仍有效时直接返回 304，不读取也不解码数据
+            etag = self.repo.get_etag(doid)
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                # 二进制数据无法放入 JSON，改由流式接口返回；先只查格式，不把整个对象读入内存
+                if self.repo.is_byte_stream(doid):
+                    return redirect(url_for('handle_retrieve_stream', doid=doid), 303)
                 digital_object = self.repo.retrieve(doid)
-                if digital_object:
-                    return jsonify({
+                if not digital_object:
+                    return jsonify({"error": "Digital Object not found"}), 404
+                try:
+                    response = jsonify({
                         "data": digital_object.data,
                         "metadata": digital_object.metadata,
                         "doid": digital_object.doid
-                    }), 200
+                    })
+                except TypeError as e:
+                    return jsonify({"error": f"Data is not JSON serializable: {e}"}), 415
+            if etag is not None:
+                response.set_etag(etag)
+            # 允许缓存保存副本，但每次使用前须用 ETag 重新验证
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        @app.route('/retrieve/<doid>/stream', methods=['GET'])
+        def handle_retrieve_stream(doid):
+            # 按块流式返回字节数据，支持单段 Range 请求，不在内存中保留整个对象
+            reader = self.repo.open_stream(doid)
+            if reader is None:
+                return jsonify({"error": "Digital Object not found or not a byte stream"}), 404
+            size = reader.raw.size
+            start, end, status = 0, size, 200
+            match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get('Range', ''))
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) + 1, size) if match.group(2) else size
                 else:
-                    return jsonify({"error": "Digital Object not found"}), 404
+                    start = max(size - int(match.group(2)), 0)
+                if start >= size or start >= end:
+                    reader.close()
+                    return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+                status = 206
+            headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+            if status == 206:
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            return Response(iter_range(reader, start, end), status=status, headers=headers,
+                            mimetype="application/octet-stream", direct_passthrough=True)
 
-            @app.route('/update/<doid>', methods=['PUT'])
-            def handle_update(doid):
-                try:
-                    data = request.json['data']
-                    metadata = request.json['metadata']
-                    new_do = DataDigitalObject(data=data, metadata=metadata, doid=doid)
-                    if self.repo.update(doid, new_do):
-                        return jsonify({"message": "Digital Object updated"}), 200
-                    else:
-                        return jsonify({"error": "Failed to update Digital Object"}), 500
-                except KeyError:
-                    abort(400, description="Missing data or metadata in request")
-
-            @app.route('/delete/<doid>', methods=['DELETE'])
-            def handle_delete(doid):
-                if self.repo.delete(doid):
-                    return jsonify({"message": "Digital Object deleted"}), 200
+        @app.route('/update/<doid>', methods=['PUT'])
+        def handle_update(doid):
+            try:
+                data = request.json['data']
+                metadata = request.json['metadata']
+                new_do = DataDigitalObject(data=data, metadata=metadata, doid=doid)
+                if_match = None
+                if request.if_match:
+                    # 条件更新：只有客户端持有的版本仍是当前版本时才写入
+                    if_match = self.repo.get_etag(doid)
+                    if if_match is None:
+                        return jsonify({"error": "Digital Object not found"}), 404
+                    if not request.if_match.contains(if_match):
+                        return jsonify({"error": "Digital Object has been modified"}), 412
+                if self.repo.update(doid, new_do, if_match=if_match):
+                    response = jsonify({"message": "Digital Object updated"})
+                    etag = self.repo.get_etag(doid)
+                    if etag is not None:
+                        response.set_etag(etag)
+                    return response, 200
+                elif if_match is not None and self.repo.get_etag(doid) != if_match:
+                    return jsonify({"error": "Digital Object has been modified"}), 412
                 else:
-                    return jsonify({"error": "Digital Object not found"}), 404
+                    return jsonify({"error": "Failed to update Digital Object"}), 500
+            except KeyError:
+                abort(400, description="Missing data or metadata in request")
 
-            @app.route('/listops', methods=['GET'])
-            def handle_list_ops():
-                ops = ["Create", "Retrieve", "Update", "Delete", "Hello", "ListOps"]
-                return jsonify({"operations": ops}), 200
+        @app.route('/delete/<doid>', methods=['DELETE'])
+        def handle_delete(doid):
+            if self.repo.delete(doid):
+                return jsonify({"message": "Digital Object deleted"}), 200
+            else:
+                return jsonify({"error": "Digital Object not found"}), 404
 
+        # 批量接口：请求体为 JSON 列表或 NDJSON，响应以 NDJSON 流式返回，每个条目一行并带有各自的状态码
+
+        @app.route('/batch/create', methods=['POST'])
+        def handle_batch_create():
+            items = _batch_items('objects')
+            batch_size = request.args.get('batch_size', 500, type=int)
+
+            def results():
+                index = 0
+                for chunk in chunked(items, batch_size):
+                    lines, dos = [], []
+                    # 与 /create 使用相同的标识模式；顺序标识一次生成整批，同一批中相同的数据也各自得到不同的 doid
+                    doids = None
+                    if getattr(self.IRS, "mode", None) == "sequential":
+                        doids = iter(self.IRS.generate_many(len(chunk)))
+                    for item in chunk:
+                        if isinstance(item, dict) and 'data' in item and 'metadata' in item:
+                            do = self._new_ddo(item['data'], item['metadata'], next(doids) if doids else None)
+                            dos.append(do)
+                            lines.append(({"index": index}, do))
+                        else:
+                            lines.append(({"index": index, "status": 400, "error": "Missing data or metadata"}, None))
+                        index += 1
+                    # 内容寻址模式下 doid 在保存时才确定
+                    result = self.repo.save_many(dos, batch_size=batch_size, content_ids=self._content_ids())
+                    saved = Counter(result.succeeded)
+                    errors = dict(result.failed)
+                    for line, do in lines:
+                        if do is not None:
+                            line["doid"] = do.doid
+                            if saved[do.doid] > 0:
+                                saved[do.doid] -= 1
+                                line["status"] = 201
+                            else:
+                                error = errors.get(do.doid) or "Failed to create Digital Object"
+                                line.update(status=500, error=error.splitlines()[0])
+                        yield line
+            return _ndjson_response(results())
+
+        @app.route('/batch/retrieve', methods=['POST'])
+        def handle_batch_retrieve():
+            items = _batch_items('doids')
+            batch_size = request.args.get('batch_size', 500, type=int)
+
+            def results():
+                for chunk in chunked(items, batch_size):
+                    objects = iter(self.repo.load_many([doid for doid in chunk if isinstance(doid, str)], batch_size))
+                    for doid in chunk:
+                        if not isinstance(doid, str):
+                            yield {"doid": doid, "status": 400, "error": "Invalid doid"}
+                            continue
+                        digital_object = next(objects)
+                        if digital_object:
+                            yield {"doid": doid, "status": 200, "data": digital_object.data,
+                                   "metadata": digital_object.metadata}
+                        else:
+                            yield {"doid": doid, "status": 404, "error": "Digital Object not found"}
+            return _ndjson_response(results())
+
+        @app.route('/batch/delete', methods=['POST', 'DELETE'])
+        def handle_batch_delete():
+            items = _batch_items('doids')
+            batch_size = request.args.get('batch_size', 500, type=int)
+
+            def results():
+                for chunk in chunked(items, batch_size):
+                    result = self.repo.delete_many([doid for doid in chunk if isinstance(doid, str)], batch_size)
+                    deleted = Counter(result.succeeded)
+                    for doid in chunk:
+                        if not isinstance(doid, str):
+                            yield {"doid": doid, "status": 400, "error": "Invalid doid"}
+                        elif deleted[doid] > 0:
+                            deleted[doid] -= 1
+                            yield {"doid": doid, "status": 200}
+                        else:
+                            yield {"doid": doid, "status": 404, "error": "Digital Object not found"}
+            return _ndjson_response(results())
+
+        @app.route('/listops', methods=['GET'])
+        def handle_list_ops():
+            ops = ["Create", "Retrieve", "RetrieveStream", "Update", "Delete",
+                   "BatchCreate", "BatchRetrieve", "BatchDelete", "Hello", "ListOps"]
+            return jsonify({"operations": ops}), 200
+
+        return app
+
+    def after_fork(self):
+        """
+        Gives a forked worker process connection pools of its own.
+        """
+        if self.repo.engines is not default_engines:
+            self.repo.engines.after_fork()
+        default_engines.after_fork()
+
+    def start_server(self, host='127.0.0.1', port=5000,protocol='http',environment='development',
+                     workers=1, threads=8, timeout=30, graceful_timeout=30):
+        """
+        Serves the repository over HTTP.
+
+        In the development environment Flask's single-process debug server is
+        used. In production, workers=1 runs a multi-threaded server in this
+        process; workers>1 runs that many gunicorn worker processes with
+        `threads` threads each, every worker with its own connection pool.
+        Both stop on SIGTERM or SIGINT after in-flight requests have finished,
+        then close the repository.
+
+        Parameters:
+        host (str, optional): Interface to bind.
+        port (int, optional): Port to bind.
+        protocol (str, optional): Only 'http' is supported.
+        environment (str, optional): 'development' or 'production'.
+        workers (int, optional): Number of worker processes in production.
+        threads (int, optional): Number of request threads per worker process with workers>1.
+        timeout (int, optional): Seconds a client may stay idle while sending a request, and with
+            workers>1 also the seconds a request may run before its worker is restarted; a single process
+            has no limit on how long a request runs.
+        graceful_timeout (int, optional): Seconds in-flight requests get to finish on shutdown with workers>1.
+
+        Returns:
+        bool: False if the protocol or environment is invalid.
+        """
+        if protocol != 'http':
+            logging.error(f'Invalid protocol.')
+            return False
+        app = self.create_app()
+        if environment == 'development':
             app.run(host=host, port=port)
+        elif environment == 'production':
+            if workers > 1:
+                serve_workers(app, host, port, workers=workers, threads=threads, timeout=timeout,
+                              graceful_timeout=graceful_timeout, post_fork=self.after_fork, on_shutdown=self.close)
+            else:
+                serve_threaded(app, host, port, timeout=timeout, on_shutdown=self.close)
         else:
-            logging.error(f'Invalid protocol.')
+            logging.error(f'Invalid environment {environment}.')
             return False
   
-    def DDO(self, metadata, doid=None):  
+    def DDO(self, metadata, doid=None, memoize=False, memo_size=256):  
         """  
         Returns a decorator that creates DataDigitalObjects using the IRS and repo instances  
         of the DDOManager.  
+
+        With memoize=True a call whose function code and arguments match an
+        earlier call returns the stored DataDigitalObject instead of running the
+        function again; the wrapper's `memo` attribute (a Memoizer) offers
+        invalidate, clear and stats.
   
         Parameters:  
         metadata (dict): Metadata to attach to the data object.  
-        doid (str, optional): Digital Object Identifier.  
+        doid (str, optional): Digital Object Identifier; not allowed with memoize, which derives the doid from the call.  
+        memoize (bool, optional): Reuse stored results of identical calls.
+        memo_size (int, optional): Number of results kept in memory in front of the repository.
   
         Returns:  
         function: The wrapped function that returns a DataDigitalObject.  
         """  
+        if memoize and doid:
+            raise ValueError("A fixed doid cannot be combined with memoize.")
+
         def decorator(func):  
-            def wrapper(*args, **kwargs):  
-                data = func(*args, **kwargs)  
-                ddo = DataDigitalObject(data, metadata, self.IRS, doid)  
-                self.repo.save(ddo)  
-                return ddo  
-            return wrapper  
-        return decorator
\ No newline at end of file
+            if not memoize:
+                def wrapper(*args, **kwargs):  
+                    data = func(*args, **kwargs)  
+                    ddo = self._new_ddo(data, metadata, doid)  
+                    self.repo.save(ddo, content_id=self._content_ids())  
+                    return ddo  
+                return wrapper
+
+            memo = Memoizer(func, self.repo, memo_size, metadata)
+
+            @functools.wraps(func)
+            def memoized(*args, **kwargs):
+                memo_doid = memo.doid(*args, **kwargs)
+                ddo = memo.lookup(memo_doid)
+                if ddo is None:
+                    data = func(*args, **kwargs)
+                    ddo = DataDigitalObject(data, memo.metadata(metadata, memo_doid), doid=memo_doid)
+                    if not self.repo.save(ddo) and not self.repo.exists(memo_doid):
+                        # 并发调用可能已保存同一结果；只有确实不存在时才算失败
+                        logging.error(f"Failed to store the memoized result {memo_doid}.")
+                    memo.store(memo_doid, ddo)
+                return ddo
+            memoized.memo = memo
+            return memoized
+        return decorator
+
+
+def create_app(repo_url=None, cache=None, id_mode="sequential"):
+    """
+    WSGI application factory for running DDOInstance under an external server, e.g.
+    gunicorn -w 4 --threads 8 'ddolib.ddoinstance:create_app("sqlite:///repo.db")'.
+
+    Each call builds its own DDOInstance, so every worker process that calls
+    it gets its own connection pool.
+
+    Parameters:
+    repo_url (str, optional): URL of the repository, defaults to the DDOLIB_REPO_URL environment variable.
+    cache (ObjectCache or bool, optional): Read-through cache passed to the repository.
+    id_mode (str, optional): Doid generation mode, see DDOInstance.
+
+    Returns:
+    Flask: The application.
+    """
+    repo_url = repo_url or os.environ.get("DDOLIB_REPO_URL")
+    if not repo_url:
+        raise ValueError("A repository URL or the DDOLIB_REPO_URL environment variable is required.")
+    return DDOInstance(repo_url=repo_url, cache=cache, id_mode=id_mode).create_app()
@@ -12,6 +12,8 @@ class DataDigitalObject(DigitalObject):
     metadata (dict): Metadata associated with the data digital object.
     doid (str): Unique identifier for the data digital object.
     """
+    __slots__ = ()
+
     def __init__(self, data, metadata, IRS=None,doid=None):
         """
         Initializes a DataDigitalObject.
@@ -41,6 +43,8 @@ class FunctionDigitalObject(DigitalObject):
     func (function): The function associated with the function digital object.
     metadata (dict): Metadata specific to the function digital object.
     """
+    __slots__ = ()
+
     def __init__(self, func, metadata,iid=None, doid=None):
         """
         Initializes a FunctionDigitalObject.
@@ -50,7 +54,7 @@ class FunctionDigitalObject(DigitalObject):
         metadata (dict): Metadata specific to the function digital object.
         doid (str, optional): Unique identifier for the function digital object.
         """
-        super().__init__(func, metadata, iid, doid)
+        super().__init__(func, metadata, doid)
     
     
 
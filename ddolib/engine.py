@@ -0,0 +1,300 @@
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from .schema import bootstrap
+
+# Connection settings for SQLite databases, applied with PRAGMA to every new connection.
+SQLITE_PROFILES = {
+    # Write-ahead log: a commit appends to the log instead of rewriting the database
+    # file, and readers do not block the writer. With synchronous=NORMAL the log is
+    # only synced at checkpoints, so a power loss may lose the last commits but never
+    # corrupts the database.
+    "fast": {"journal_mode": "WAL", "synchronous": "NORMAL", "mmap_size": 256 * 1024 * 1024,
+             "cache_size": -64 * 1024, "temp_store": "MEMORY", "busy_timeout": 5000},
+    # Write-ahead log, but every commit is synced before it returns.
+    "durable": {"journal_mode": "WAL", "synchronous": "FULL", "cache_size": -64 * 1024, "busy_timeout": 5000},
+}
+
+# Unit-of-work transactions open in the current thread, keyed by database URL.
+_transactions = threading.local()
+
+
+def is_sql_url(db_url):
+    """
+    Returns whether a storage URL points to a SQL database.
+
+    Parameters:
+    db_url (str): The URL or path to the storage location.
+
+    Returns:
+    bool: True for sqlite:// and mysql:// URLs, False for filesystem paths.
+    """
+    return bool(db_url) and (db_url.startswith("sqlite://") or db_url.startswith("mysql://"))
+
+
+def sqlite_pragmas(profile):
+    """
+    Returns the PRAGMA settings of a SQLite tuning profile.
+
+    Parameters:
+    profile (str or dict): A name from SQLITE_PROFILES, a dict of pragma names and values, or None.
+
+    Returns:
+    dict: The pragmas, empty for None.
+    """
+    if profile is None:
+        return {}
+    if isinstance(profile, dict):
+        return dict(profile)
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile}, expected one of {sorted(SQLITE_PROFILES)}.")
+    return dict(SQLITE_PROFILES[profile])
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+class Transaction:
+    """
+    A unit of work: the writes of one thread to one database, run on a single
+    connection and committed once. Opened with DigitalObjectRepository.transaction.
+
+    Attributes:
+    url (str): The database URL.
+    connection (Connection): The connection shared by the operations inside the transaction.
+    """
+    def __init__(self, url, connection):
+        """
+        Initializes a Transaction.
+
+        Parameters:
+        url (str): The database URL.
+        connection (Connection): The connection, with its transaction begun.
+        """
+        self.url = url
+        self.connection = connection
+        # (cache, key) pairs written in the transaction, invalidated again once it ends.
+        self.touched = []
+
+
+def active_transaction(db_url):
+    """
+    Returns the unit-of-work transaction open on a database in the current thread.
+
+    Parameters:
+    db_url (str): The database URL.
+
+    Returns:
+    Transaction: The open transaction, or None.
+    """
+    return getattr(_transactions, "open", {}).get(db_url)
+
+
+@contextmanager
+def open_transaction(engine, db_url):
+    """
+    Opens a unit-of-work transaction on a database for the current thread, or joins
+    the one already open. The outermost block commits on exit and rolls back if it raises.
+
+    Parameters:
+    engine (Engine): The engine of db_url.
+    db_url (str): The database URL.
+
+    Yields:
+    Transaction: The open transaction.
+    """
+    transaction = active_transaction(db_url)
+    if transaction is not None:
+        yield transaction
+        return
+    if not hasattr(_transactions, "open"):
+        _transactions.open = {}
+    try:
+        with engine.begin() as connection:
+            transaction = Transaction(db_url, connection)
+            _transactions.open[db_url] = transaction
+            yield transaction
+    finally:
+        _transactions.open.pop(db_url, None)
+        # Objects loaded while the transaction was open may hold uncommitted or rolled back data.
+        for cache, key in transaction.touched if transaction is not None else ():
+            cache.invalidate(key)
+
+
+@contextmanager
+def begin(engine, db_url):
+    """
+    Checks out a connection for a write: the connection of the transaction open on
+    db_url in the current thread, or a new one committed when the block exits.
+
+    Parameters:
+    engine (Engine): The engine of db_url.
+    db_url (str): The database URL.
+
+    Yields:
+    Connection: The connection.
+    """
+    transaction = active_transaction(db_url)
+    if transaction is not None:
+        yield transaction.connection
+    else:
+        with engine.begin() as connection:
+            yield connection
+
+
+@contextmanager
+def connect(engine, db_url):
+    """
+    Checks out a connection for a read: the connection of the transaction open on
+    db_url in the current thread, so its uncommitted writes are visible, or a new one.
+
+    Parameters:
+    engine (Engine): The engine of db_url.
+    db_url (str): The database URL.
+
+    Yields:
+    Connection: The connection.
+    """
+    transaction = active_transaction(db_url)
+    if transaction is not None:
+        yield transaction.connection
+    else:
+        with engine.connect() as connection:
+            yield connection
+
+
+class EngineRegistry:
+    """
+    Registry of pooled SQLAlchemy engines keyed by database URL.
+
+    Engines are created lazily on first use and reused for every later
+    operation on the same URL, so each CRUD call only checks a connection
+    out of the pool instead of building a new engine and dialect. The
+    schema is created or migrated once, when an engine is first created.
+
+    Attributes:
+    pool_size (int): Number of connections kept open in each pool.
+    max_overflow (int): Extra connections allowed above pool_size under load.
+    pool_pre_ping (bool): Whether to test connections for liveness on checkout.
+    pool_recycle (int): Seconds after which a connection is replaced, -1 to disable.
+    sqlite_pragmas (dict): PRAGMA settings applied to every new SQLite connection.
+    """
+    def __init__(self, pool_size=5, max_overflow=10, pool_pre_ping=True, pool_recycle=-1, sqlite_profile=None,
+                 **engine_kwargs):
+        """
+        Initializes an EngineRegistry.
+
+        Parameters:
+        pool_size (int, optional): Number of connections kept open in each pool.
+        max_overflow (int, optional): Extra connections allowed above pool_size under load.
+        pool_pre_ping (bool, optional): Whether to test connections for liveness on checkout.
+        pool_recycle (int, optional): Seconds after which a connection is replaced, -1 to disable.
+        sqlite_profile (str or dict, optional): SQLite tuning applied when a connection is opened,
+            a name from SQLITE_PROFILES or a dict of pragmas; None keeps SQLite's defaults.
+        engine_kwargs (dict, optional): Extra keyword arguments passed to create_engine.
+        """
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_pre_ping = pool_pre_ping
+        self.pool_recycle = pool_recycle
+        self.sqlite_pragmas = sqlite_pragmas(sqlite_profile)
+        self.engine_kwargs = engine_kwargs
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def engine_options(self, db_url):
+        """
+        Returns the create_engine keyword arguments used for a database URL.
+
+        Parameters:
+        db_url (str): The database URL.
+
+        Returns:
+        dict: Pool settings and extra engine arguments.
+        """
+        options = {
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_recycle": self.pool_recycle,
+        }
+        url = make_url(db_url)
+        # In-memory SQLite uses a single-connection pool that does not take size arguments.
+        if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+            options["pool_size"] = self.pool_size
+            options["max_overflow"] = self.max_overflow
+        options.update(self.engine_kwargs)
+        return options
+
+    def get(self, db_url):
+        """
+        Returns the engine for a database URL, creating and bootstrapping it on first use.
+
+        Parameters:
+        db_url (str): The database URL.
+
+        Returns:
+        Engine: The pooled engine bound to db_url.
+        """
+        engine = self._engines.get(db_url)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(db_url)
+            if engine is None:
+                logging.debug(f"Creating engine for {db_url}")
+                engine = create_engine(db_url, **self.engine_options(db_url))
+                if self.sqlite_pragmas and engine.dialect.name == "sqlite":
+                    event.listen(engine, "connect", partial(_apply_pragmas, self.sqlite_pragmas))
+                bootstrap(engine)
+                self._engines[db_url] = engine
+            return engine
+
+    def dispose(self, db_url):
+        """
+        Closes the pool of a single engine and forgets it.
+
+        Parameters:
+        db_url (str): The database URL.
+        """
+        with self._lock:
+            engine = self._engines.pop(db_url, None)
+        if engine is not None:
+            engine.dispose()
+
+    def close(self):
+        """
+        Closes the pools of all engines in the registry.
+        """
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for engine in engines:
+            engine.dispose()
+
+    def after_fork(self):
+        """
+        Gives a forked child process connection pools of its own.
+
+        Connections inherited from the parent are left open for the parent and
+        never touched by the child, which opens new ones on demand.
+        """
+        for engine in list(self._engines.values()):
+            engine.dispose(close=False)
+
+    def __contains__(self, db_url):
+        return db_url in self._engines
+
+    def __len__(self):
+        return len(self._engines)
+
+
+# Shared registry for writers that are not bound to a repository, e.g. Relationship.save.
+default_engines = EngineRegistry()
@@ -0,0 +1,424 @@
+import hashlib
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from urllib.parse import quote, unquote
+
+_MAGIC = b"DDO1"
+_HEADER = struct.Struct(">4sI")
+
+
+class FileObjectStore:
+    """
+    File-backed storage for DigitalObjects and Relationships on a local filesystem.
+
+    Each object is one file holding a small JSON header (metadata, codec,
+    compression) followed by the stored payload. Files live in hash-sharded
+    directories, `objects/ab/cd/<doid>`, so no directory grows past a few
+    thousand entries. Writes go to a temporary file in the target directory
+    and are renamed into place, so readers never see partial objects. Large
+    payloads are read through mmap. An append-only index of doids allows
+    listing without walking the shard tree.
+
+    Attributes:
+    root (str): Directory holding the store.
+    shard_depth (int): Number of two-hex-digit directory levels above each file.
+    mmap_threshold (int): Files of at least this many bytes are read through mmap.
+    fsync (bool): Whether writes are flushed to disk before being renamed into place.
+    """
+    def __init__(self, root, shard_depth=2, mmap_threshold=1024 * 1024, fsync=True):
+        """
+        Initializes a FileObjectStore, creating the root directory if needed.
+
+        Parameters:
+        root (str): Directory holding the store.
+        shard_depth (int, optional): Number of two-hex-digit directory levels above each file.
+        mmap_threshold (int, optional): Files of at least this many bytes are read through mmap.
+        fsync (bool, optional): Whether writes are flushed to disk before being renamed into place.
+        """
+        self.root = root
+        self.shard_depth = shard_depth
+        self.mmap_threshold = mmap_threshold
+        self.fsync = fsync
+        self._index_path = os.path.join(root, "index.log")
+        self._index = None
+        self._edges = None
+        self._index_lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    # paths
+
+    def _path(self, kind, doid, suffix=""):
+        digest = hashlib.sha1(doid.encode("utf-8")).hexdigest()
+        shards = [digest[2 * i:2 * i + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, kind, *shards, quote(doid, safe="") + suffix)
+
+    def object_path(self, doid):
+        """
+        Returns the file path of an object.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        str: The path, whether or not the file exists.
+        """
+        return self._path("objects", doid)
+
+    # atomic writes
+
+    def _write_temp(self, directory, chunks):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path
+
+    def _publish(self, tmp_path, path, overwrite):
+        if overwrite:
+            os.replace(tmp_path, path)
+            return True
+        try:
+            # link() fails if the target exists, making create-if-absent atomic.
+            os.link(tmp_path, path)
+        except FileExistsError:
+            os.unlink(tmp_path)
+            return False
+        except OSError:
+            if os.path.exists(path):
+                os.unlink(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+            return True
+        os.unlink(tmp_path)
+        return True
+
+    def _encode_record(self, metadata, codec, compression, payload):
+        header = json.dumps({"metadata": metadata, "codec": codec, "compression": compression}).encode("utf-8")
+        return [_HEADER.pack(_MAGIC, len(header)), header, payload]
+
+    # objects
+
+    def write(self, doid, metadata, codec, compression, payload, overwrite=False, if_match=None):
+        """
+        Atomically writes an object file.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        metadata (dict): The metadata of the object.
+        codec (str): The serialization codec of the payload.
+        compression (str): The compressor applied to the payload, or None.
+        payload (bytes): The stored payload.
+        overwrite (bool, optional): Replace an existing object instead of failing.
+        if_match (str, optional): With overwrite, only replace the object if this is its current etag.
+            The check happens before the new file is written, so concurrent writers can still race.
+
+        Returns:
+        bool: False if overwrite is False and the object already exists,
+        or if overwrite is True and it does not exist or does not match if_match; True otherwise.
+        """
+        path = self.object_path(doid)
+        if overwrite and not os.path.exists(path):
+            return False
+        if overwrite and if_match is not None and self.etag(doid) != if_match:
+            return False
+        tmp_path = self._write_temp(os.path.dirname(path), self._encode_record(metadata, codec, compression, payload))
+        if not self._publish(tmp_path, path, overwrite):
+            return False
+        if not overwrite:
+            self._index_append("+", doid)
+        return True
+
+    def read(self, doid, decode):
+        """
+        Reads an object file and decodes its payload.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        decode (function): Called as decode(payload, codec, compression) with a bytes-like payload
+            that is only valid during the call.
+
+        Returns:
+        tuple: (data, metadata), or None if the object does not exist.
+        """
+        path = self.object_path(doid)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size >= self.mmap_threshold:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        return self._decode_record(view, decode)
+                    finally:
+                        view.release()
+            return self._decode_record(memoryview(file.read()), decode)
+
+    def _decode_record(self, view, decode):
+        magic, header_length = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError("Not a DigitalObject file.")
+        start = _HEADER.size
+        header = json.loads(bytes(view[start:start + header_length]))
+        payload = view[start + header_length:]
+        try:
+            data = decode(payload, header["codec"], header["compression"])
+        finally:
+            payload.release()
+        return data, header["metadata"]
+
+    def write_stream(self, doid, metadata, chunks):
+        """
+        Atomically creates an object file from a bytes payload delivered in pieces.
+
+        Parameters:
+        doid (str): The identifier of the object.
+        metadata (dict): The metadata of the object.
+        chunks (iterable of bytes): The payload, written as it is consumed.
+
+        Returns:
+        bool: False if the object already exists.
+        """
+        path = self.object_path(doid)
+        if os.path.exists(path):
+            return False
+        header = self._encode_record(metadata, "bytes", None, b"")[:2]
+        tmp_path = self._write_temp(os.path.dirname(path), itertools.chain(header, chunks))
+        if not self._publish(tmp_path, path, False):
+            return False
+        self._index_append("+", doid)
+        return True
+
+    def _read_header(self, file):
+        magic, header_length = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError("Not a DigitalObject file.")
+        return json.loads(file.read(header_length)), _HEADER.size + header_length
+
+    def payload_range(self, doid):
+        """
+        Locates the raw payload of an object stored with the bytes codec and no compression.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        tuple: (path, offset, size) of the payload within the file, or None if the object does not
+        exist or its payload is encoded.
+        """
+        path = self.object_path(doid)
+        try:
+            with open(path, "rb") as file:
+                header, offset = self._read_header(file)
+                size = os.fstat(file.fileno()).st_size - offset
+        except FileNotFoundError:
+            return None
+        if header["codec"] != "bytes" or header["compression"] is not None:
+            return None
+        return path, offset, size
+
+    def read_metadata(self, doid):
+        """
+        Reads only the header of an object file.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        dict: The metadata, or None if the object does not exist.
+        """
+        try:
+            with open(self.object_path(doid), "rb") as file:
+                return self._read_header(file)[0]["metadata"]
+        except FileNotFoundError:
+            return None
+
+    def etag(self, doid):
+        """
+        Returns a tag that changes whenever an object file is replaced.
+
+        Every write publishes a new file, so the inode, size and modification
+        time identify the version without reading the file.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        str: The etag, or None if the object does not exist.
+        """
+        try:
+            stat = os.stat(self.object_path(doid))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+    def exists(self, doid):
+        """
+        Returns whether an object file exists.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        bool: True if the object exists.
+        """
+        return os.path.exists(self.object_path(doid))
+
+    def remove(self, doid):
+        """
+        Deletes an object file.
+
+        Parameters:
+        doid (str): The identifier of the object.
+
+        Returns:
+        bool: True if the object existed.
+        """
+        try:
+            os.remove(self.object_path(doid))
+        except FileNotFoundError:
+            return False
+        self._index_append("-", doid)
+        return True
+
+    # index
+
+    def _load_index(self):
+        doids = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    line = line.rstrip("\n")
+                    if not line:
+                        continue
+                    if line[0] == "+":
+                        doids[unquote(line[1:])] = None
+                    else:
+                        doids.pop(unquote(line[1:]), None)
+        return doids
+
+    def _index_append(self, op, doid):
+        with self._index_lock:
+            with open(self._index_path, "a", encoding="utf-8") as file:
+                file.write(f"{op}{quote(doid, safe='')}\n")
+            if self._index is not None:
+                if op == "+":
+                    self._index[doid] = None
+                else:
+                    self._index.pop(doid, None)
+
+    def doids(self):
+        """
+        Returns the identifiers of all stored objects, in insertion order.
+
+        Returns:
+        list of str: The doids recorded in the index.
+        """
+        with self._index_lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return list(self._index)
+
+    def compact_index(self):
+        """
+        Rewrites the index so it holds one line per live object.
+        """
+        with self._index_lock:
+            self._index = self._load_index()
+            tmp_path = self._write_temp(self.root, [f"+{quote(doid, safe='')}\n".encode("utf-8") for doid in self._index])
+            os.replace(tmp_path, self._index_path)
+
+    # relationships
+
+    def write_relationship(self, doid, from_ddo_doids, to_ddo_doids, metadata):
+        """
+        Atomically writes a relationship as a JSON file.
+
+        Parameters:
+        doid (str): The identifier of the relationship.
+        from_ddo_doids (list of str): The originating data object identifiers.
+        to_ddo_doids (list of str): The target data object identifiers.
+        metadata (dict): Metadata associated with the relationship.
+
+        Returns:
+        str: The path of the written file.
+        """
+        path = self._path("relationships", doid, ".json")
+        record = json.dumps({"doid": doid, "from_ddo_doids": from_ddo_doids,
+                             "to_ddo_doids": to_ddo_doids, "metadata": metadata}).encode("utf-8")
+        tmp_path = self._write_temp(os.path.dirname(path), [record])
+        os.replace(tmp_path, path)
+        with self._index_lock:
+            if self._edges is not None:
+                self._edges[doid] = [(src, dst) for src in from_ddo_doids for dst in to_ddo_doids]
+        return path
+
+    def edges(self):
+        """
+        Returns the (from doid, to doid) pairs of all stored relationships.
+
+        The relationship files are read once; later writes through this store
+        keep the in-memory edge list current.
+
+        Returns:
+        list of tuple: The edges, one per (from, to) pair of each relationship.
+        """
+        with self._index_lock:
+            if self._edges is None:
+                self._edges = {}
+                for doid, from_ddo_doids, to_ddo_doids, _ in self.relationships():
+                    self._edges[doid] = [(src, dst) for src in from_ddo_doids for dst in to_ddo_doids]
+            return [edge for edges in self._edges.values() for edge in edges]
+
+    def relationships(self):
+        """
+        Reads all stored relationships.
+
+        Returns:
+        generator: (doid, from doids, to doids, metadata) of each relationship.
+        """
+        for directory, _, filenames in os.walk(os.path.join(self.root, "relationships")):
+            for filename in filenames:
+                if filename.startswith(".tmp-") or not filename.endswith(".json"):
+                    continue
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as file:
+                    record = json.load(file)
+                yield record["doid"], record["from_ddo_doids"], record["to_ddo_doids"], record["metadata"]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root):
+    """
+    Returns the shared FileObjectStore for a root directory.
+
+    Parameters:
+    root (str): Directory holding the store.
+
+    Returns:
+    FileObjectStore: The store, created on first use.
+    """
+    root = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = FileObjectStore(root)
+        return store
@@ -0,0 +1,150 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+
+_SEQUENCE_BITS = 24
+_MAX_SEQUENCE = (1 << _SEQUENCE_BITS) - 1
+
+
+def default_node_id():
+    """
+    Returns a 32-bit node id derived from the host MAC address and the process id.
+
+    Returns:
+    int: The node id.
+    """
+    return zlib.crc32(f"{uuid.getnode()}-{os.getpid()}".encode())
+
+
+class SequentialIdGenerator:
+    """
+    Generator of unique, monotonic and lexicographically sortable identifiers.
+
+    Identifiers have the form `<millis:12 hex>-<node:8 hex>-<sequence:6 hex>`.
+    Within one millisecond the sequence counter increases; if it overflows,
+    or the wall clock steps backwards, the millisecond part is advanced
+    logically so identifiers never repeat and always sort in creation order.
+    The payload is never read.
+
+    Attributes:
+    node_id (int): 32-bit identifier of the generating process.
+    """
+    def __init__(self, node_id=None):
+        """
+        Initializes a SequentialIdGenerator.
+
+        Parameters:
+        node_id (int, optional): 32-bit node id; defaults to one derived from host and process,
+            recomputed after a fork.
+        """
+        self._fixed_node = node_id is not None
+        self.node_id = (node_id if node_id is not None else default_node_id()) & 0xFFFFFFFF
+        self._pid = os.getpid()
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        if not self._fixed_node and os.getpid() != self._pid:
+            # A forked child must not reuse the parent's node id and counter.
+            self._pid = os.getpid()
+            self.node_id = default_node_id()
+            self._last_ms = 0
+            self._sequence = 0
+        now = int(time.time() * 1000)
+        if now > self._last_ms:
+            self._last_ms = now
+            self._sequence = 0
+        elif self._sequence < _MAX_SEQUENCE:
+            self._sequence += 1
+        else:
+            self._last_ms += 1
+            self._sequence = 0
+        return f"{self._last_ms:012x}-{self.node_id:08x}-{self._sequence:06x}"
+
+    def generate(self):
+        """
+        Returns the next identifier.
+
+        Returns:
+        str: A new unique identifier.
+        """
+        with self._lock:
+            return self._next()
+
+    def generate_many(self, n):
+        """
+        Returns `n` consecutive identifiers under a single lock acquisition.
+
+        Parameters:
+        n (int): Number of identifiers.
+
+        Returns:
+        list of str: The new identifiers, in increasing order.
+        """
+        with self._lock:
+            return [self._next() for _ in range(n)]
+
+
+def content_id(payload, chunk_size=1024 * 1024):
+    """
+    Returns a SHA-256 content identifier of already-serialized bytes.
+
+    The digest is updated incrementally, so large buffers are hashed in
+    chunks without copying and streamed payloads never need to be joined.
+
+    Parameters:
+    payload (bytes or iterable of bytes): The serialized payload or its chunks.
+    chunk_size (int, optional): Size of the slices fed to the hash for a single buffer.
+
+    Returns:
+    str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        view = memoryview(payload)
+        for start in range(0, len(view), chunk_size):
+            digest.update(view[start:start + chunk_size])
+    else:
+        for chunk in payload:
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_doid(payload, metadata=None):
+    """
+    Returns the content-addressed doid of an object: `sha256-<digest>` of its serialized
+    payload, followed by its metadata when given, so objects that differ only in
+    metadata get different doids.
+
+    Parameters:
+    payload (bytes or iterable of bytes): The serialized, uncompressed payload or its chunks.
+    metadata (dict, optional): The metadata of the object.
+
+    Returns:
+    str: `sha256-<digest>`.
+    """
+    if metadata is None:
+        return f"sha256-{content_id(payload)}"
+    return f"sha256-{object_etag(payload, metadata)}"
+
+
+def object_etag(payload, metadata):
+    """
+    Returns the entity tag of a stored object: a SHA-256 digest of its stored payload followed by its metadata.
+
+    Parameters:
+    payload (bytes or iterable of bytes): The stored payload or its chunks.
+    metadata (dict): The metadata of the object.
+
+    Returns:
+    str: The hex digest.
+    """
+    chunks = [payload] if isinstance(payload, (bytes, bytearray, memoryview)) else payload
+    metadata_bytes = json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")
+    return content_id(itertools.chain(chunks, [metadata_bytes]))
@@ -0,0 +1,131 @@
+from .schema import select_edges_from, select_edges_to
+from .utils import chunked
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+
+def sql_neighbours(connection, direction, batch_size=500):
+    """
+    Returns a function looking up the neighbours of a set of doids in the relationship_edges table.
+
+    Parameters:
+    connection (Connection): Connection to the repository database.
+    direction (str): DOWNSTREAM to follow edges from source to target, UPSTREAM for the reverse.
+    batch_size (int, optional): Number of doids per indexed IN lookup.
+
+    Returns:
+    function: Called with an iterable of doids, returns (doid, neighbour) pairs.
+    """
+    statement = select_edges_from if direction == DOWNSTREAM else select_edges_to
+
+    def neighbours(doids):
+        pairs = []
+        for chunk in chunked(doids, batch_size):
+            pairs.extend(connection.execute(statement, {"doids": chunk}).fetchall())
+        return pairs
+    return neighbours
+
+
+def adjacency_neighbours(edges, direction):
+    """
+    Returns a function looking up neighbours in an in-memory adjacency index built from edges.
+
+    Parameters:
+    edges (iterable of tuple): (source doid, target doid) pairs.
+    direction (str): DOWNSTREAM to follow edges from source to target, UPSTREAM for the reverse.
+
+    Returns:
+    function: Called with an iterable of doids, returns (doid, neighbour) pairs.
+    """
+    adjacency = {}
+    for src, dst in edges:
+        if direction == DOWNSTREAM:
+            adjacency.setdefault(src, []).append(dst)
+        else:
+            adjacency.setdefault(dst, []).append(src)
+
+    def neighbours(doids):
+        return [(doid, neighbour) for doid in doids for neighbour in adjacency.get(doid, ())]
+    return neighbours
+
+
+def traverse(neighbours, doid, depth=None):
+    """
+    Breadth-first search from a doid, expanding one whole level per neighbour lookup.
+
+    Parameters:
+    neighbours (function): Lookup returned by sql_neighbours or adjacency_neighbours.
+    doid (str): The starting doid, not included in the result.
+    depth (int, optional): Maximum number of hops; None for no limit.
+
+    Returns:
+    dict: Reached doids mapped to their distance in hops, nearest first.
+    """
+    distances = {}
+    frontier = [doid]
+    level = 0
+    while frontier and (depth is None or level < depth):
+        level += 1
+        next_frontier = []
+        for _, neighbour in neighbours(frontier):
+            if neighbour != doid and neighbour not in distances:
+                distances[neighbour] = level
+                next_frontier.append(neighbour)
+        frontier = next_frontier
+    return distances
+
+
+def shortest_path(forward, backward, source, target):
+    """
+    Finds a shortest directed path with a bidirectional breadth-first search.
+
+    Each step expands the smaller of the two frontiers by one level, so the
+    number of lookups grows with the path length rather than the graph size.
+
+    Parameters:
+    forward (function): Downstream neighbour lookup.
+    backward (function): Upstream neighbour lookup.
+    source (str): The first doid of the path.
+    target (str): The last doid of the path.
+
+    Returns:
+    list of str: The doids along the path, source and target included, or None if target is not reachable.
+    """
+    if source == target:
+        return [source]
+    parents = {source: None}
+    children = {target: None}
+    forward_frontier = [source]
+    backward_frontier = [target]
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, meeting = _expand(forward, forward_frontier, parents, children)
+        else:
+            backward_frontier, meeting = _expand(backward, backward_frontier, children, parents)
+        if meeting is not None:
+            path = []
+            node = meeting
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            path.reverse()
+            node = children[meeting]
+            while node is not None:
+                path.append(node)
+                node = children[node]
+            return path
+    return None
+
+
+def _expand(neighbours, frontier, seen, other_side):
+    # Expands one level; returns the new frontier and a doid reached from both sides, if any.
+    next_frontier = []
+    for doid, neighbour in neighbours(frontier):
+        if neighbour in seen:
+            continue
+        seen[neighbour] = doid
+        if neighbour in other_side:
+            return next_frontier, neighbour
+        next_frontier.append(neighbour)
+    return next_frontier, None
@@ -0,0 +1,261 @@
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import dill
+from .cache import ObjectCache
+from .core import DigitalObject
+from .dos import DataDigitalObject
+
+MEMO_PREFIX = "memo-"
+# Metadata key recording which function and call produced a memoized object.
+MEMO_METADATA_KEY = "_memo"
+
+
+def _code_parts(code):
+    # Bytecode, constants (nested functions included) and referenced names of a code object.
+    parts = [code.co_code, code.co_names, code.co_varnames]
+    for constant in code.co_consts:
+        parts.append(_code_parts(constant) if hasattr(constant, "co_code") else repr(constant))
+    return parts
+
+
+def function_fingerprint(func):
+    """
+    Returns a stable hash of a function's name, code, defaults and closure values.
+
+    The hash changes when the function body is edited, so results memoized
+    for an older version are not reused.
+
+    Parameters:
+    func (function): The function.
+
+    Returns:
+    str: Hex SHA-256 digest.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return hashlib.sha256(dill.dumps(func)).hexdigest()
+    # Defaults and closure values are hashed like arguments, since their repr may contain addresses.
+    closure = [cell.cell_contents for cell in func.__closure__ or ()]
+    values = value_hash([list(func.__defaults__ or ()), sorted((func.__kwdefaults__ or {}).items()), closure])
+    description = repr((func.__module__, func.__qualname__, _code_parts(code), values))
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def _tagged(value):
+    # JSON writes tuples as lists; tag them so f((1, 2)) and f([1, 2]) are different calls.
+    if isinstance(value, tuple):
+        return {"__tuple__": [_tagged(item) for item in value]}
+    if isinstance(value, list):
+        return [_tagged(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _tagged(item) for key, item in value.items()}
+    return value
+
+
+def _json_default(value):
+    # Digital objects are identified by their doid and the content of their data and metadata,
+    # so an updated object is a new input; other non-JSON values by a hash of their pickle.
+    if isinstance(value, DigitalObject):
+        return {"__do__": value.doid, "data": value_hash(value.data), "metadata": value_hash(value.metadata)}
+    if isinstance(value, (set, frozenset)):
+        return {"__set__": sorted(value_hash(item) for item in value)}
+    return {"__dill__": hashlib.sha256(dill.dumps(value)).hexdigest()}
+
+
+def value_hash(value):
+    """
+    Returns a stable content hash of a value: SHA-256 of its canonical JSON, with tuples
+    tagged, digital objects replaced by their doid and content hashes and other non-JSON
+    values by a hash of their pickle.
+
+    Parameters:
+    value (any): The value.
+
+    Returns:
+    str: Hex SHA-256 digest.
+    """
+    try:
+        text = json.dumps(_tagged(value), sort_keys=True, default=_json_default)
+    except (TypeError, ValueError):
+        # Dictionaries with keys of mixed types cannot be sorted.
+        text = hashlib.sha256(dill.dumps(value)).hexdigest()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def call_key(fingerprint, args, kwargs, metadata=None):
+    """
+    Returns the memoization key of a call.
+
+    Parameters:
+    fingerprint (str): The function_fingerprint of the called function.
+    args (tuple): Positional arguments.
+    kwargs (dict): Keyword arguments.
+    metadata (dict, optional): Metadata the result is stored with, e.g. the DDO decorator's.
+
+    Returns:
+    str: Hex SHA-256 digest of the function, the metadata and the arguments.
+    """
+    arguments = value_hash([list(args), sorted(kwargs.items())])
+    return hashlib.sha256(f"{fingerprint}:{value_hash(metadata)}:{arguments}".encode("ascii")).hexdigest()
+
+
+class Memoizer:
+    """
+    Memoizes the DataDigitalObjects produced by a function, in memory and in the repository.
+
+    A call's result is saved under the doid `memo-<key>`, derived from the
+    function's code, the result metadata and the call's arguments, so a repeated call loads that
+    object instead of recomputing it and no duplicates are stored. A bounded
+    LRU layer in front of the repository answers repeated calls in-process.
+
+    Attributes:
+    fingerprint (str): The function_fingerprint of the memoized function.
+    memory (ObjectCache): The in-memory layer, bounded by number of entries.
+    hits (int): Calls answered from the in-memory layer.
+    repository_hits (int): Calls answered by loading the stored object.
+    misses (int): Calls that ran the function.
+    """
+    def __init__(self, func, repo, max_entries=256, metadata=None):
+        """
+        Initializes a Memoizer.
+
+        Parameters:
+        func (function): The memoized function.
+        repo (DigitalObjectRepository): Repository storing the results.
+        max_entries (int, optional): Size of the in-memory layer; 0 disables it.
+        metadata (dict, optional): Metadata the results are stored with; part of every key, so
+            the same function decorated with other metadata has results of its own.
+        """
+        self.func = func
+        self.repo = repo
+        self.result_metadata = metadata
+        self.fingerprint = function_fingerprint(func)
+        try:
+            self._signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            self._signature = None
+        self.memory = ObjectCache(max_entries=max_entries)
+        self.hits = 0
+        self.repository_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def doid(self, *args, **kwargs):
+        """
+        Returns the doid under which the result of a call is stored.
+
+        Returns:
+        str: `memo-<key>`.
+        """
+        if self._signature is not None:
+            # f(3), f(x=3) and f(3, scale=1) with a default scale=1 are the same call.
+            bound = self._signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            args, kwargs = (), bound.arguments
+        return MEMO_PREFIX + call_key(self.fingerprint, args, kwargs, self.result_metadata)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, doid):
+        """
+        Returns the memoized object of a doid from memory or the repository.
+
+        Parameters:
+        doid (str): The doid returned by `doid`.
+
+        Returns:
+        DataDigitalObject: The object, or None if the call has not been memoized.
+        """
+        cached = self.memory.get(doid)
+        if cached is not None:
+            self._count("hits")
+            return cached
+        if self.repo.exists(doid):
+            stored = self.repo.load(doid)
+            if stored:
+                # The same type a call that runs the function returns.
+                stored = DataDigitalObject(stored.data, stored.metadata, doid=stored.doid)
+                self._count("repository_hits")
+                # 计数上限由条目数控制，因此不需要对象的序列化大小
+                self.memory.put(doid, stored, 0)
+                return stored
+        return None
+
+    def store(self, doid, ddo):
+        """
+        Records the result of a call after it has been saved.
+
+        Parameters:
+        doid (str): The doid returned by `doid`.
+        ddo (DigitalObject): The saved object.
+        """
+        self._count("misses")
+        self.memory.put(doid, ddo, 0)
+
+    def metadata(self, metadata, doid):
+        """
+        Returns a copy of the metadata recording the memoized call.
+
+        Parameters:
+        metadata (dict): The metadata given to the decorator.
+        doid (str): The doid returned by `doid`.
+
+        Returns:
+        dict: The metadata with a `_memo` entry holding the function fingerprint and call key.
+        """
+        return dict(metadata or {}, **{MEMO_METADATA_KEY: {
+            "function": self.fingerprint, "key": doid[len(MEMO_PREFIX):]}})
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Forgets the result of one call, in memory and in the repository.
+
+        Returns:
+        bool: True if a stored result was deleted.
+        """
+        doid = self.doid(*args, **kwargs)
+        self.memory.invalidate(doid)
+        return bool(self.repo.exists(doid) and self.repo.delete(doid))
+
+    def clear(self, persistent=False):
+        """
+        Forgets all results of the function.
+
+        Parameters:
+        persistent (bool, optional): Also delete the stored results of the current
+            function version from the repository.
+
+        Returns:
+        int: Number of stored results deleted.
+        """
+        self.memory.clear()
+        if not persistent:
+            return 0
+        doids = [obj.doid for obj in self.repo.list_objects(
+            {f"{MEMO_METADATA_KEY}.function": self.fingerprint})]
+        if doids:
+            self.repo.delete_many(doids)
+        logging.debug(f"Deleted {len(doids)} memoized results of {self.func.__qualname__}.")
+        return len(doids)
+
+    def stats(self):
+        """
+        Returns the memoization counters.
+
+        Returns:
+        dict: hits, repository_hits, misses, hit_rate and the size of the in-memory layer.
+        """
+        with self._lock:
+            calls = self.hits + self.repository_hits + self.misses
+            return {
+                "hits": self.hits,
+                "repository_hits": self.repository_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.repository_hits) / calls if calls else 0.0,
+                "entries": len(self.memory),
+            }
@@ -0,0 +1,613 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import dill
+from .core import Relationship
+from .dos import DataDigitalObject, FunctionDigitalObject
+from .memo import function_fingerprint, value_hash
+
+# Metadata key of pipeline DDOs, holding the content hash of their data.
+PIPELINE_METADATA_KEY = "_pipeline"
+
+RAN = "ran"
+SKIPPED = "skipped"
+STALE = "stale"
+UP_TO_DATE = "up to date"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Step:
+    """
+    One FDO of a pipeline: a function from named input DDOs to named output DDOs.
+
+    Attributes:
+    name (str): The step name, unique in the pipeline.
+    func (function): Called with the data of the input DDOs, in order; returns one value per output.
+    input_ddos (list of str): Names of the input DDOs.
+    output_ddos (list of str): Names of the output DDOs.
+    relationship_text (str): Description recorded on the relationship of each run.
+    fingerprint (str): Hash of the function's code, see memo.function_fingerprint.
+    io_bound (bool): Whether the function mostly waits on I/O, so DAGExecutor runs it on a thread.
+    """
+    def __init__(self, name, func, input_ddos, output_ddos, relationship_text="", io_bound=False):
+        self.name = name
+        self.func = func
+        self.input_ddos = list(input_ddos)
+        self.output_ddos = list(output_ddos)
+        self.relationship_text = relationship_text
+        self.io_bound = io_bound
+        self.fingerprint = function_fingerprint(func)
+
+    def __repr__(self):
+        return f"Step({self.name!r}, input_ddos={self.input_ddos}, output_ddos={self.output_ddos})"
+
+
+class PipelineReport:
+    """
+    Outcome of Pipeline.plan or Pipeline.run.
+
+    Attributes:
+    steps (dict): Step name mapped to a dict with its status (RAN, SKIPPED, STALE,
+        UP_TO_DATE, FAILED or CANCELLED), the reasons it was stale or failed and the
+        seconds it ran; DAGExecutor adds its start and end, in seconds since the run started.
+    results (dict): DDO name mapped to its DigitalObject; outputs of skipped steps are
+        LazyDigitalObjects that read their data on first access.
+    critical_path (list of str): Steps of the longest chain of dependent step durations (DAGExecutor only).
+    critical_path_seconds (float): Sum of the durations along the critical path.
+    wall_seconds (float): Duration of the whole run.
+    """
+    def __init__(self):
+        self.steps = {}
+        self.results = {}
+        self.critical_path = []
+        self.critical_path_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def _record(self, name, status, reasons=(), seconds=0.0, **timing):
+        self.steps[name] = {"status": status, "reasons": list(reasons), "seconds": seconds, **timing}
+
+    @property
+    def ok(self):
+        """
+        Returns whether no step failed or was cancelled.
+
+        Returns:
+        bool: True if every step ran or was skipped.
+        """
+        return all(step["status"] not in (FAILED, CANCELLED) for step in self.steps.values())
+
+    @property
+    def stale(self):
+        """
+        Returns the steps that are stale (plan) or were rerun (run).
+
+        Returns:
+        list of str: The step names, in execution order.
+        """
+        return [name for name, step in self.steps.items() if step["status"] in (STALE, RAN)]
+
+    def __repr__(self):
+        counts = {}
+        for step in self.steps.values():
+            counts[step["status"]] = counts.get(step["status"], 0) + 1
+        return f"PipelineReport({', '.join(f'{status}={count}' for status, count in counts.items())})"
+
+
+class Pipeline:
+    """
+    Incremental runner of FDO steps, rerunning only steps whose inputs or code changed.
+
+    Every run of a step is recorded as a Relationship from its input DDOs to its
+    output DDOs whose metadata holds the function fingerprint and the content
+    hashes of the inputs and outputs. A step is up to date when its latest
+    record matches the current code and input hashes and its outputs still
+    have the recorded hashes, like a build system comparing file digests.
+    Outputs whose content did not change are not rewritten, so their
+    downstream steps stay up to date.
+
+    DDOs are stored under the doid `<pipeline name>.<DDO name>`.
+
+    Attributes:
+    repo (DigitalObjectRepository): Repository holding the DDOs, FDOs and relationships.
+    name (str): Namespace of the pipeline's doids.
+    steps (dict): Step name mapped to its Step, in registration order.
+    """
+    def __init__(self, repo, name="pipeline", url=None):
+        """
+        Initializes a Pipeline.
+
+        Parameters:
+        repo (DigitalObjectRepository): Repository holding the DDOs, FDOs and relationships.
+        name (str, optional): Namespace of the pipeline's doids.
+        url (str, optional): The URL of the repository, defaults to the repository's own.
+        """
+        self.repo = repo
+        self.name = name
+        self.url = url or repo.repo_db_url
+        self.steps = {}
+
+    def doid(self, ddo_name):
+        return f"{self.name}.{ddo_name}"
+
+    def FDO(self, input_ddos=(), output_ddos=(), relationship_text="", name=None, io_bound=False):
+        """
+        Decorator registering a function as a step; the function itself is returned unchanged.
+
+        Parameters:
+        input_ddos (list of str): Names of the input DDOs, passed to the function in order.
+        output_ddos (list of str): Names of the output DDOs; a function with several outputs returns a tuple.
+        relationship_text (str, optional): Description recorded on the relationship of each run.
+        name (str, optional): Step name, defaults to the function name.
+        io_bound (bool, optional): The function mostly waits on I/O; DAGExecutor runs it on a thread
+            instead of a worker process.
+
+        Returns:
+        function: The decorator.
+        """
+        def decorator(func):
+            self.add(Step(name or func.__name__, func, input_ddos, output_ddos, relationship_text, io_bound))
+            return func
+        return decorator
+
+    def add(self, step):
+        """
+        Adds a step.
+
+        Parameters:
+        step (Step): The step; its outputs must not be produced by another step.
+        """
+        if step.name in self.steps:
+            raise ValueError(f"Duplicate step name {step.name!r}.")
+        for other in self.steps.values():
+            shared = set(other.output_ddos) & set(step.output_ddos)
+            if shared:
+                raise ValueError(f"Steps {other.name!r} and {step.name!r} both produce {sorted(shared)}.")
+        self.steps[step.name] = step
+
+    def source(self, ddo_name, data, metadata=None):
+        """
+        Sets an input DDO that no step produces, writing it only if its content changed.
+
+        Parameters:
+        ddo_name (str): Name of the DDO.
+        data (any): Its data.
+        metadata (dict, optional): Its metadata.
+
+        Returns:
+        bool: True if the DDO was written.
+        """
+        return self._write(ddo_name, data, metadata, value_hash(data), self._hashes([ddo_name]).get(ddo_name))
+
+    # helpers
+
+    def dependencies(self):
+        """
+        Returns the DAG of the steps, built from their declared input and output DDOs.
+
+        Returns:
+        dict: Step name mapped to the set of names of the steps producing its inputs.
+        """
+        producers = {output: step.name for step in self.steps.values() for output in step.output_ddos}
+        return {name: {producers[ddo] for ddo in step.input_ddos if ddo in producers}
+                for name, step in self.steps.items()}
+
+    def order(self):
+        """
+        Returns the steps in dependency order.
+
+        Returns:
+        list of Step: Each step after the steps producing its inputs.
+        """
+        dependencies = self.dependencies()
+        ordered = []
+        done = set()
+        while len(ordered) < len(self.steps):
+            ready = [name for name in self.steps if name not in done and dependencies[name] <= done]
+            if not ready:
+                cycle = sorted(name for name in self.steps if name not in done)
+                raise ValueError(f"The steps {cycle} form a dependency cycle.")
+            for name in ready:
+                ordered.append(self.steps[name])
+                done.add(name)
+        return ordered
+
+    def _hashes(self, ddo_names):
+        # Content hashes of existing DDOs, from their metadata or, for DDOs written outside the pipeline, their etag.
+        doids = {self.doid(ddo_name): ddo_name for ddo_name in ddo_names}
+        metadata = self.repo.load_metadata_many(doids, url=self.url)
+        hashes = {}
+        for doid, ddo_name in doids.items():
+            if doid not in metadata:
+                continue
+            recorded = (metadata[doid] or {}).get(PIPELINE_METADATA_KEY, {}).get("content")
+            hashes[ddo_name] = recorded or self.repo.get_etag(doid, self.url)
+        return hashes
+
+    def _records(self):
+        # Latest run record of each step, read through the relationships targeting the step outputs.
+        outputs = [self.doid(ddo) for step in self.steps.values() for ddo in step.output_ddos]
+        records = {}
+        for relationship in self.repo.relationships(self.url, to_doids=outputs):
+            metadata = relationship.metadata if isinstance(relationship.metadata, dict) else {}
+            if metadata.get("pipeline") != self.name or metadata.get("step") not in self.steps:
+                continue
+            latest = records.get(metadata["step"])
+            if latest is None or metadata.get("completed_at", 0) >= latest.get("completed_at", 0):
+                records[metadata["step"]] = metadata
+        return records
+
+    def _reasons(self, step, record, hashes):
+        # Why a step is stale given its latest record and the current content hashes; empty if up to date.
+        if record is None:
+            return ["never ran"]
+        reasons = []
+        if record.get("fingerprint") != step.fingerprint:
+            reasons.append("function code changed")
+        recorded_inputs = record.get("inputs", {})
+        for ddo in step.input_ddos:
+            if hashes.get(ddo) != recorded_inputs.get(self.doid(ddo)):
+                reasons.append(f"input {ddo} changed")
+        recorded_outputs = record.get("outputs", {})
+        for ddo in step.output_ddos:
+            if ddo not in hashes:
+                reasons.append(f"output {ddo} is missing")
+            elif hashes[ddo] != recorded_outputs.get(self.doid(ddo)):
+                reasons.append(f"output {ddo} was modified")
+        return reasons
+
+    def _write(self, ddo_name, data, metadata, content, current):
+        if content == current:
+            return False
+        doid = self.doid(ddo_name)
+        ddo = DataDigitalObject(data, dict(metadata or {}, **{PIPELINE_METADATA_KEY: {
+            "pipeline": self.name, "name": ddo_name, "content": content}}), doid=doid)
+        written = self.repo.update(doid, ddo, self.url) if current is not None else self.repo.save(ddo, self.url)
+        if not written:
+            raise RuntimeError(f"Failed to write DDO {doid}.")
+        return True
+
+    def _save_function(self, step):
+        doid = f"fdo-{step.fingerprint}"
+        if not self.repo.exists(doid, self.url):
+            fdo = FunctionDigitalObject(step.func, {"function": step.func.__qualname__, "step": step.name}, doid=doid)
+            if not self.repo.save(fdo, self.url):
+                logging.error(f"Failed to store the function of step {step.name}.")
+        return doid
+
+    def _prepare(self):
+        # Steps in order, current content hashes and latest run records; fails early on missing inputs.
+        steps = self.order()
+        produced = {ddo for step in steps for ddo in step.output_ddos}
+        hashes = self._hashes({ddo for step in steps for ddo in step.input_ddos + step.output_ddos})
+        for step in steps:
+            missing = [ddo for ddo in step.input_ddos if ddo not in hashes and ddo not in produced]
+            if missing:
+                raise ValueError(f"Step {step.name!r} is missing the input DDOs {missing}.")
+        return steps, hashes, self._records()
+
+    def _skip(self, step, report):
+        for ddo in step.output_ddos:
+            report.results[ddo] = self.repo.load(self.doid(ddo), self.url, lazy=True)
+        report._record(step.name, SKIPPED)
+
+    # planning and running
+
+    def plan(self):
+        """
+        Dry run: reports which steps would run, and why, without running or writing anything.
+
+        Steps downstream of a stale step are reported stale too, since their inputs
+        may change; at run time they are skipped if those inputs come out unchanged.
+
+        Returns:
+        PipelineReport: Every step with status STALE or UP_TO_DATE and its reasons.
+        """
+        steps, hashes, records = self._prepare()
+        report = PipelineReport()
+        stale_outputs = {}
+        for step in steps:
+            reasons = self._reasons(step, records.get(step.name), hashes)
+            upstream = dict.fromkeys(stale_outputs[ddo] for ddo in step.input_ddos if ddo in stale_outputs)
+            reasons += [f"upstream step {name} is stale" for name in upstream]
+            if reasons:
+                stale_outputs.update(dict.fromkeys(step.output_ddos, step.name))
+            report._record(step.name, STALE if reasons else UP_TO_DATE, reasons)
+        return report
+
+    def run(self, force=False):
+        """
+        Runs the stale steps in dependency order and skips the others.
+
+        Parameters:
+        force (bool, optional): Run every step.
+
+        Returns:
+        PipelineReport: Every step with status RAN or SKIPPED, and the DDOs of all steps in `results`.
+        """
+        steps, hashes, records = self._prepare()
+        report = PipelineReport()
+        for step in steps:
+            reasons = ["forced"] if force else self._reasons(step, records.get(step.name), hashes)
+            if not reasons:
+                self._skip(step, report)
+                continue
+            start = time.perf_counter()
+            self.execute(step, hashes, report.results)
+            report._record(step.name, RAN, reasons, time.perf_counter() - start)
+            logging.debug(f"Step {step.name} ran in {report.steps[step.name]['seconds']:.3f}s: {', '.join(reasons)}")
+        return report
+
+    def _input_values(self, step, results):
+        values = []
+        for ddo in step.input_ddos:
+            value = results.get(ddo)
+            if value is None:
+                value = results[ddo] = self.repo.load(self.doid(ddo), self.url, lazy=True)
+            if not value:
+                raise ValueError(f"Input DDO {self.doid(ddo)} of step {step.name!r} cannot be loaded.")
+            values.append(value.data)
+        return values
+
+    def execute(self, step, hashes, results):
+        """
+        Runs one step, writes its changed outputs and records the run as a Relationship.
+
+        Parameters:
+        step (Step): The step.
+        hashes (dict): Current content hash of each DDO name; updated with the outputs.
+        results (dict): DDO name mapped to its DigitalObject; inputs are read from it and outputs added.
+        """
+        outputs = self.split_outputs(step, step.func(*self._input_values(step, results)))
+        self.record(step, outputs, hashes, results)
+
+    @staticmethod
+    def split_outputs(step, outputs):
+        """
+        Returns the value of each output DDO from a step function's return value.
+
+        Parameters:
+        step (Step): The step.
+        outputs (any): The return value; a tuple with one value per output when there are several.
+
+        Returns:
+        list: One value per output DDO.
+        """
+        if len(step.output_ddos) == 1:
+            return [outputs]
+        if not isinstance(outputs, tuple) or len(outputs) != len(step.output_ddos):
+            raise ValueError(f"Step {step.name!r} must return a tuple of {len(step.output_ddos)} values.")
+        return list(outputs)
+
+    def record(self, step, outputs, hashes, results):
+        """
+        Writes the outputs of a step run and the Relationship recording it.
+
+        Parameters:
+        step (Step): The step.
+        outputs (list): One value per output DDO.
+        hashes (dict): Current content hash of each DDO name; updated with the outputs.
+        results (dict): DDO name mapped to its DigitalObject; the outputs are added.
+        """
+        for ddo, data in zip(step.output_ddos, outputs):
+            content = value_hash(data)
+            self._write(ddo, data, None, content, hashes.get(ddo))
+            hashes[ddo] = content
+            results[ddo] = DataDigitalObject(data, {PIPELINE_METADATA_KEY: {
+                "pipeline": self.name, "name": ddo, "content": content}}, doid=self.doid(ddo))
+        Relationship([self.doid(ddo) for ddo in step.input_ddos], [self.doid(ddo) for ddo in step.output_ddos], {
+            "type": "Func",
+            "func": self._save_function(step),
+            "description": step.relationship_text,
+            "pipeline": self.name,
+            "step": step.name,
+            "fingerprint": step.fingerprint,
+            "inputs": {self.doid(ddo): hashes.get(ddo) for ddo in step.input_ddos},
+            "outputs": {self.doid(ddo): hashes[ddo] for ddo in step.output_ddos},
+            "completed_at": time.time(),
+        }, url=self.url, repo=self.repo)
+
+    def run_parallel(self, force=False, processes=None, threads=8, max_in_flight=None, fail_fast=True):
+        """
+        Runs the stale steps concurrently with a DAGExecutor; see DAGExecutor.run.
+
+        Returns:
+        PipelineReport: As for run, with step timings and the critical path.
+        """
+        return DAGExecutor(self, processes, threads, max_in_flight, fail_fast).run(force)
+
+
+def _run_shipped(payload):
+    # Runs in a worker process: the function and its arguments arrive pickled with dill, so closures work.
+    func, values = dill.loads(payload)
+    start = time.perf_counter()
+    outputs = func(*values)
+    return dill.dumps((outputs, time.perf_counter() - start))
+
+
+def _run_local(func, values):
+    start = time.perf_counter()
+    outputs = func(*values)
+    return outputs, time.perf_counter() - start
+
+
+class DAGExecutor:
+    """
+    Runs the steps of a Pipeline concurrently as soon as the steps producing their inputs finish.
+
+    CPU-bound steps run on a process pool, their functions and inputs shipped
+    with dill; steps declared io_bound run on a thread pool. Staleness is
+    decided when a step becomes ready, so steps whose upstream outputs came
+    out unchanged are still skipped. Reading inputs, writing outputs and
+    recording runs happen in the calling thread.
+
+    At most `max_in_flight` steps are submitted at a time, which bounds the
+    inputs held in memory and queued in the pools. cancel(), or a failing step
+    with fail_fast, stops submitting steps; steps already running finish and
+    are recorded, the others are reported CANCELLED.
+
+    Attributes:
+    pipeline (Pipeline): The pipeline to run.
+    processes (int): Size of the process pool; 0 runs CPU-bound steps on the thread pool.
+    threads (int): Size of the thread pool.
+    max_in_flight (int): Maximum number of steps submitted and not yet finished.
+    fail_fast (bool): Whether a failing step cancels the rest of the run.
+    """
+    def __init__(self, pipeline, processes=None, threads=8, max_in_flight=None, fail_fast=True):
+        """
+        Initializes a DAGExecutor.
+
+        Parameters:
+        pipeline (Pipeline): The pipeline to run.
+        processes (int, optional): Size of the process pool, defaults to the number of CPUs.
+        threads (int, optional): Size of the thread pool.
+        max_in_flight (int, optional): Maximum number of steps submitted at a time,
+            defaults to processes + threads.
+        fail_fast (bool, optional): Cancel the rest of the run when a step fails; otherwise
+            only the steps depending on it are cancelled.
+        """
+        self.pipeline = pipeline
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.threads = max(1, threads)
+        self.max_in_flight = max_in_flight or self.processes + self.threads
+        self.fail_fast = fail_fast
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Stops the current run from starting further steps; may be called from another thread.
+        """
+        self._cancelled.set()
+
+    def run(self, force=False):
+        """
+        Runs the pipeline.
+
+        Parameters:
+        force (bool, optional): Run every step.
+
+        Returns:
+        PipelineReport: Every step with status RAN, SKIPPED, FAILED or CANCELLED and its start
+        and end times, the DDOs in `results`, and the critical path.
+        """
+        self._cancelled.clear()
+        pipeline = self.pipeline
+        steps, hashes, records = pipeline._prepare()
+        dependencies = pipeline.dependencies()
+        dependents = {step.name: [] for step in steps}
+        for name, upstream in dependencies.items():
+            for dependency in upstream:
+                dependents[dependency].append(name)
+        waiting = {name: len(upstream) for name, upstream in dependencies.items()}
+        ready = deque(step.name for step in steps if not waiting[step.name])
+        report = PipelineReport()
+        in_flight = {}
+        pools = {}
+        run_start = time.perf_counter()
+
+        def finished(name):
+            for dependent in dependents[name]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+
+        def pool(step):
+            kind = "processes" if self.processes and not step.io_bound else "threads"
+            if kind not in pools:
+                pools[kind] = (ProcessPoolExecutor(self.processes) if kind == "processes"
+                               else ThreadPoolExecutor(self.threads, thread_name_prefix="ddolib-dag"))
+            return kind, pools[kind]
+
+        def complete(future):
+            step, reasons, started = in_flight.pop(future)
+            try:
+                result = future.result()
+                outputs, seconds = dill.loads(result) if isinstance(result, bytes) else result
+                pipeline.record(step, pipeline.split_outputs(step, outputs), hashes, report.results)
+            except Exception as e:
+                logging.error(f"Step {step.name} failed: {e}")
+                report._record(step.name, FAILED, reasons + [f"{type(e).__name__}: {e}"],
+                               time.perf_counter() - started, start=started - run_start,
+                               end=time.perf_counter() - run_start)
+                if self.fail_fast:
+                    self._cancelled.set()
+                return
+            report._record(step.name, RAN, reasons, seconds, start=started - run_start,
+                           end=time.perf_counter() - run_start)
+            finished(step.name)
+
+        try:
+            while (ready or in_flight) and not self._cancelled.is_set():
+                while ready and len(in_flight) < self.max_in_flight and not self._cancelled.is_set():
+                    step = pipeline.steps[ready.popleft()]
+                    reasons = ["forced"] if force else pipeline._reasons(step, records.get(step.name), hashes)
+                    if not reasons:
+                        now = time.perf_counter() - run_start
+                        pipeline._skip(step, report)
+                        report.steps[step.name].update(start=now, end=now)
+                        finished(step.name)
+                        continue
+                    try:
+                        values = pipeline._input_values(step, report.results)
+                        kind, executor = pool(step)
+                        if kind == "processes":
+                            future = executor.submit(_run_shipped, dill.dumps((step.func, values)))
+                        else:
+                            future = executor.submit(_run_local, step.func, values)
+                    except Exception as e:
+                        logging.error(f"Step {step.name} could not be started: {e}")
+                        report._record(step.name, FAILED, reasons + [f"{type(e).__name__}: {e}"])
+                        if self.fail_fast:
+                            self._cancelled.set()
+                        continue
+                    in_flight[future] = (step, reasons, time.perf_counter())
+                if in_flight:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        complete(future)
+            # 取消后：尚未开始的任务直接取消，已在运行的任务等待完成并记录结果
+            for future in list(in_flight):
+                if future.cancel():
+                    step, reasons, _ = in_flight.pop(future)
+                    report._record(step.name, CANCELLED, reasons)
+            for future in list(in_flight):
+                wait([future])
+                complete(future)
+        finally:
+            # shutdown(cancel_futures=True) needs Python 3.9, so queued steps are cancelled here.
+            for future in in_flight:
+                future.cancel()
+            for executor in pools.values():
+                executor.shutdown(wait=True)
+
+        for step in steps:
+            if step.name not in report.steps:
+                failed_upstream = [name for name in dependencies[step.name]
+                                   if report.steps.get(name, {}).get("status") in (FAILED, CANCELLED)]
+                reasons = [f"upstream step {name} did not finish" for name in failed_upstream] or ["run cancelled"]
+                report._record(step.name, CANCELLED, reasons)
+        report.wall_seconds = time.perf_counter() - run_start
+        report.critical_path, report.critical_path_seconds = self._critical_path(steps, dependencies, report)
+        return report
+
+    @staticmethod
+    def _critical_path(steps, dependencies, report):
+        # Longest chain of step durations through the DAG, in dependency order.
+        finish = {}
+        previous = {}
+        for step in steps:
+            upstream = max(dependencies[step.name], key=lambda name: finish[name], default=None)
+            finish[step.name] = report.steps[step.name]["seconds"] + (finish[upstream] if upstream else 0.0)
+            previous[step.name] = upstream
+        if not finish:
+            return [], 0.0
+        name = max(finish, key=finish.get)
+        total = finish[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], total
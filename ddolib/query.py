@@ -0,0 +1,274 @@
+import base64
+import json
+import re
+from sqlalchemy import and_, or_, select, literal_column, func, text
+from .schema import digital_objects_table
+
+_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_INDEX_PREFIX = "ix_metadata_"
+
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in")
+
+
+def json_path(path):
+    """
+    Converts a dotted metadata path into a JSON path, e.g. "author.name" into "$.author.name".
+
+    Keys are restricted to identifier characters because the path is inlined
+    into SQL, so that queries and expression indexes use the same expression.
+
+    Parameters:
+    path (str): Dotted path of a metadata field.
+
+    Returns:
+    str: The JSON path.
+    """
+    keys = path.split(".")
+    if not all(_KEY.match(key) for key in keys):
+        raise ValueError(f"Invalid metadata path {path!r}: use dot-separated identifiers.")
+    return "$." + ".".join(keys)
+
+
+def metadata_field(path):
+    """
+    Returns the SQL expression extracting a metadata field, as used by queries and indexes.
+
+    Parameters:
+    path (str): Dotted path of a metadata field.
+
+    Returns:
+    ColumnElement: json_extract(metadata, '<json path>').
+    """
+    return func.json_extract(digital_objects_table.c.metadata, literal_column(f"'{json_path(path)}'"))
+
+
+def index_name(path):
+    """
+    Returns the name of the expression index on a metadata path.
+
+    Parameters:
+    path (str): Dotted path of a metadata field.
+
+    Returns:
+    str: The index name.
+    """
+    json_path(path)
+    return _INDEX_PREFIX + path.replace(".", "__")
+
+
+def create_index_sql(path):
+    return (f"CREATE INDEX IF NOT EXISTS {index_name(path)} ON {digital_objects_table.name} "
+            f"(json_extract(metadata, '{json_path(path)}'))")
+
+
+def drop_index_sql(path):
+    return f"DROP INDEX IF EXISTS {index_name(path)}"
+
+
+def list_indexes_sql():
+    return text("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE :prefix ESCAPE '\\' ORDER BY name").bindparams(
+        prefix=_INDEX_PREFIX.replace("_", "\\_") + "%")
+
+
+def path_from_index_name(name):
+    return name[len(_INDEX_PREFIX):].replace("__", ".")
+
+
+def is_metadata_index(name):
+    return name.startswith(_INDEX_PREFIX)
+
+
+def _normalize(filters):
+    # Yields (path, operator, value) for a filters dict of path -> value or (operator, value).
+    for path, condition in (filters or {}).items():
+        if isinstance(condition, tuple) and len(condition) == 2 and condition[0] in OPERATORS:
+            operator, value = condition
+        else:
+            operator, value = "==", condition
+        yield path, operator, value
+
+
+def _condition(field, operator, value):
+    if operator == "in":
+        return field.in_(list(value))
+    if value is None:
+        if operator == "==":
+            return field.is_(None)
+        if operator == "!=":
+            return field.is_not(None)
+    return {
+        "==": field.__eq__, "!=": field.__ne__, "<": field.__lt__,
+        "<=": field.__le__, ">": field.__gt__, ">=": field.__ge__,
+    }[operator](value)
+
+
+def encode_cursor(value, doid):
+    return base64.urlsafe_b64encode(json.dumps([value, doid]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        value, doid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid query cursor.")
+    return value, doid
+
+
+def _order(order_by):
+    # Returns (field or None, descending).
+    if order_by is None:
+        return None, False
+    descending = order_by.startswith("-")
+    return metadata_field(order_by.lstrip("-")), descending
+
+
+def _after(field, descending, cursor):
+    # Keyset condition for the rows after the cursor, matching SQLite's and MySQL's NULL ordering
+    # (NULLs first in ascending order, last in descending order); ties are broken by doid.
+    value, doid = decode_cursor(cursor)
+    doids = digital_objects_table.c.doid
+    if field is None:
+        return doids < doid if descending else doids > doid
+    if descending:
+        if value is None:
+            return and_(field.is_(None), doids < doid)
+        return or_(field < value, and_(field == value, doids < doid), field.is_(None))
+    if value is None:
+        return or_(and_(field.is_(None), doids > doid), field.is_not(None))
+    return or_(field > value, and_(field == value, doids > doid))
+
+
+def build_query(filters=None, order_by=None, limit=None, cursor=None):
+    """
+    Builds the SELECT for DigitalObjectRepository.query.
+
+    Parameters:
+    filters (dict, optional): Metadata path mapped to a value, or to an (operator, value) tuple.
+    order_by (str, optional): Metadata path to sort by, prefixed with "-" for descending order.
+    limit (int, optional): Maximum number of rows.
+    cursor (str, optional): Cursor returned with the previous page.
+
+    Returns:
+    Select: Selecting doid, metadata and, with order_by, the sort value.
+    """
+    field, descending = _order(order_by)
+    columns = [digital_objects_table.c.doid, digital_objects_table.c.metadata]
+    if field is not None:
+        columns.append(field.label("sort_value"))
+    statement = select(*columns)
+    for path, operator, value in _normalize(filters):
+        statement = statement.where(_condition(metadata_field(path), operator, value))
+    if cursor is not None:
+        statement = statement.where(_after(field, descending, cursor))
+    doids = digital_objects_table.c.doid
+    if field is not None:
+        statement = statement.order_by(field.desc() if descending else field.asc())
+    statement = statement.order_by(doids.desc() if descending else doids.asc())
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _lookup(metadata, path):
+    value = metadata
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _matches(value, operator, expected):
+    if operator == "in":
+        return value in list(expected)
+    if operator == "==":
+        return value == expected
+    if operator == "!=":
+        return value != expected
+    if value is None or expected is None:
+        return False
+    try:
+        return {"<": value < expected, "<=": value <= expected,
+                ">": value > expected, ">=": value >= expected}[operator]
+    except TypeError:
+        return False
+
+
+def _sort_key(value, doid):
+    # NULLs first, like SQLite in ascending order; numbers, strings and other values sort in separate groups.
+    if value is None:
+        return (0, 0, doid)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value, doid)
+    if isinstance(value, str):
+        return (2, value, doid)
+    return (3, json.dumps(value, sort_keys=True), doid)
+
+
+def filter_records(records, filters=None, order_by=None, limit=None, cursor=None):
+    """
+    Applies query semantics in memory to (doid, metadata) records, for stores without SQL.
+
+    Parameters:
+    records (iterable of tuple): (doid, metadata) pairs.
+    filters, order_by, limit, cursor: As for build_query.
+
+    Returns:
+    list of tuple: (doid, metadata, sort value) of the matching records, in order.
+    """
+    conditions = list(_normalize(filters))
+    for path, _, _ in conditions:
+        json_path(path)
+    path = order_by.lstrip("-") if order_by else None
+    descending = bool(order_by) and order_by.startswith("-")
+    rows = []
+    for doid, metadata in records:
+        if all(_matches(_lookup(metadata, field), operator, value) for field, operator, value in conditions):
+            rows.append((doid, metadata, _lookup(metadata, path) if path else None))
+
+    if cursor is not None:
+        value, doid = decode_cursor(cursor)
+        after = _sort_key(value if path else None, doid)
+        rows = [row for row in rows if (_sort_key(row[2], row[0]) < after if descending
+                                        else _sort_key(row[2], row[0]) > after)]
+    rows.sort(key=lambda row: _sort_key(row[2], row[0]), reverse=descending)
+    return rows[:limit] if limit is not None else rows
+
+
+class QueryResult:
+    """
+    One page of results of DigitalObjectRepository.query.
+
+    Attributes:
+    rows (list of tuple): (doid, metadata) of each matching object, in order.
+    cursor (str): Cursor for the next page, or None if this is the last page.
+    """
+    def __init__(self, rows, cursor=None):
+        """
+        Initializes a QueryResult.
+
+        Parameters:
+        rows (list of tuple): (doid, metadata) of each matching object, in order.
+        cursor (str, optional): Cursor for the next page.
+        """
+        self.rows = rows
+        self.cursor = cursor
+
+    @property
+    def doids(self):
+        """
+        Returns the doids of the page.
+
+        Returns:
+        list of str: The doids, in order.
+        """
+        return [doid for doid, _ in self.rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return f"QueryResult(rows={len(self.rows)}, cursor={self.cursor!r})"
@@ -0,0 +1,294 @@
+import json
+import logging
+from sqlalchemy import MetaData, Table, Column, Index, String, Integer, BigInteger, LargeBinary, JSON, inspect, select, bindparam, func
+from sqlalchemy.sql import insert, update, delete
+from .identifiers import object_etag
+from .utils import chunked
+
+# Bump SCHEMA_VERSION and register a function in MIGRATIONS whenever a table changes.
+SCHEMA_VERSION = 8
+
+metadata = MetaData()
+
+digital_objects_table = Table(
+    'digital_objects', metadata,
+    Column('doid', String, primary_key=True),
+    Column('data', LargeBinary),
+    Column('metadata', JSON),
+    # Name of the serialization codec of `data`; NULL for rows written before codecs existed (dill).
+    Column('codec', String(16)),
+    # Name of the compressor applied to `data` after serialization; NULL when stored raw.
+    Column('compression', String(16)),
+    # Content hash of the shared payload in `blobs` when the row was written with deduplication; `data` is NULL then.
+    Column('blob_hash', String(71)),
+    # Total size and chunk size of payloads stored in `object_chunks` by save_stream; NULL otherwise.
+    Column('stream_size', BigInteger),
+    Column('chunk_size', Integer),
+    # Entity tag: hash of the stored payload and metadata, changed by every write; NULL until computed for older rows.
+    Column('etag', String(64)))
+
+# Fixed-size pieces of streamed payloads, numbered from 0.
+object_chunks_table = Table(
+    'object_chunks', metadata,
+    Column('doid', String, primary_key=True),
+    Column('seq', Integer, primary_key=True),
+    Column('data', LargeBinary))
+
+# Content-addressed payloads shared by deduplicating repositories, reference counted by digital_objects rows.
+blobs_table = Table(
+    'blobs', metadata,
+    Column('hash', String(71), primary_key=True),
+    Column('data', LargeBinary),
+    Column('refcount', Integer, nullable=False))
+
+relationships_table = Table(
+    'relationships', metadata,
+    Column('doid', String, primary_key=True),
+    Column('from_ddo_doids', JSON),
+    Column('to_ddo_doids', JSON),
+    Column('metadata', JSON))
+
+# One row per (from doid, to doid) pair of each relationship, indexed in both directions for lineage queries.
+relationship_edges_table = Table(
+    'relationship_edges', metadata,
+    Column('src', String, primary_key=True),
+    Column('dst', String, primary_key=True),
+    Column('relationship_doid', String, primary_key=True),
+    Index('ix_relationship_edges_dst', 'dst'))
+
+schema_version_table = Table(
+    'schema_version', metadata,
+    Column('version', Integer, nullable=False))
+
+# Statements built once and reused; SQLAlchemy caches their compiled form per dialect.
+_digital_objects_with_blobs = digital_objects_table.outerjoin(
+    blobs_table, digital_objects_table.c.blob_hash == blobs_table.c.hash)
+_payload = func.coalesce(digital_objects_table.c.data, blobs_table.c.data, type_=LargeBinary)
+select_digital_object = select(
+    _payload, digital_objects_table.c.metadata, digital_objects_table.c.codec,
+    digital_objects_table.c.compression, digital_objects_table.c.stream_size).select_from(
+    _digital_objects_with_blobs).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+insert_digital_object = insert(digital_objects_table)
+update_digital_object = update(digital_objects_table).where(
+    digital_objects_table.c.doid == bindparam('b_doid'))
+update_digital_object_if_match = update_digital_object.where(
+    digital_objects_table.c.etag == bindparam('b_etag'))
+fill_missing_etag = update_digital_object.where(digital_objects_table.c.etag.is_(None))
+select_etag = select(digital_objects_table.c.etag).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+select_etags_in = select(digital_objects_table.c.doid, digital_objects_table.c.etag).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+delete_digital_object = delete(digital_objects_table).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+# Updates and deletes that only match rows keeping their payload inline, so nothing else has to be cleaned
+# up; when they match no row, the row is missing, references a blob or chunks, or the etag did not match.
+_inline_payload = (digital_objects_table.c.blob_hash.is_(None), digital_objects_table.c.stream_size.is_(None))
+update_inline_object = update_digital_object.where(*_inline_payload)
+update_inline_object_if_match = update_digital_object_if_match.where(*_inline_payload)
+delete_inline_object = delete_digital_object.where(*_inline_payload)
+select_digital_objects_in = select(
+    digital_objects_table.c.doid, _payload, digital_objects_table.c.metadata,
+    digital_objects_table.c.codec, digital_objects_table.c.compression,
+    digital_objects_table.c.stream_size).select_from(_digital_objects_with_blobs).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+select_object_metadata = select(digital_objects_table.c.metadata).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+select_object_metadata_in = select(digital_objects_table.c.doid, digital_objects_table.c.metadata).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+select_doid = select(digital_objects_table.c.doid).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+select_doids_in = select(digital_objects_table.c.doid).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+delete_digital_objects_in = delete(digital_objects_table).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+# What a row's payload references besides its own columns: a shared blob and streamed chunks.
+select_payload_refs = select(
+    digital_objects_table.c.blob_hash, digital_objects_table.c.stream_size, digital_objects_table.c.etag).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+select_payload_refs_in = select(
+    digital_objects_table.c.doid, digital_objects_table.c.blob_hash, digital_objects_table.c.stream_size).where(
+    digital_objects_table.c.doid.in_(bindparam('doids', expanding=True)))
+insert_blob = insert(blobs_table)
+increment_blob_refs = update(blobs_table).where(blobs_table.c.hash == bindparam('b_hash')).values(
+    refcount=blobs_table.c.refcount + bindparam('count'))
+decrement_blob_refs = update(blobs_table).where(blobs_table.c.hash == bindparam('b_hash')).values(
+    refcount=blobs_table.c.refcount - bindparam('count'))
+delete_unreferenced_blob = delete(blobs_table).where(
+    blobs_table.c.hash == bindparam('hash'), blobs_table.c.refcount <= 0)
+delete_unreferenced_blobs = delete(blobs_table).where(blobs_table.c.refcount <= 0)
+# Resets every blob's refcount to the number of rows that reference it.
+recount_blob_refs = update(blobs_table).values(refcount=select(func.count()).where(
+    digital_objects_table.c.blob_hash == blobs_table.c.hash).scalar_subquery())
+select_stream_info = select(digital_objects_table.c.stream_size, digital_objects_table.c.chunk_size).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+select_payload_format = select(digital_objects_table.c.stream_size, digital_objects_table.c.codec).where(
+    digital_objects_table.c.doid == bindparam('doid'))
+# Size and format of a payload stored in one column, and a byte range of it (start is 1-based),
+# so large raw payloads can be streamed without reading the whole value.
+select_payload_info = select(
+    func.length(_payload), digital_objects_table.c.codec, digital_objects_table.c.compression).select_from(
+    _digital_objects_with_blobs).where(digital_objects_table.c.doid == bindparam('doid'))
+select_payload_range = select(
+    func.substr(_payload, bindparam('start'), bindparam('length'), type_=LargeBinary)).select_from(
+    _digital_objects_with_blobs).where(digital_objects_table.c.doid == bindparam('doid'))
+select_object_chunk = select(object_chunks_table.c.data).where(
+    object_chunks_table.c.doid == bindparam('doid'), object_chunks_table.c.seq == bindparam('seq'))
+select_object_chunks = select(object_chunks_table.c.data).where(
+    object_chunks_table.c.doid == bindparam('doid')).order_by(object_chunks_table.c.seq)
+insert_object_chunk = insert(object_chunks_table)
+delete_object_chunks = delete(object_chunks_table).where(object_chunks_table.c.doid == bindparam('doid'))
+delete_object_chunks_in = delete(object_chunks_table).where(
+    object_chunks_table.c.doid.in_(bindparam('doids', expanding=True)))
+insert_relationship = insert(relationships_table)
+select_relationships = select(relationships_table.c.doid, relationships_table.c.from_ddo_doids,
+                              relationships_table.c.to_ddo_doids, relationships_table.c.metadata)
+insert_relationship_edge = insert(relationship_edges_table)
+# Relationships are only ever inserted, so their count and largest doid change with every write.
+select_relationships_marker = select(func.count(), func.max(relationships_table.c.doid))
+select_relationships_in = select_relationships.where(
+    relationships_table.c.doid.in_(bindparam('doids', expanding=True)))
+select_edge_rows_from = select(relationship_edges_table.c.src, relationship_edges_table.c.dst,
+                               relationship_edges_table.c.relationship_doid).where(
+    relationship_edges_table.c.src.in_(bindparam('doids', expanding=True)))
+select_edge_rows_to = select(relationship_edges_table.c.src, relationship_edges_table.c.dst,
+                             relationship_edges_table.c.relationship_doid).where(
+    relationship_edges_table.c.dst.in_(bindparam('doids', expanding=True)))
+select_edges_from = select(relationship_edges_table.c.src, relationship_edges_table.c.dst).where(
+    relationship_edges_table.c.src.in_(bindparam('doids', expanding=True)))
+select_edges_to = select(relationship_edges_table.c.dst, relationship_edges_table.c.src).where(
+    relationship_edges_table.c.dst.in_(bindparam('doids', expanding=True)))
+
+
+def relationship_edge_rows(doid, from_ddo_doids, to_ddo_doids):
+    """
+    Returns the relationship_edges rows of a relationship, one per (from, to) pair.
+
+    Parameters:
+    doid (str): The identifier of the relationship.
+    from_ddo_doids (list of str): The originating data object identifiers.
+    to_ddo_doids (list of str): The target data object identifiers.
+
+    Returns:
+    list of dict: The rows, without duplicates.
+    """
+    pairs = dict.fromkeys((src, dst) for src in from_ddo_doids or [] for dst in to_ddo_doids or [])
+    return [{"src": src, "dst": dst, "relationship_doid": doid} for src, dst in pairs]
+
+
+def add_column(connection, table, column):
+    """
+    Adds a column to an existing table unless it is already present.
+
+    Parameters:
+    connection (Connection): Connection inside the migration transaction.
+    table (Table): The table to alter.
+    column (Column): The column definition, taken from the module-level table.
+    """
+    existing = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+
+def _migrate_1(connection):
+    # Version 1 only introduces the schema_version table itself.
+    pass
+
+
+def _migrate_2(connection):
+    add_column(connection, digital_objects_table, digital_objects_table.c.codec)
+
+
+def _migrate_3(connection):
+    add_column(connection, digital_objects_table, digital_objects_table.c.compression)
+
+
+def _migrate_4(connection):
+    # The blobs table itself is created by create_all.
+    add_column(connection, digital_objects_table, digital_objects_table.c.blob_hash)
+
+
+def _migrate_5(connection):
+    # The object_chunks table itself is created by create_all.
+    add_column(connection, digital_objects_table, digital_objects_table.c.stream_size)
+    add_column(connection, digital_objects_table, digital_objects_table.c.chunk_size)
+
+
+def _migrate_6(connection):
+    # Existing rows get their etag in version 8.
+    add_column(connection, digital_objects_table, digital_objects_table.c.etag)
+
+
+def _migrate_7(connection):
+    # The relationship_edges table is created by create_all; index the relationships written before it.
+    rows = []
+    for doid, from_ddo_doids, to_ddo_doids in connection.execute(select(
+            relationships_table.c.doid, relationships_table.c.from_ddo_doids, relationships_table.c.to_ddo_doids)):
+        rows.extend(relationship_edge_rows(doid, from_ddo_doids, to_ddo_doids))
+    if rows:
+        connection.execute(insert_relationship_edge, rows)
+
+
+def _migrate_8(connection):
+    # Computes the etags of rows written before version 6, so that reads never have to write them.
+    doids = connection.execute(select(digital_objects_table.c.doid).where(
+        digital_objects_table.c.etag.is_(None))).scalars().all()
+    for chunk in chunked(doids, 100):
+        for doid, payload, metadata, _, _, stream_size in connection.execute(
+                select_digital_objects_in, {"doids": chunk}).fetchall():
+            if stream_size is not None:
+                payload = connection.execute(select_object_chunks, {"doid": doid}).scalars().all()
+            metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+            connection.execute(fill_missing_etag, {"b_doid": doid, "etag": object_etag(payload, metadata)})
+
+
+MIGRATIONS = {
+    1: _migrate_1,
+    2: _migrate_2,
+    3: _migrate_3,
+    4: _migrate_4,
+    5: _migrate_5,
+    6: _migrate_6,
+    7: _migrate_7,
+    8: _migrate_8,
+}
+
+
+def bootstrap_connection(connection):
+    """
+    Creates missing tables and migrates the schema inside an open transaction.
+
+    Parameters:
+    connection (Connection): A connection with an active transaction.
+    """
+    inspector = inspect(connection)
+    fresh = not inspector.has_table('digital_objects') and not inspector.has_table('relationships')
+    versioned = inspector.has_table('schema_version')
+    metadata.create_all(connection)
+    if versioned:
+        version = connection.execute(select(schema_version_table.c.version)).scalar() or 0
+    else:
+        version = SCHEMA_VERSION if fresh else 0
+        connection.execute(insert(schema_version_table).values(version=version))
+    if version >= SCHEMA_VERSION:
+        return
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        logging.debug(f"Migrating schema of {connection.engine.url} to version {target}")
+        MIGRATIONS[target](connection)
+    connection.execute(update(schema_version_table).values(version=SCHEMA_VERSION))
+
+
+def bootstrap(engine):
+    """
+    Creates missing tables and migrates an existing database to SCHEMA_VERSION.
+
+    Runs once per engine; databases written before the schema_version table
+    existed are treated as version 0 and migrated forward.
+
+    Parameters:
+    engine (Engine): The engine of the database to prepare.
+    """
+    with engine.begin() as connection:
+        bootstrap_connection(connection)
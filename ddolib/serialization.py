@@ -0,0 +1,175 @@
+import json
+import math
+import pickle
+import dill
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Rows written before the codec column existed were always serialized with dill.
+DEFAULT_CODEC = "dill"
+AUTO = "auto"
+
+
+class Codec:
+    """
+    A named pair of functions turning payloads into bytes and back.
+
+    Attributes:
+    name (str): The tag stored with each row written by this codec.
+    """
+    def __init__(self, name, encode, decode, accepts=None):
+        """
+        Initializes a Codec.
+
+        Parameters:
+        name (str): The tag stored with each row written by this codec.
+        encode (function): Turns a payload into bytes.
+        decode (function): Turns bytes produced by encode back into the payload.
+        accepts (function, optional): Cheap check whether the codec round-trips a payload;
+            codecs without it are never chosen automatically.
+        """
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.accepts = accepts
+
+    def __repr__(self):
+        return f"Codec(name={self.name})"
+
+
+_codecs = {}
+# Order in which automatic selection tries the codecs, cheapest first.
+_auto_order = []
+
+
+def register_codec(codec, auto=True):
+    """
+    Registers a codec under its name.
+
+    Parameters:
+    codec (Codec): The codec to register, replacing any codec with the same name.
+    auto (bool, optional): Whether automatic selection may choose this codec.
+    """
+    _codecs[codec.name] = codec
+    if codec.name in _auto_order:
+        _auto_order.remove(codec.name)
+    if auto and codec.accepts is not None:
+        _auto_order.append(codec.name)
+
+
+def get_codec(name):
+    """
+    Returns a registered codec.
+
+    Parameters:
+    name (str): The codec name, or None for rows without a codec tag.
+
+    Returns:
+    Codec: The registered codec.
+    """
+    try:
+        return _codecs[name or DEFAULT_CODEC]
+    except KeyError:
+        raise ValueError(f"Unknown codec {name}.")
+
+
+def available_codecs():
+    """
+    Returns the names of all registered codecs.
+
+    Returns:
+    list of str: The codec names.
+    """
+    return list(_codecs)
+
+
+def encode(data, codec=AUTO):
+    """
+    Serializes a payload.
+
+    With codec="auto" the registered codecs are tried cheapest first and the
+    first one that accepts and encodes the payload wins; dill is the fallback.
+
+    Parameters:
+    data (any): The payload to serialize.
+    codec (str, optional): A codec name, or "auto".
+
+    Returns:
+    tuple: (codec name, serialized bytes).
+    """
+    if codec != AUTO:
+        return codec, get_codec(codec).encode(data)
+    for name in _auto_order:
+        candidate = _codecs[name]
+        try:
+            if not candidate.accepts(data):
+                continue
+            return name, candidate.encode(data)
+        except Exception:
+            continue
+    return DEFAULT_CODEC, get_codec(DEFAULT_CODEC).encode(data)
+
+
+def decode(payload, codec=None):
+    """
+    Deserializes a payload written by encode.
+
+    Parameters:
+    payload (bytes): The serialized bytes.
+    codec (str, optional): The codec tag stored with the row; None means dill.
+
+    Returns:
+    any: The payload.
+    """
+    return get_codec(codec).decode(payload)
+
+
+def _is_json_native(value):
+    # Only types that JSON maps back to themselves: tuples, non-str keys and NaN would not round-trip.
+    if value is None or isinstance(value, (str, bool, int)):
+        return True
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, list):
+        return all(_is_json_native(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _is_json_native(item) for key, item in value.items())
+    return False
+
+
+def _json_encode(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def _json_decode(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(bytes(payload))
+
+
+def _pickle_encode(value):
+    return pickle.dumps(value, protocol=5)
+
+
+def _pickle_accepts(value):
+    # Plain pickle stores classes by reference, so objects from a script's __main__
+    # could not be loaded by another process; leave those to dill.
+    return type(value).__module__ != "__main__"
+
+
+def _pickle_encode_checked(value):
+    payload = _pickle_encode(value)
+    if b"__main__" in payload:
+        raise pickle.PicklingError("Payload references __main__.")
+    return payload
+
+
+register_codec(Codec("bytes", bytes, bytes, lambda value: type(value) is bytes))
+register_codec(Codec("json", _json_encode, _json_decode, _is_json_native))
+register_codec(Codec("pickle", _pickle_encode_checked, pickle.loads, _pickle_accepts))
+register_codec(Codec("dill", dill.dumps, dill.loads))
@@ -0,0 +1,115 @@
+import logging
+import signal
+import threading
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def make_threaded_server(app, host='127.0.0.1', port=5000, timeout=30):
+    """
+    Creates a multi-threaded WSGI server that finishes in-flight requests when closed.
+
+    Parameters:
+    app (function): The WSGI application.
+    host (str, optional): Interface to bind.
+    port (int, optional): Port to bind, 0 for any free port.
+    timeout (int, optional): Seconds a connection may stay idle while sending its request.
+
+    Returns:
+    BaseWSGIServer: The server; call serve_forever to run it.
+    """
+    handler = type("TimeoutRequestHandler", (WSGIRequestHandler,), {"timeout": timeout})
+    server = make_server(host, port, app, threaded=True, request_handler=handler)
+    # Join request threads on server_close instead of abandoning them.
+    server.daemon_threads = False
+    return server
+
+
+def serve_threaded(app, host='127.0.0.1', port=5000, timeout=30, on_shutdown=None):
+    """
+    Serves an app from one process with a thread per request until SIGTERM or SIGINT.
+
+    Parameters:
+    app (function): The WSGI application.
+    host (str, optional): Interface to bind.
+    port (int, optional): Port to bind.
+    timeout (int, optional): Seconds a connection may stay idle while sending its request. This is only a
+        socket timeout: unlike the gunicorn `timeout` of serve_workers, it does not limit how long a request runs.
+    on_shutdown (function, optional): Called after the last in-flight request has finished.
+    """
+    server = make_threaded_server(app, host, port, timeout)
+    previous = {}
+
+    def stop(signum, frame):
+        logging.info(f"Received signal {signum}, shutting down.")
+        # shutdown() waits for serve_forever to return, so it cannot run on the serving thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous[signum] = signal.signal(signum, stop)
+    try:
+        logging.info(f"Serving on http://{host}:{server.server_port}")
+        server.serve_forever()
+    finally:
+        server.server_close()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        if on_shutdown is not None:
+            on_shutdown()
+
+
+if BaseApplication is not None:
+    class _GunicornApplication(BaseApplication):
+        def __init__(self, app, options):
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+
+def serve_workers(app, host='127.0.0.1', port=5000, workers=2, threads=8, timeout=30, graceful_timeout=30,
+                  post_fork=None, on_shutdown=None):
+    """
+    Serves an app from several gunicorn worker processes, each running a pool of threads.
+
+    gunicorn restarts workers whose request exceeds `timeout` and, on SIGTERM,
+    stops accepting connections and gives in-flight requests `graceful_timeout`
+    seconds to finish.
+
+    Parameters:
+    app (function): The WSGI application, built before the workers are forked.
+    host (str, optional): Interface to bind.
+    port (int, optional): Port to bind.
+    workers (int, optional): Number of worker processes.
+    threads (int, optional): Number of request threads per worker.
+    timeout (int, optional): Seconds a request may run before its worker is restarted.
+    graceful_timeout (int, optional): Seconds in-flight requests get to finish on shutdown.
+    post_fork (function, optional): Called in each worker right after it is forked.
+    on_shutdown (function, optional): Called in each worker when it exits.
+    """
+    if BaseApplication is None:
+        raise ImportError("Serving with several worker processes requires gunicorn: pip install ddolib[server].")
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+    }
+    if post_fork is not None:
+        options["post_fork"] = lambda arbiter, worker: post_fork()
+    if on_shutdown is not None:
+        options["worker_exit"] = lambda arbiter, worker: on_shutdown()
+    _GunicornApplication(app, options).run()
@@ -2,8 +2,12 @@ import streamlit as st
 import os
 from .connetion import StorageManager
 
-# 初始化 StorageManager 实例
-storage_manager = StorageManager()
+# 初始化 StorageManager 实例；Streamlit 每次交互都会重新运行脚本，缓存实例以复用布局缓存
+@st.cache_resource
+def get_storage_manager():
+    return StorageManager()
+
+storage_manager = get_storage_manager()
 
 # 标题
 st.title("Interactive Network Graph")
@@ -13,8 +17,16 @@ show_ddo_metadata = st.checkbox("Show DDO Metadata", value=False)
 show_fdo_metadata = st.checkbox("Show FDO Metadata", value=True)
 show_rel_metadata = st.checkbox("Show Relationship Metadata", value=False)
 
+# 只显示某个 doid 周围的邻域，留空则显示整个网络（超过上限时聚类）
+center_doid = st.text_input("Centre doid (empty for the whole network)", value="").strip() or None
+hops = st.slider("Hops", min_value=1, max_value=6, value=2)
+max_nodes = st.number_input("Maximum nodes", min_value=50, max_value=20000, value=1000, step=50)
+
 # 绘制关系网络
-storage_manager.draw_relationship_network(show_ddo_metadata, show_fdo_metadata, show_rel_metadata)
+stats = storage_manager.draw_relationship_network(show_ddo_metadata, show_fdo_metadata, show_rel_metadata,
+                                                  doid=center_doid, hops=hops, max_nodes=int(max_nodes))
+if stats["hidden"]:
+    st.caption(f"{stats['hidden']} nodes are clustered; enter a doid to see its neighbourhood.")
 
 # 显示网络图
 html_path = 'network.html'
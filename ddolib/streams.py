@@ -0,0 +1,179 @@
+import io
+import os
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def rechunk(chunks, chunk_size):
+    """
+    Regroups an iterable of byte strings into pieces of exactly `chunk_size` bytes.
+
+    Parameters:
+    chunks (iterable of bytes): The incoming data, in pieces of any size.
+    chunk_size (int): Size of every produced piece except the last.
+
+    Returns:
+    generator: bytes objects of chunk_size bytes, the last one possibly shorter.
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+class ChunkedReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over an object stored as fixed-size chunks.
+
+    Only the chunk under the current position is held in memory; chunks are
+    fetched on demand through a callback.
+
+    Attributes:
+    size (int): Total size of the object in bytes.
+    chunk_size (int): Size of every chunk except the last.
+    """
+    def __init__(self, fetch_chunk, size, chunk_size):
+        """
+        Initializes a ChunkedReader.
+
+        Parameters:
+        fetch_chunk (function): Called with a chunk number, returns that chunk's bytes.
+        size (int): Total size of the object in bytes.
+        chunk_size (int): Size of every chunk except the last.
+        """
+        super().__init__()
+        self._fetch_chunk = fetch_chunk
+        self.size = size
+        self.chunk_size = chunk_size
+        self._position = 0
+        self._current_seq = None
+        self._current = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}.")
+        if position < 0:
+            raise ValueError("Negative seek position.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        seq, offset = divmod(self._position, self.chunk_size)
+        if seq != self._current_seq:
+            self._current = self._fetch_chunk(seq)
+            self._current_seq = seq
+        piece = memoryview(self._current)[offset:offset + len(buffer)]
+        count = len(piece)
+        buffer[:count] = piece
+        self._position += count
+        return count
+
+
+class FileSliceReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a byte range of a file.
+
+    Attributes:
+    size (int): Size of the range in bytes.
+    """
+    def __init__(self, path, offset, size):
+        """
+        Initializes a FileSliceReader.
+
+        Parameters:
+        path (str): The file to read.
+        offset (int): Start of the range within the file.
+        size (int): Size of the range in bytes.
+        """
+        super().__init__()
+        self._file = open(path, "rb")
+        self._offset = offset
+        self.size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}.")
+        if position < 0:
+            raise ValueError("Negative seek position.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.size - self._position)
+        if count <= 0:
+            return 0
+        data = os.pread(self._file.fileno(), count, self._offset + self._position)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+def iter_range(reader, start=0, end=None, block_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the bytes of a reader between `start` and `end`, one block at a time, then closes it.
+
+    Parameters:
+    reader (file object): A seekable reader with a `size` attribute, such as ChunkedReader,
+        or a buffered reader wrapping one.
+    start (int, optional): First byte to yield.
+    end (int, optional): One past the last byte to yield, defaults to the end of the object.
+    block_size (int, optional): Maximum size of each yielded block.
+
+    Returns:
+    generator: bytes objects.
+    """
+    try:
+        size = reader.raw.size if hasattr(reader, "raw") else reader.size
+        end = size if end is None else min(end, size)
+        reader.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = reader.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        reader.close()
@@ -0,0 +1,22 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most `size` items.
+
+    Parameters:
+    iterable (iterable): The items to split.
+    size (int): The maximum number of items per chunk.
+
+    Returns:
+    generator: Lists of consecutive items.
+    """
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1.")
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
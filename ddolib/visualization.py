@@ -0,0 +1,498 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import zlib
+from .batch import RelationshipSet
+from .engine import is_sql_url
+from .lineage import UPSTREAM, DOWNSTREAM
+from .schema import (select_edge_rows_from, select_edge_rows_to, select_relationships_in,
+                     select_relationships_marker, select_etags_in)
+from .utils import chunked
+
+DDO = "ddo"
+FDO = "fdo"
+CLUSTER = "cluster"
+
+CLUSTER_STRATEGY = "cluster"
+SAMPLE_STRATEGY = "sample"
+
+_COLORS = {DDO: "#97c2fc", FDO: "#fb7e81", CLUSTER: "#c9c9c9"}
+_SHAPES = {DDO: "dot", FDO: "diamond", CLUSTER: "box"}
+# Distance in pixels between neighbouring nodes; positions are cached in pixels.
+_NODE_SPACING = 60
+# vis-network ships with the package and is inlined into the page, so the page works offline and
+# when embedded as an iframe srcdoc (show.py), where relative URLs do not resolve.
+_ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib", "vis-9.1.2")
+_assets = None
+
+_PAGE = """<html>
+<head>
+<meta charset="utf-8">
+<style type="text/css">
+{css}
+</style>
+<script type="text/javascript">
+{js}
+</script>
+<style type="text/css">
+#mynetwork {{ width: 100%; height: 750px; background-color: #ffffff; border: 1px solid lightgray; }}
+</style>
+</head>
+<body>
+<div id="mynetwork"></div>
+<p>{summary}</p>
+<script type="text/javascript">
+var nodes = new vis.DataSet();
+var edges = new vis.DataSet();
+{fragments}
+// Positions are computed on the server, so the browser does not run a physics simulation.
+var network = new vis.Network(document.getElementById("mynetwork"), {{nodes: nodes, edges: edges}}, {{
+    physics: false,
+    layout: {{improvedLayout: false}},
+    edges: {{arrows: "to", smooth: false}},
+    interaction: {{hideEdgesOnDrag: true, tooltipDelay: 200}}
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def _vis_assets():
+    # Returns the (css, js) of vis-network, read once per process.
+    global _assets
+    if _assets is None:
+        with open(os.path.join(_ASSET_DIR, "vis-network.css"), "r", encoding="utf-8") as file:
+            css = file.read()
+        with open(os.path.join(_ASSET_DIR, "vis-network.min.js"), "r", encoding="utf-8") as file:
+            js = file.read()
+        _assets = (css.replace("</style", "<\\/style"), js.replace("</script", "<\\/script"))
+    return _assets
+
+
+class Graph:
+    """
+    Nodes and directed edges of a relationship network, ready for layout and rendering.
+
+    Attributes:
+    nodes (dict): Node id mapped to its kind: DDO, FDO or CLUSTER.
+    edges (dict): (source, target) mapped to the metadata of the first relationship producing the edge.
+    sizes (dict): Number of hidden nodes folded into each CLUSTER node.
+    hidden (int): Number of nodes left out by sampling or clustering.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self.sizes = {}
+        self.hidden = 0
+
+    @classmethod
+    def from_relationships(cls, relationships, allowed=None):
+        """
+        Builds the graph of a RelationshipSet.
+
+        A relationship whose metadata names a function in "func" becomes the
+        edges inputs -> FDO -> outputs; other relationships link inputs to outputs directly.
+
+        Parameters:
+        relationships (RelationshipSet): The relationships.
+        allowed (set, optional): Only data objects in this set become nodes; None keeps all.
+
+        Returns:
+        Graph: The graph.
+        """
+        graph = cls()
+        for relationship in relationships:
+            metadata = relationship.metadata if isinstance(relationship.metadata, dict) else {}
+            sources = [doid for doid in relationship.from_ddo_doids or [] if allowed is None or doid in allowed]
+            targets = [doid for doid in relationship.to_ddo_doids or [] if allowed is None or doid in allowed]
+            for doid in sources + targets:
+                graph.nodes.setdefault(doid, DDO)
+            function = metadata.get("func")
+            if function and (sources or targets):
+                graph.nodes[function] = FDO
+                for doid in sources:
+                    graph.edges.setdefault((doid, function), metadata)
+                for doid in targets:
+                    graph.edges.setdefault((function, doid), metadata)
+            else:
+                for source in sources:
+                    for target in targets:
+                        graph.edges.setdefault((source, target), metadata)
+        return graph
+
+    def degrees(self):
+        degrees = dict.fromkeys(self.nodes, 0)
+        for source, target in self.edges:
+            degrees[source] += 1
+            degrees[target] += 1
+        return degrees
+
+    def reduce(self, max_nodes, strategy=CLUSTER_STRATEGY):
+        """
+        Shrinks the graph to about max_nodes nodes, keeping the best-connected ones.
+
+        With CLUSTER_STRATEGY every other node is folded into one cluster node
+        attached to its best-connected kept neighbour, and its edges are rerouted
+        to that cluster; with SAMPLE_STRATEGY the other nodes are dropped.
+
+        Parameters:
+        max_nodes (int): Maximum number of kept nodes, cluster nodes not included.
+        strategy (str, optional): CLUSTER_STRATEGY or SAMPLE_STRATEGY.
+
+        Returns:
+        Graph: A new graph, or this one if it is small enough.
+        """
+        if len(self.nodes) <= max_nodes:
+            return self
+        if strategy not in (CLUSTER_STRATEGY, SAMPLE_STRATEGY):
+            raise ValueError(f"Unknown reduction strategy {strategy!r}.")
+        degrees = self.degrees()
+        # 按度数保留节点，度数相同时按 doid 排序，保证多次渲染结果一致
+        kept = set(sorted(self.nodes, key=lambda node: (-degrees[node], node))[:max_nodes])
+        reduced = Graph()
+        reduced.nodes = {node: kind for node, kind in self.nodes.items() if node in kept}
+        reduced.hidden = len(self.nodes) - len(kept)
+        if strategy == SAMPLE_STRATEGY:
+            reduced.edges = {edge: metadata for edge, metadata in self.edges.items()
+                             if edge[0] in kept and edge[1] in kept}
+            return reduced
+
+        hubs = {}
+        for source, target in self.edges:
+            for node, neighbour in ((source, target), (target, source)):
+                if node not in kept and neighbour in kept:
+                    best = hubs.get(node)
+                    if best is None or (-degrees[neighbour], neighbour) < (-degrees[best], best):
+                        hubs[node] = neighbour
+
+        def representative(node):
+            if node in kept:
+                return node
+            return f"{CLUSTER}:{hubs.get(node, '')}"
+
+        for node in self.nodes:
+            if node not in kept:
+                cluster = representative(node)
+                reduced.nodes[cluster] = CLUSTER
+                reduced.sizes[cluster] = reduced.sizes.get(cluster, 0) + 1
+        for cluster in reduced.sizes:
+            hub = cluster[len(CLUSTER) + 1:]
+            if hub:
+                reduced.edges.setdefault((hub, cluster), {})
+        for (source, target), metadata in self.edges.items():
+            source, target = representative(source), representative(target)
+            if source != target:
+                reduced.edges.setdefault((source, target), metadata)
+        return reduced
+
+
+class NetworkRenderer:
+    """
+    Renders the relationship network of a repository as a vis-network HTML page.
+
+    Rendering scales with the displayed graph rather than the repository:
+    neighbourhood views read only the relationship_edges rows within `hops`
+    of a doid, large graphs are clustered or sampled down to `max_nodes`, node
+    positions are computed on the server once and cached in `cache_dir`, and
+    the page is assembled from fragments of which only the changed ones are
+    serialized again. The file is only rewritten when its content changed.
+    On SQL repositories a render whose relationships and displayed metadata are
+    unchanged since the last render of the same page returns without reading
+    the graph at all.
+
+    Attributes:
+    repo (DigitalObjectRepository): The repository whose relationships are drawn.
+    cache_dir (str): Directory of the layout cache, or None to keep it in memory only.
+    max_nodes (int): Maximum number of nodes drawn before the graph is reduced.
+    """
+    def __init__(self, repo, cache_dir=None, max_nodes=1000, fragments=64, url=None):
+        """
+        Initializes a NetworkRenderer.
+
+        Parameters:
+        repo (DigitalObjectRepository): The repository whose relationships are drawn.
+        cache_dir (str, optional): Directory where node positions are kept between processes.
+        max_nodes (int, optional): Maximum number of nodes drawn before the graph is reduced.
+        fragments (int, optional): Number of fragments the page is split into for incremental rendering.
+        url (str, optional): The URL of the repository, defaults to the repository's own.
+        """
+        self.repo = repo
+        self.url = url or repo.repo_db_url
+        self.cache_dir = cache_dir
+        self.max_nodes = max_nodes
+        self.fragments = fragments
+        self._positions = self._read_layout()
+        self._fragment_cache = {}
+        self._page_digest = {}
+        # path -> (options, change marker, nodes shown with metadata, counts) of the last render.
+        self._rendered = {}
+
+    # graph
+
+    def graph(self, doid=None, hops=2, direction=None):
+        """
+        Reads the graph to draw: the whole network, or the neighbourhood of a doid.
+
+        Parameters:
+        doid (str, optional): Centre of a neighbourhood view; None for the whole network.
+        hops (int, optional): Radius of the neighbourhood in relationship edges.
+        direction (str, optional): lineage.UPSTREAM or lineage.DOWNSTREAM to follow one direction only.
+
+        Returns:
+        Graph: The graph, not yet reduced.
+        """
+        if doid is None:
+            return Graph.from_relationships(self.repo.relationships(self.url))
+        if is_sql_url(self.url):
+            with self.repo.get_engine(self.url).connect() as connection:
+                def edge_rows(doids, statement):
+                    rows = []
+                    for chunk in chunked(doids, 500):
+                        rows.extend(connection.execute(statement, {"doids": chunk}).fetchall())
+                    return rows
+                nodes, relationship_doids = self._neighbourhood(edge_rows, doid, hops, direction)
+                relationships = RelationshipSet()
+                for chunk in chunked(relationship_doids, 500):
+                    for row in connection.execute(select_relationships_in, {"doids": chunk}):
+                        relationships.add(*row)
+        else:
+            # File stores have no edge index, so the neighbourhood is searched in memory.
+            relationships = self.repo.relationships(self.url)
+            by_source, by_target = {}, {}
+            for relationship in relationships:
+                for source in relationship.from_ddo_doids or []:
+                    for target in relationship.to_ddo_doids or []:
+                        row = (source, target, relationship.doid)
+                        by_source.setdefault(source, []).append(row)
+                        by_target.setdefault(target, []).append(row)
+
+            def edge_rows(doids, statement):
+                index = by_source if statement is select_edge_rows_from else by_target
+                return [row for doid in doids for row in index.get(doid, ())]
+            nodes, relationship_doids = self._neighbourhood(edge_rows, doid, hops, direction)
+            relationships = RelationshipSet.from_relationships(
+                relationship for relationship in relationships if relationship.doid in relationship_doids)
+        graph = Graph.from_relationships(relationships, allowed=nodes)
+        graph.nodes.setdefault(doid, DDO)
+        return graph
+
+    @staticmethod
+    def _neighbourhood(edge_rows, doid, hops, direction):
+        # Breadth-first search over relationship edges; returns the reached doids and the relationships used.
+        statements = []
+        if direction in (None, DOWNSTREAM):
+            statements.append(select_edge_rows_from)
+        if direction in (None, UPSTREAM):
+            statements.append(select_edge_rows_to)
+        nodes = {doid}
+        relationship_doids = set()
+        frontier = [doid]
+        for _ in range(hops):
+            next_frontier = []
+            for statement in statements:
+                for source, target, relationship_doid in edge_rows(frontier, statement):
+                    relationship_doids.add(relationship_doid)
+                    for node in (source, target):
+                        if node not in nodes:
+                            nodes.add(node)
+                            next_frontier.append(node)
+            frontier = next_frontier
+            if not frontier:
+                break
+        return nodes, relationship_doids
+
+    # layout
+
+    def _layout_path(self):
+        return os.path.join(self.cache_dir, "layout.json") if self.cache_dir else None
+
+    def _read_layout(self):
+        path = self._layout_path()
+        if path is None or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return {node: tuple(position) for node, position in json.load(file).items()}
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable layout cache {path}: {e}")
+            return {}
+
+    def _write_layout(self):
+        path = self._layout_path()
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self._positions, file)
+        os.replace(tmp_path, path)
+
+    def layout(self, graph):
+        """
+        Returns node positions, computing them only for nodes without a cached position.
+
+        Cached nodes stay fixed while the new ones are placed by a spring layout,
+        so the drawing stays stable as the repository grows.
+
+        Parameters:
+        graph (Graph): The graph to lay out.
+
+        Returns:
+        tuple: (dict of node -> (x, y) in pixels, number of newly placed nodes).
+        """
+        new_nodes = [node for node in graph.nodes if node not in self._positions]
+        if new_nodes:
+            try:
+                import networkx as nx
+            except ImportError:
+                raise ImportError("Laying out relationship networks requires networkx.")
+            network = nx.Graph()
+            network.add_nodes_from(graph.nodes)
+            network.add_edges_from(graph.edges)
+            fixed = [node for node in graph.nodes if node in self._positions]
+            if fixed:
+                placed = nx.spring_layout(network, pos={node: self._positions[node] for node in fixed},
+                                          fixed=fixed, k=_NODE_SPACING, seed=0)
+            else:
+                placed = nx.spring_layout(network, scale=_NODE_SPACING * math.sqrt(len(graph.nodes)), seed=0)
+            for node in new_nodes:
+                self._positions[node] = tuple(round(float(value), 1) for value in placed[node])
+            self._write_layout()
+        return {node: self._positions[node] for node in graph.nodes}, len(new_nodes)
+
+    # change tracking
+
+    def _relationships_marker(self, connection):
+        return tuple(connection.execute(select_relationships_marker).fetchone())
+
+    @staticmethod
+    def _etags(connection, doids):
+        etags = {}
+        for chunk in chunked(sorted(doids), 500):
+            etags.update(connection.execute(select_etags_in, {"doids": chunk}).fetchall())
+        return etags
+
+    def _marker(self, wanted):
+        # What a render depends on: the relationships, and the etags of the objects shown with metadata.
+        # None for file stores, which have no cheap way to tell; they are always rendered again.
+        if not is_sql_url(self.url):
+            return None
+        with self.repo.get_engine(self.url).connect() as connection:
+            return self._relationships_marker(connection), self._etags(connection, wanted)
+
+    # rendering
+
+    def _fragment(self, node):
+        return zlib.crc32(node.encode("utf-8")) % self.fragments
+
+    @staticmethod
+    def _node_item(node, kind, position, graph, metadata, show_metadata):
+        x, y = position
+        label = f"{graph.sizes[node]} more" if kind == CLUSTER else node[:12]
+        item = {"id": node, "label": label, "x": x, "y": y,
+                "color": _COLORS[kind], "shape": _SHAPES[kind]}
+        if kind != CLUSTER and show_metadata.get(kind) and metadata.get(node) is not None:
+            item["title"] = json.dumps(metadata[node], ensure_ascii=False, indent=1, default=str)
+        else:
+            item["title"] = node
+        return item
+
+    @staticmethod
+    def _edge_item(source, target, metadata, show_rel_metadata):
+        item = {"from": source, "to": target}
+        if show_rel_metadata and metadata:
+            item["title"] = json.dumps(metadata, ensure_ascii=False, indent=1, default=str)
+            if metadata.get("description"):
+                item["label"] = str(metadata["description"])
+        return item
+
+    def render(self, path="network.html", doid=None, hops=2, direction=None, strategy=CLUSTER_STRATEGY,
+               show_ddo_metadata=False, show_fdo_metadata=True, show_rel_metadata=False):
+        """
+        Renders the network, or the neighbourhood of a doid, to an HTML page.
+
+        Parameters:
+        path (str, optional): The HTML file to write.
+        doid (str, optional): Centre of a neighbourhood view; None for the whole network.
+        hops (int, optional): Radius of the neighbourhood in relationship edges.
+        direction (str, optional): lineage.UPSTREAM or lineage.DOWNSTREAM to follow one direction only.
+        strategy (str, optional): CLUSTER_STRATEGY or SAMPLE_STRATEGY for graphs over max_nodes nodes.
+        show_ddo_metadata (bool, optional): Show the metadata of data objects as tooltips.
+        show_fdo_metadata (bool, optional): Show the metadata of function objects as tooltips.
+        show_rel_metadata (bool, optional): Label edges with the relationship descriptions.
+
+        Returns:
+        dict: Counts of drawn nodes and edges, hidden nodes, newly placed nodes and
+        re-serialized fragments, and whether the file was written.
+        """
+        options = (doid, hops, direction, strategy, show_ddo_metadata, show_fdo_metadata,
+                   show_rel_metadata, self.max_nodes, self.fragments)
+        previous = self._rendered.get(path)
+        if previous is not None and previous[0] == options and os.path.exists(path):
+            marker = self._marker(previous[2])
+            if marker is not None and marker == previous[1]:
+                logging.debug(f"{path} is up to date.")
+                return dict(previous[3], placed=0, fragments=0, written=False)
+
+        # The marker is read before the graph, so a write made during the render is seen by the next one.
+        relationships_marker = None
+        if is_sql_url(self.url):
+            with self.repo.get_engine(self.url).connect() as connection:
+                relationships_marker = self._relationships_marker(connection)
+        graph = self.graph(doid, hops, direction).reduce(self.max_nodes, strategy)
+        positions, placed = self.layout(graph)
+        show_metadata = {DDO: show_ddo_metadata, FDO: show_fdo_metadata}
+        wanted = [node for node, kind in graph.nodes.items() if show_metadata.get(kind)]
+        etags = None
+        if relationships_marker is not None:
+            with self.repo.get_engine(self.url).connect() as connection:
+                etags = self._etags(connection, wanted)
+        metadata = self.repo.load_metadata_many(wanted, url=self.url) if wanted else {}
+
+        buckets = [([], []) for _ in range(self.fragments)]
+        for node, kind in graph.nodes.items():
+            buckets[self._fragment(node)][0].append(
+                self._node_item(node, kind, positions[node], graph, metadata, show_metadata))
+        for (source, target), edge_metadata in graph.edges.items():
+            buckets[self._fragment(source)][1].append(
+                self._edge_item(source, target, edge_metadata, show_rel_metadata))
+
+        rendered = 0
+        parts = []
+        for index, (node_items, edge_items) in enumerate(buckets):
+            if not node_items and not edge_items:
+                continue
+            key = (path, index)
+            state = (node_items, edge_items)
+            cached = self._fragment_cache.get(key)
+            if cached is None or cached[0] != state:
+                # "</" is escaped so that metadata cannot close the script element.
+                text = (f"nodes.add({json.dumps(node_items, ensure_ascii=False)});\n"
+                        f"edges.add({json.dumps(edge_items, ensure_ascii=False)});").replace("</", "<\\/")
+                cached = self._fragment_cache[key] = (state, text)
+                rendered += 1
+            parts.append(cached[1])
+
+        summary = f"{len(graph.nodes)} nodes, {len(graph.edges)} edges"
+        if graph.hidden:
+            summary += f"; {graph.hidden} nodes {'clustered' if strategy == CLUSTER_STRATEGY else 'not shown'}"
+        fragments = "\n".join(parts)
+        # The inlined vis-network assets never change, so only the variable part is hashed.
+        digest = hashlib.sha256(f"{summary}\n{fragments}".encode("utf-8")).hexdigest()
+        written = digest != self._page_digest.get(path) or not os.path.exists(path)
+        if written:
+            css, js = _vis_assets()
+            page = _PAGE.format(css=css, js=js, summary=summary, fragments=fragments)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(page)
+            os.replace(tmp_path, path)
+            self._page_digest[path] = digest
+        logging.debug(f"Rendered {summary} to {path}: {placed} nodes placed, {rendered} fragments serialized.")
+        counts = {"nodes": len(graph.nodes), "edges": len(graph.edges), "hidden": graph.hidden}
+        if relationships_marker is not None:
+            self._rendered[path] = (options, (relationships_marker, etags), wanted, counts)
+        return dict(counts, placed=placed, fragments=rendered, written=written)
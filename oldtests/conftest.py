@@ -0,0 +1,6 @@
+import pytest
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'repo.db'}"
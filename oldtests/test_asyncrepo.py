@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+import pytest
+
+from ddolib import DigitalObject, DigitalObjectRepository
+
+pytest.importorskip("aiosqlite")
+
+
+def test_async_crud_round_trip(db_url):
+    from ddolib import AsyncDigitalObjectRepository
+
+    async def scenario():
+        async with AsyncDigitalObjectRepository(db_url) as repo:
+            assert await repo.save(DigitalObject({"a": 1}, {"m": 1}, "x"))
+            assert (await repo.load("x")).data == {"a": 1}
+            assert await repo.update("x", DigitalObject({"a": 2}, {"m": 1}))
+            result = await repo.save_many([DigitalObject(i, {}, f"d{i}") for i in range(5)])
+            assert len(result.succeeded) == 5
+            loaded = await repo.load_many(["x", "d3", "missing"])
+            assert [do.data if do else None for do in loaded] == [{"a": 2}, 3, None]
+            assert await repo.delete("x")
+            assert not await repo.load("x")
+    asyncio.run(scenario())
+
+
+def test_repository_built_outside_the_event_loop(db_url):
+    from ddolib import AsyncDigitalObjectRepository
+    repo = AsyncDigitalObjectRepository(db_url, max_concurrency=2)
+
+    async def scenario():
+        async with repo:
+            assert all(await asyncio.gather(*(repo.save(DigitalObject(i, {}, f"d{i}")) for i in range(6))))
+            assert [do.data for do in await repo.load_many([f"d{i}" for i in range(6)])] == list(range(6))
+    asyncio.run(scenario())
+
+
+def test_writes_invalidate_the_cache(db_url):
+    from ddolib import AsyncDigitalObjectRepository
+    other = DigitalObjectRepository(db_url)
+
+    async def scenario():
+        async with AsyncDigitalObjectRepository(db_url, cache=True) as repo:
+            assert await repo.save_many([DigitalObject("old", {}, "x"), DigitalObject("old", {}, "y")])
+            assert (await repo.load("x")).data == "old"
+            assert [do.data for do in await repo.load_many(["y"])] == ["old"]
+            # Deleted behind the async repository's back, then written again through it.
+            assert other.delete_many(["x", "y"]).succeeded == ["x", "y"]
+            assert await repo.save(DigitalObject("new", {}, "x"))
+            result = await repo.save_many([DigitalObject("new", {}, "y"), DigitalObject("dup", {}, "x")])
+            assert result.succeeded == ["y"] and [doid for doid, _ in result.failed] == ["x"]
+            assert (await repo.load("x")).data == "new"
+            assert (await repo.load("y")).data == "new"
+    asyncio.run(scenario())
+
+
+def test_failed_writes_and_if_match(db_url, caplog):
+    from ddolib import AsyncDigitalObjectRepository
+
+    async def scenario():
+        async with AsyncDigitalObjectRepository(db_url, cache=True) as repo:
+            assert await repo.save(DigitalObject(1, {}, "x"))
+            with caplog.at_level(logging.CRITICAL):
+                assert not await repo.save(DigitalObject(2, {}, "x"))
+                assert not await repo.save(DigitalObject(2, {}))
+                assert not await repo.update("missing", DigitalObject(2, {}))
+                assert not await repo.delete("missing")
+            assert (await repo.load("x")).data == 1
+            etag = DigitalObjectRepository(db_url).get_etag("x")
+            with caplog.at_level(logging.CRITICAL):
+                assert not await repo.update("x", DigitalObject(2, {}), if_match="stale")
+            assert (await repo.load("x")).data == 1
+            assert await repo.update("x", DigitalObject(3, {}), if_match=etag)
+            assert (await repo.load("x")).data == 3
+    asyncio.run(scenario())
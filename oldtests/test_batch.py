@@ -0,0 +1,44 @@
+import logging
+
+from sqlalchemy import update
+
+from ddolib import DigitalObject, DigitalObjectRepository
+from ddolib.schema import digital_objects_table
+
+
+def test_save_many_reports_each_failed_item(db_url, caplog):
+    repo = DigitalObjectRepository(db_url)
+    assert repo.save(DigitalObject(0, {}, "d1"))
+    # d1 already exists, the second-to-last object has no doid and a generator cannot be serialized.
+    dos = [DigitalObject(i, {}, f"d{i}") for i in range(4)]
+    dos += [DigitalObject(9, {}), DigitalObject((x for x in "ab"), {}, "f")]
+    with caplog.at_level(logging.CRITICAL):
+        result = repo.save_many(dos, batch_size=3)
+    assert not result
+    assert result.succeeded == ["d0", "d2", "d3"]
+    assert [doid for doid, _ in result.failed] == ["d1", None, "f"]
+    # The rows of a batch that failed as a whole are still written when they are valid.
+    assert [do.data for do in repo.load_many(["d0", "d1", "d2", "d3"])] == [0, 0, 2, 3]
+
+
+def test_load_many_keeps_input_order_and_marks_missing(db_url, caplog):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject(i, {"i": i}, f"d{i}") for i in range(5)])
+    with repo.get_engine().begin() as connection:
+        connection.execute(update(digital_objects_table).where(digital_objects_table.c.doid == "d3").values(
+            data=b"\xff", codec="json"))
+    with caplog.at_level(logging.CRITICAL):
+        loaded = repo.load_many(["d4", "missing", "d0", "d3", "d4"], batch_size=2)
+    assert [do.data if do else None for do in loaded] == [4, None, 0, None, 4]
+    batch = repo.load_many(["d1", "missing", "d2"], columnar=True)
+    assert list(batch.doids) == ["d1", "d2"]
+
+
+def test_delete_many_reports_missing_doids(db_url, caplog):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject(i, {}, f"d{i}") for i in range(3)])
+    with caplog.at_level(logging.CRITICAL):
+        result = repo.delete_many(["d0", "missing", "d2"], batch_size=2)
+    assert result.succeeded == ["d0", "d2"]
+    assert [doid for doid, _ in result.failed] == ["missing"]
+    assert [do.data if do else None for do in repo.load_many(["d0", "d1", "d2"])] == [None, 1, None]
@@ -0,0 +1,81 @@
+import logging
+
+from sqlalchemy import event
+
+from ddolib import DigitalObject, DigitalObjectRepository
+from ddolib.cache import ObjectCache
+
+
+def test_loads_are_served_from_the_cache(db_url):
+    repo = DigitalObjectRepository(db_url, cache=True)
+    repo.save_many([DigitalObject(i, {"i": i}, f"d{i}") for i in range(3)])
+    assert repo.load("d0").data == 0
+    statements = []
+    event.listen(repo.get_engine(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert repo.load("d0").data == 0
+    assert [do.data for do in repo.load_many(["d0", "d1"])] == [0, 1]
+    assert repo.load_metadata("d1") == {"i": 1}
+    assert len(statements) == 1
+    stats = repo.cache.stats()
+    assert stats["hits"] == 3 and stats["entries"] == 2
+
+
+def test_eviction_by_count_bytes_and_ttl(monkeypatch):
+    cache = ObjectCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 10)
+    # "b" was the least recently used entry.
+    assert "b" not in cache and "a" in cache and "c" in cache
+    cache.put("d", 4, 95)
+    assert list(cache._entries) == ["d"] and cache.stats()["bytes"] == 95
+    cache.put("huge", 5, 101)
+    assert "huge" not in cache
+    assert cache.evictions == 3
+
+    now = [1000.0]
+    monkeypatch.setattr("ddolib.cache.time.monotonic", lambda: now[0])
+    cache = ObjectCache(ttl=5)
+    cache.put("a", 1, 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_writes_invalidate_cached_objects(db_url, caplog):
+    repo = DigitalObjectRepository(db_url, cache=True)
+    other = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject("old", {}, "x"))
+    assert repo.load("x").data == "old"
+    assert repo.update("x", DigitalObject("new", {}))
+    assert repo.load("x").data == "new"
+    assert repo.delete("x")
+    with caplog.at_level(logging.CRITICAL):
+        assert not repo.load("x")
+
+    repo.save_many([DigitalObject("old", {}, "y"), DigitalObject("old", {}, "z")])
+    assert [do.data for do in repo.load_many(["y", "z"])] == ["old", "old"]
+    other.delete_many(["y", "z"])
+    # "w" already exists, so the batch is retried row by row.
+    other.save(DigitalObject(0, {}, "w"))
+    with caplog.at_level(logging.CRITICAL):
+        result = repo.save_many([DigitalObject("new", {}, "y"), DigitalObject(1, {}, "w"),
+                                 DigitalObject("new", {}, "z")])
+    assert result.succeeded == ["y", "z"]
+    assert [do.data for do in repo.load_many(["y", "z"])] == ["new", "new"]
+
+
+def test_rolled_back_writes_leave_no_stale_entries(db_url, caplog):
+    repo = DigitalObjectRepository(db_url, cache=True)
+    repo.save(DigitalObject(1, {}, "x"))
+    try:
+        with repo.transaction():
+            repo.update("x", DigitalObject(2, {}))
+            assert repo.load("x").data == 2
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert repo.load("x").data == 1
@@ -0,0 +1,69 @@
+import pickle
+
+import dill
+import pytest
+
+from ddolib import (DataDigitalObject, DigitalObject, DigitalObjectBatch, DigitalObjectRepository, Relationship,
+                    RelationshipSet)
+from ddolib.batch import StringColumn
+
+
+def test_string_column_indexing_and_iteration():
+    column = StringColumn(["a", "", "ünïcode", "d" * 40])
+    assert len(column) == 4
+    assert column[2] == "ünïcode" and column[1] == "" and column[-1] == "d" * 40
+    assert list(column) == ["a", "", "ünïcode", "d" * 40]
+    with pytest.raises(IndexError):
+        column[4]
+
+
+def test_digital_object_batch_columns(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject(i, {"i": i}, f"d{i}") for i in range(3)])
+    batch = repo.load_many(["d2", "d0"], columnar=True)
+    assert isinstance(batch, DigitalObjectBatch) and len(batch) == 2
+    assert list(batch.doids) == ["d2", "d0"]
+    assert batch.metadata == [{"i": 2}, {"i": 0}] and batch.data == [2, 0]
+    assert list(batch) == [("d2", {"i": 2}, 2), ("d0", {"i": 0}, 0)]
+    assert (batch[1].doid, batch[1].data) == ("d0", 0)
+    assert [do.doid for do in batch.objects()] == ["d2", "d0"]
+    rebuilt = DigitalObjectBatch.from_objects([DigitalObject(1, {}, "x"), None])
+    assert list(rebuilt) == [("x", {}, 1)]
+
+
+def test_relationship_set_interns_nodes():
+    relationships = RelationshipSet.from_relationships([
+        Relationship(["a", "b"], ["c"], {"f": 1}, persist=False, doid="r1"),
+        Relationship(["c"], ["d", "a"], None, persist=False, doid="r2"),
+    ])
+    assert len(relationships) == 2
+    assert relationships.nodes == ["a", "b", "c", "d"]
+    sources, targets = relationships.edge_arrays()
+    assert list(sources) == [0, 1, 2, 2] and list(targets) == [2, 2, 3, 0]
+    assert relationships.edges() == [("a", "c"), ("b", "c"), ("c", "d"), ("c", "a")]
+    last = relationships[-1]
+    assert (last.doid, last.from_ddo_doids, last.to_ddo_doids, last.metadata) == ("r2", ["c"], ["d", "a"], None)
+    assert [relationship.doid for relationship in relationships] == ["r1", "r2"]
+
+
+@pytest.mark.parametrize("dumps, loads", [(pickle.dumps, pickle.loads), (dill.dumps, dill.loads)])
+def test_slotted_objects_pickle(dumps, loads):
+    for do in (DigitalObject({"a": 1}, {"m": 1}, "x"), DataDigitalObject([1, 2], {}, doid="y")):
+        assert not hasattr(do, "__dict__")
+        copy = loads(dumps(do))
+        assert type(copy) is type(do)
+        assert (copy.data, copy.metadata, copy.doid) == (do.data, do.metadata, do.doid)
+    relationship = loads(dumps(Relationship(["a"], ["b"], {"f": 1}, persist=False)))
+    assert (relationship.from_ddo_doids, relationship.to_ddo_doids, relationship.metadata) == (["a"], ["b"], {"f": 1})
+    batch = loads(dumps(DigitalObjectBatch.from_objects([DigitalObject(1, {}, "x")])))
+    assert list(batch) == [("x", {}, 1)]
+    relationships = RelationshipSet()
+    relationships.add("r", ["a"], ["b"])
+    assert loads(dumps(relationships)).edges() == [("a", "b")]
+
+
+def test_pickles_written_before_slots_still_load():
+    # Instances pickled while DigitalObject still had a __dict__ carry it as the state.
+    do = DigitalObject.__new__(DigitalObject)
+    do.__setstate__({"_data": 1, "_metadata": {"m": 1}, "_doid": "old"})
+    assert (do.data, do.metadata, do.doid) == (1, {"m": 1}, "old")
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+from sqlalchemy import select
+
+from ddolib import DigitalObject, DigitalObjectRepository, compression
+from ddolib.schema import digital_objects_table
+
+
+def stored_rows(repo):
+    with repo.get_engine().connect() as connection:
+        return {doid: (compressor, len(data)) for doid, compressor, data in connection.execute(select(
+            digital_objects_table.c.doid, digital_objects_table.c.compression, digital_objects_table.c.data))}
+
+
+@pytest.mark.parametrize("name", ["zlib", "lzma"])
+def test_payloads_over_the_threshold_are_compressed(db_url, name):
+    repo = DigitalObjectRepository(db_url, compression=name, compression_threshold=100)
+    large = {"text": "abc" * 1000}
+    repo.save_many([DigitalObject(large, {}, "large"), DigitalObject({"text": "abc"}, {}, "small"),
+                    DigitalObject(os.urandom(500), {}, "random")])
+    rows = stored_rows(repo)
+    assert rows["large"][0] == name and rows["large"][1] < 3000
+    assert rows["small"][0] is None
+    # Incompressible payloads are kept raw.
+    assert rows["random"] == (None, 500)
+    fresh = DigitalObjectRepository(db_url)
+    assert fresh.load("large").data == large
+    assert fresh.load("small").data == {"text": "abc"}
+    stats = repo.compression_stats.as_dict()
+    assert stats["compressed"] == 1 and stats["skipped"] == 2 and stats["ratio"] < 1
+
+
+def test_compress_round_trip_and_unknown_compressor():
+    payload = b"x" * 5000
+    name, packed = compression.compress(payload, "zlib", 4096)
+    assert name == "zlib" and compression.decompress(packed, name) == payload
+    assert compression.compress(payload, "zlib", 5001) == (None, payload)
+    assert compression.decompress(payload, None) == payload
+    with pytest.raises(ValueError):
+        compression.compress(payload, "nope", 0)
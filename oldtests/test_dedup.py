@@ -0,0 +1,81 @@
+from sqlalchemy import event, func, select
+
+from ddolib import DigitalObject, DigitalObjectRepository
+from ddolib.schema import blobs_table, object_chunks_table
+
+PAYLOAD = b"x" * 1000
+
+
+def blob_refcounts(repo):
+    with repo.get_engine().connect() as connection:
+        return dict(connection.execute(select(blobs_table.c.hash, blobs_table.c.refcount)).fetchall())
+
+
+def test_identical_payloads_share_one_blob(db_url):
+    repo = DigitalObjectRepository(db_url, dedup=True)
+    assert repo.save(DigitalObject(PAYLOAD, {}, "a"))
+    assert repo.save(DigitalObject(PAYLOAD, {"other": True}, "b"))
+    assert list(blob_refcounts(repo).values()) == [2]
+    assert repo.delete("a")
+    assert list(blob_refcounts(repo).values()) == [1]
+    assert repo.load("b").data == PAYLOAD
+    assert repo.delete("b")
+    assert blob_refcounts(repo) == {}
+
+
+def test_non_dedup_delete_releases_shared_blob(db_url):
+    writer = DigitalObjectRepository(db_url, dedup=True)
+    writer.save_many([DigitalObject(PAYLOAD, {}, "a"), DigitalObject(PAYLOAD, {}, "b")])
+    plain = DigitalObjectRepository(db_url, engines=writer.engines)
+    assert plain.delete("a")
+    assert list(blob_refcounts(plain).values()) == [1]
+    assert plain.delete_many(["b"]).succeeded == ["b"]
+    assert blob_refcounts(plain) == {}
+
+
+def test_non_dedup_update_releases_shared_blob(db_url):
+    writer = DigitalObjectRepository(db_url, dedup=True)
+    assert writer.save(DigitalObject(PAYLOAD, {}, "a"))
+    plain = DigitalObjectRepository(db_url, engines=writer.engines)
+    assert plain.update("a", DigitalObject(b"new", {}))
+    assert blob_refcounts(plain) == {}
+    assert plain.load("a").data == b"new"
+
+
+def test_collect_garbage_recounts_references(db_url):
+    repo = DigitalObjectRepository(db_url, dedup=True)
+    assert repo.save(DigitalObject(PAYLOAD, {}, "a"))
+    with repo.get_engine().begin() as connection:
+        # Simulate an interrupted writer that left the refcount too high.
+        connection.execute(blobs_table.update().values(refcount=5))
+        connection.execute(blobs_table.insert().values(hash="sha256-orphan", data=b"o", refcount=1))
+    assert repo.collect_garbage() == 1
+    assert list(blob_refcounts(repo).values()) == [1]
+    assert repo.load("a").data == PAYLOAD
+
+
+def test_inline_rows_update_and_delete_in_one_statement(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject(PAYLOAD, {}, "a"))
+    statements = []
+    event.listen(repo.get_engine(), "before_cursor_execute",
+                 lambda connection, cursor, statement, *args: statements.append(statement.split()[0]))
+    assert repo.update("a", DigitalObject(b"y", {}))
+    assert repo.delete("a")
+    assert statements == ["UPDATE", "DELETE"]
+
+
+def test_update_of_shared_and_streamed_rows_cleans_up(db_url):
+    writer = DigitalObjectRepository(db_url, dedup=True)
+    writer.save_many([DigitalObject(PAYLOAD, {}, "a"), DigitalObject(PAYLOAD, {}, "b")])
+    writer.save_stream("s", [b"x" * 10], chunk_size=4)
+    repo = DigitalObjectRepository(db_url)
+    etag = repo.get_etag("a")
+    assert not repo.update("a", DigitalObject(b"y", {}), if_match="stale")
+    assert repo.update("a", DigitalObject(b"y", {}), if_match=etag)
+    assert list(blob_refcounts(repo).values()) == [1]
+    assert repo.update("s", DigitalObject(b"z", {}))
+    assert repo.load("s").data == b"z"
+    assert repo.open_stream("s").read() == b"z"
+    with repo.get_engine().connect() as connection:
+        assert connection.execute(select(func.count()).select_from(object_chunks_table)).scalar() == 0
@@ -0,0 +1,39 @@
+from ddolib import DigitalObject, DigitalObjectRepository, DDOInstance
+from ddolib.engine import EngineRegistry, default_engines, sqlite_pragmas
+
+
+def test_repository_reuses_one_engine_per_url(db_url):
+    repo = DigitalObjectRepository(db_url)
+    assert repo.get_engine() is repo.get_engine(db_url)
+    assert len(repo.engines) == 1
+    repo.close()
+    assert len(repo.engines) == 0
+
+
+def test_instances_share_the_default_pool(db_url):
+    first = DDOInstance(repo_url=db_url)
+    second = DDOInstance(repo_url=db_url)
+    assert first.repo.engines is default_engines
+    assert first.repo.get_engine() is second.repo.get_engine()
+    first.close()
+    # A shared registry belongs to no single instance, so closing one leaves the pool to the other.
+    assert db_url in default_engines
+    assert second.repo.save(DigitalObject(1, {}, "a"))
+    default_engines.dispose(db_url)
+
+
+def test_explicit_registry_is_used(db_url):
+    engines = EngineRegistry(pool_size=2)
+    instance = DDOInstance(repo_url=db_url, engines=engines)
+    assert instance.repo.get_engine() is engines.get(db_url)
+    assert db_url not in default_engines
+    engines.close()
+
+
+def test_sqlite_profile_is_applied_on_connect(db_url):
+    repo = DigitalObjectRepository(db_url, sqlite_profile="fast")
+    with repo.get_engine().connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+    assert sqlite_pragmas({"cache_size": -1000}) == {"cache_size": -1000}
+    assert sqlite_pragmas(None) == {}
@@ -0,0 +1,81 @@
+import hashlib
+import logging
+import mmap
+import os
+
+import dill
+
+from ddolib import DigitalObject, DigitalObjectRepository, serialization
+from ddolib.filestore import FileObjectStore
+
+
+def test_objects_live_in_sharded_directories(tmp_path):
+    root = str(tmp_path / "store")
+    repo = DigitalObjectRepository(root)
+    assert repo.save(DigitalObject({"a": 1}, {"m": 1}, "dir/name"))
+    digest = hashlib.sha1(b"dir/name").hexdigest()
+    path = os.path.join(root, "objects", digest[:2], digest[2:4], "dir%2Fname")
+    assert os.path.isfile(path)
+    assert repo.load("dir/name").data == {"a": 1}
+    assert repo.load_metadata("dir/name") == {"m": 1}
+    # No temporary files are left behind by the atomic writes.
+    assert os.listdir(os.path.dirname(path)) == ["dir%2Fname"]
+
+
+def test_create_update_delete_and_index(tmp_path, caplog):
+    root = str(tmp_path / "store")
+    repo = DigitalObjectRepository(root)
+    repo.save_many([DigitalObject(i, {}, f"d{i}") for i in range(4)])
+    with caplog.at_level(logging.CRITICAL):
+        assert not repo.save(DigitalObject(9, {}, "d0"))
+    assert repo.update("d1", DigitalObject("new", {}))
+    assert repo.load("d1").data == "new"
+    assert repo.delete("d2")
+    store = FileObjectStore(root)
+    assert store.doids() == ["d0", "d1", "d3"]
+    store.compact_index()
+    with open(os.path.join(root, "index.log"), encoding="utf-8") as file:
+        assert file.read().split() == ["+d0", "+d1", "+d3"]
+
+
+def test_large_files_are_read_through_mmap(tmp_path, monkeypatch):
+    store = FileObjectStore(str(tmp_path / "store"), mmap_threshold=1000, fsync=False)
+    for doid, value in (("large", list(range(1000))), ("small", [1])):
+        codec, payload = serialization.encode(value)
+        store.write(doid, {}, codec, None, payload)
+    mapped = []
+    real_mmap = mmap.mmap
+
+    def spy(*args, **kwargs):
+        mapped.append(args)
+        return real_mmap(*args, **kwargs)
+    monkeypatch.setattr("ddolib.filestore.mmap.mmap", spy)
+
+    def decode(view, codec, compression):
+        return serialization.decode(bytes(view), codec)
+    assert store.read("large", decode) == (list(range(1000)), {})
+    assert len(mapped) == 1
+    assert store.read("small", decode) == ([1], {})
+    assert len(mapped) == 1
+    assert store.read("missing", decode) is None
+
+
+def test_bytes_payloads_are_streamed_from_the_file(tmp_path):
+    repo = DigitalObjectRepository(str(tmp_path / "store"))
+    payload = bytes(range(256)) * 10
+    assert repo.save(DigitalObject(payload, {}, "raw"))
+    assert repo.read_range("raw", 300, 20) == payload[300:320]
+    assert repo.is_byte_stream("raw")
+    assert repo.save(DigitalObject({"a": 1}, {}, "json"))
+    assert repo.open_stream("json") is None
+
+
+def test_legacy_dill_files_are_still_read(tmp_path):
+    root = tmp_path / "store"
+    root.mkdir()
+    with open(root / "old.dill", "wb") as file:
+        dill.dump(DigitalObject({"a": 1}, {"m": 1}, "old"), file)
+    repo = DigitalObjectRepository(str(root))
+    assert repo.exists("old")
+    assert repo.load("old").data == {"a": 1}
+    assert repo.load_metadata("old") == {"m": 1}
@@ -0,0 +1,47 @@
+from ddolib import DigitalObject, DigitalObjectRepository, DDOInstance, IdentifierResolutionService
+from ddolib import serialization
+from ddolib.identifiers import SequentialIdGenerator
+
+
+def test_sequential_ids_are_unique_and_sorted():
+    ids = SequentialIdGenerator(node_id=1).generate_many(10000)
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_ddo_instance_defaults_to_collision_free_ids(db_url):
+    instance = DDOInstance(repo_url=db_url)
+    assert instance.IRS.mode == "sequential"
+    client = instance.create_app().test_client()
+    responses = [client.post("/create", json={"data": 7, "metadata": {}}) for _ in range(3)]
+    assert [response.status_code for response in responses] == [201, 201, 201]
+    assert len({response.get_json()["doid"] for response in responses}) == 3
+
+
+def test_content_doid_is_hashed_from_the_written_bytes(db_url, monkeypatch):
+    repo = DigitalObjectRepository(db_url)
+    irs = IdentifierResolutionService(repo, mode="content")
+    expected = irs.generate({"x": 1}, {"kind": "a"})
+    calls = []
+    encode = serialization.encode
+    monkeypatch.setattr(serialization, "encode", lambda *args: calls.append(args) or encode(*args))
+    do = DigitalObject({"x": 1}, {"kind": "a"})
+    assert repo.save(do, content_id=True)
+    assert do.doid == expected
+    assert len(calls) == 1
+    assert repo.load(expected).data == {"x": 1}
+
+
+def test_content_doid_includes_metadata(db_url):
+    repo = DigitalObjectRepository(db_url)
+    first, second = DigitalObject(1, {"kind": "a"}), DigitalObject(1, {"kind": "b"})
+    result = repo.save_many([first, second], content_ids=True)
+    assert sorted(result.succeeded) == sorted([first.doid, second.doid])
+    assert first.doid != second.doid
+
+
+def test_content_mode_instance_saves_under_content_doid(db_url):
+    instance = DDOInstance(repo_url=db_url, id_mode="content")
+    client = instance.create_app().test_client()
+    doid = client.post("/create", json={"data": [1, 2], "metadata": {"m": 1}}).get_json()["doid"]
+    assert doid == instance.IRS.generate([1, 2], {"m": 1})
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from sqlalchemy import event
+
+from ddolib import DigitalObject, DigitalObjectRepository
+from ddolib.core import LazyDigitalObject
+
+
+def record_statements(repo):
+    statements = []
+    event.listen(repo.get_engine(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def reads_payload(statement):
+    return "digital_objects.data" in statement or "chunks" in statement
+
+
+def test_lazy_load_defers_the_payload(db_url, caplog):
+    repo = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject({"big": list(range(100))}, {"m": 1}, "x"))
+    statements = record_statements(repo)
+    do = repo.load("x", lazy=True)
+    assert isinstance(do, LazyDigitalObject) and not do.loaded
+    assert do.doid == "x" and do.metadata == {"m": 1}
+    str(do)
+    assert statements and not any(reads_payload(sql) for sql in statements)
+    assert do.data == {"big": list(range(100))}
+    assert do.loaded and any(reads_payload(sql) for sql in statements)
+    count = len(statements)
+    assert do.data["big"][-1] == 99
+    assert len(statements) == count
+    with caplog.at_level(logging.CRITICAL):
+        assert repo.load("missing", lazy=True) is False
+
+
+def test_metadata_and_exists_never_read_the_payload(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject(b"x" * 10000, {"kind": "raw"}, "x"))
+    statements = record_statements(repo)
+    assert repo.load_metadata("x") == {"kind": "raw"}
+    assert repo.load_metadata("missing") is None
+    assert repo.exists("x") and not repo.exists("missing")
+    assert not any(reads_payload(sql) for sql in statements)
+
+
+def test_deleted_object_raises_on_first_access(db_url, caplog):
+    repo = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject(1, {}, "x"))
+    do = repo.load("x", lazy=True)
+    repo.delete("x")
+    with caplog.at_level(logging.CRITICAL), pytest.raises(LookupError):
+        do.data
+
+
+@pytest.mark.parametrize("store", ["sql", "files"])
+def test_list_objects_pages_lazy_handles(store, db_url, tmp_path):
+    repo = DigitalObjectRepository(db_url if store == "sql" else str(tmp_path / "store"))
+    repo.save_many([DigitalObject(i, {"i": i}, f"d{i}") for i in range(5)])
+    handles = list(repo.list_objects(order_by="i", batch_size=2))
+    assert [do.doid for do in handles] == [f"d{i}" for i in range(5)]
+    assert not any(do.loaded for do in handles)
+    assert [do.data for do in handles] == list(range(5))
+    assert [do.doid for do in repo.list_objects(filters={"i": 3})] == ["d3"]
@@ -0,0 +1,34 @@
+import pytest
+
+from ddolib import DigitalObjectRepository, Relationship
+
+
+@pytest.fixture(params=["sql", "files"])
+def repo(request, db_url, tmp_path):
+    repo = DigitalObjectRepository(db_url if request.param == "sql" else str(tmp_path / "store"))
+    # a -> b -> d -> e -> g -> a is a cycle; c also feeds b and d also produces f.
+    Relationship(["a", "c"], ["b"], {"func": "merge"}, repo=repo)
+    Relationship(["b"], ["d"], {}, repo=repo)
+    Relationship(["d"], ["e", "f"], {"func": "split"}, repo=repo)
+    Relationship(["e"], ["g"], {}, repo=repo)
+    Relationship(["g"], ["a"], {}, repo=repo)
+    return repo
+
+
+def test_downstream_levels_and_depth(repo):
+    assert repo.downstream("b") == {"d": 1, "e": 2, "f": 2, "g": 3, "a": 4}
+    assert repo.downstream("b", depth=2) == {"d": 1, "e": 2, "f": 2}
+    assert repo.downstream("f") == {}
+
+
+def test_upstream_levels_and_depth(repo):
+    assert repo.upstream("d") == {"b": 1, "a": 2, "c": 2, "g": 3, "e": 4}
+    assert repo.upstream("d", depth=1) == {"b": 1}
+    assert repo.upstream("c") == {}
+
+
+def test_shortest_path(repo):
+    assert repo.shortest_path("c", "f") == ["c", "b", "d", "f"]
+    assert repo.shortest_path("e", "b") == ["e", "g", "a", "b"]
+    assert repo.shortest_path("f", "c") is None
+    assert repo.shortest_path("b", "b") == ["b"]
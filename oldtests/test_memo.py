@@ -0,0 +1,67 @@
+from ddolib import DataDigitalObject, DDOInstance, DigitalObject
+from ddolib.memo import value_hash
+
+
+def counting(instance, metadata, calls):
+    @instance.DDO(metadata, memoize=True)
+    def total(values):
+        calls.append(values)
+        data = values.data if isinstance(values, DigitalObject) else values
+        return sum(data)
+    return total
+
+
+def test_repeated_call_is_answered_without_recomputing(db_url):
+    calls = []
+    total = counting(DDOInstance(repo_url=db_url), {"kind": "sum"}, calls)
+    first = total([1, 2, 3])
+    second = total([1, 2, 3])
+    assert len(calls) == 1
+    assert first.doid == second.doid and second.data == 6
+    assert total.memo.stats()["hits"] == 1
+
+
+def test_repository_hit_returns_a_data_digital_object(db_url):
+    total = counting(DDOInstance(repo_url=db_url), {"kind": "sum"}, [])
+    computed = total([4, 5])
+    calls = []
+    restarted = counting(DDOInstance(repo_url=db_url), {"kind": "sum"}, calls)
+    stored = restarted([4, 5])
+    assert calls == []
+    assert type(stored) is type(computed) is DataDigitalObject
+    assert stored.doid == computed.doid
+
+
+def test_updated_digital_object_argument_is_recomputed(db_url):
+    instance = DDOInstance(repo_url=db_url)
+    calls = []
+    total = counting(instance, {"kind": "sum"}, calls)
+    assert instance.repo.save(DigitalObject([1, 1], {}, "input"))
+    assert total(instance.repo.load("input")).data == 2
+    assert instance.repo.update("input", DigitalObject([5, 5], {}))
+    assert total(instance.repo.load("input")).data == 10
+    assert len(calls) == 2
+
+
+def test_decorator_metadata_is_part_of_the_key(db_url):
+    instance = DDOInstance(repo_url=db_url)
+    first = counting(instance, {"kind": "a"}, [])([1])
+    second = counting(instance, {"kind": "b"}, [])([1])
+    assert first.doid != second.doid
+    assert second.metadata["kind"] == "b"
+
+
+def test_tuples_and_lists_are_different_arguments():
+    assert value_hash((1, 2)) != value_hash([1, 2])
+    assert value_hash({"a": (1,)}) != value_hash({"a": [1]})
+    assert value_hash([1, 2]) == value_hash([1, 2])
+
+
+def test_invalidate_forces_recomputation(db_url):
+    calls = []
+    total = counting(DDOInstance(repo_url=db_url), {"kind": "sum"}, calls)
+    total([7])
+    assert total.memo.invalidate([7])
+    total([7])
+    assert len(calls) == 2
+    assert total.memo.clear(persistent=True) == 1
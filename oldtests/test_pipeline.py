@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from ddolib import DigitalObject, DigitalObjectRepository
+from ddolib.pipeline import Pipeline
+
+
+@pytest.fixture(params=["sql", "files"])
+def repo(request, db_url, tmp_path):
+    return DigitalObjectRepository(db_url if request.param == "sql" else str(tmp_path / "store"))
+
+
+def build(repo, calls):
+    pipeline = Pipeline(repo, "demo")
+
+    @pipeline.FDO(["raw"], ["clean"], "clean raw")
+    def clean(raw):
+        calls.append("clean")
+        return [abs(x) for x in raw]
+
+    @pipeline.FDO(["clean"], ["total", "count"])
+    def stats(values):
+        calls.append("stats")
+        return sum(values), len(values)
+
+    @pipeline.FDO(["total", "count"], ["mean"])
+    def mean(total, count):
+        calls.append("mean")
+        return total / count
+
+    return pipeline
+
+
+def test_second_run_skips_everything(repo):
+    calls = []
+    pipeline = build(repo, calls)
+    pipeline.source("raw", [1, -2, 3])
+    assert pipeline.plan().stale == ["clean", "stats", "mean"]
+    assert pipeline.run().results["mean"].data == 2.0
+    calls.clear()
+    report = pipeline.run()
+    assert calls == [] and report.stale == []
+    assert report.results["mean"].data == 2.0
+    # Writing the same source value again does not make anything stale.
+    pipeline.source("raw", [1, -2, 3])
+    assert pipeline.plan().stale == []
+
+
+def test_changed_source_reruns_only_what_changed(repo):
+    calls = []
+    pipeline = build(repo, calls)
+    pipeline.source("raw", [1, -2, 3])
+    pipeline.run()
+    calls.clear()
+    pipeline.source("raw", [-1, 2, 3])
+    assert pipeline.plan().stale == ["clean", "stats", "mean"]
+    # clean produces the same list, so the steps after it are skipped at run time.
+    report = pipeline.run()
+    assert calls == ["clean"] and report.stale == ["clean"]
+    calls.clear()
+    pipeline.source("raw", [1, 2, 4])
+    assert pipeline.run().results["mean"].data == 7 / 3
+    assert calls == ["clean", "stats", "mean"]
+
+
+def test_modified_output_makes_its_step_stale(repo):
+    calls = []
+    pipeline = build(repo, calls)
+    pipeline.source("raw", [1, -2, 3])
+    pipeline.run()
+    repo.update("demo.total", DigitalObject(99, {}))
+    plan = build(repo, []).plan()
+    assert plan.steps["stats"]["reasons"] == ["output total was modified"]
+    assert plan.stale == ["stats", "mean"]
+    calls.clear()
+    assert pipeline.run().results["total"].data == 6
+    # stats restores the total mean last read, so mean is skipped.
+    assert calls == ["stats"]
+
+
+def test_parallel_run_matches_sequential_run(repo):
+    calls = []
+    pipeline = build(repo, calls)
+    pipeline.source("raw", [1, -2, 3])
+    report = pipeline.run_parallel(processes=0, threads=2)
+    assert report.ok and report.results["mean"].data == 2.0
+    assert report.critical_path == ["clean", "stats", "mean"]
+    assert sorted(calls) == ["clean", "mean", "stats"]
+    calls.clear()
+    assert pipeline.run_parallel(processes=0).stale == [] and calls == []
+
+
+def test_failing_step_cancels_its_dependents(repo):
+    pipeline = build(repo, [])
+
+    @pipeline.FDO(["mean"], ["broken"])
+    def broken(mean):
+        raise ValueError("bad step")
+
+    @pipeline.FDO(["broken"], ["after"])
+    def after(value):
+        return value
+
+    pipeline.source("raw", [1, -2, 3])
+    report = pipeline.run_parallel(processes=0, fail_fast=False)
+    assert not report.ok
+    assert report.steps["broken"]["status"] == "failed"
+    assert report.steps["after"]["status"] == "cancelled"
+    assert report.steps["mean"]["status"] == "ran"
+
+
+def test_process_pool_runs_independent_steps_concurrently(db_url):
+    pipeline = Pipeline(DigitalObjectRepository(db_url), "demo")
+
+    @pipeline.FDO(["raw"], ["left"])
+    def left(raw):
+        time.sleep(0.5)
+        return [x * 2 for x in raw]
+
+    @pipeline.FDO(["raw"], ["right"])
+    def right(raw):
+        time.sleep(0.5)
+        return [x + 1 for x in raw]
+
+    pipeline.source("raw", [1, 2])
+    report = pipeline.run_parallel(processes=2, threads=1)
+    assert report.ok
+    steps = report.steps
+    assert steps["left"]["start"] < steps["right"]["end"] and steps["right"]["start"] < steps["left"]["end"]
+    stored = DigitalObjectRepository(db_url)
+    assert stored.load(pipeline.doid("left")).data == [2, 4]
+    assert stored.load(pipeline.doid("right")).data == [2, 3]
@@ -0,0 +1,29 @@
+from ddolib import DigitalObject, DigitalObjectRepository
+
+
+def make_repo(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject(i, {"author": f"a{i % 3}", "year": 2000 + i}, f"doid-{i:03d}")
+                    for i in range(30)])
+    return repo
+
+
+def test_query_filters_and_pages(db_url):
+    repo = make_repo(db_url)
+    first = repo.query({"author": "a1"}, limit=4)
+    assert [doid for doid, _ in first] == ["doid-001", "doid-004", "doid-007", "doid-010"]
+    rest = repo.query({"author": "a1"}, cursor=first.cursor)
+    assert len(first) + len(rest) == 10
+    assert [doid for doid, _ in repo.query({"year": (">=", 2028)})] == ["doid-028", "doid-029"]
+
+
+def test_explain_reports_metadata_index_only_when_declared(db_url):
+    repo = make_repo(db_url)
+    unindexed = repo.explain({"author": "a1"})
+    assert unindexed["indexes"] == []
+    assert repo.create_metadata_index("author")
+    indexed = repo.explain({"author": "a1"})
+    assert indexed["indexes"] == ["ix_metadata_author"]
+    assert repo.metadata_indexes() == ["author"]
+    assert repo.drop_metadata_index("author")
+    assert repo.explain({"author": "a1"})["indexes"] == []
@@ -0,0 +1,44 @@
+import time
+
+from sqlalchemy import event
+
+from ddolib import DigitalObjectRepository, Relationship
+
+
+def test_buffer_flushes_on_size_and_on_exit(db_url):
+    repo = DigitalObjectRepository(db_url)
+    statements = []
+    event.listen(repo.get_engine(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with repo.relationship_buffer(batch_size=3, flush_interval=None) as buffer:
+        for i in range(5):
+            Relationship([f"in{i}"], [f"out{i}"], {"i": i}, buffer=buffer)
+            assert len(buffer) == (i + 1) % 3
+        # One insert into each of the two relationship tables for the full batch.
+        assert len([sql for sql in statements if sql.startswith("INSERT")]) == 2
+        assert len(repo.relationships()) == 3
+    assert len(buffer) == 0
+    assert sorted(relationship.metadata["i"] for relationship in repo.relationships()) == [0, 1, 2, 3, 4]
+
+
+def test_buffer_flushes_after_the_interval(db_url):
+    repo = DigitalObjectRepository(db_url)
+    buffer = repo.relationship_buffer(batch_size=100, flush_interval=0.05)
+    Relationship(["a"], ["b"], {}, buffer=buffer)
+    Relationship(["b"], ["c"], {}, buffer=buffer)
+    deadline = time.monotonic() + 5
+    while len(buffer) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(buffer) == 0
+    assert repo.relationships(to_doids=["c"]).edges() == [("b", "c")]
+    assert buffer.flush() == 0
+    buffer.close()
+
+
+def test_unpersisted_relationships_are_added_later(tmp_path):
+    repo = DigitalObjectRepository(str(tmp_path / "store"))
+    relationship = Relationship(["a"], ["b"], {}, persist=False)
+    assert len(repo.relationships()) == 0
+    with repo.relationship_buffer() as buffer:
+        buffer.add(relationship)
+        assert len(repo.relationships()) == 0
+    assert [r.doid for r in repo.relationships()] == [relationship.doid]
@@ -0,0 +1,68 @@
+import math
+
+import dill
+import pytest
+from sqlalchemy import select, update
+
+from ddolib import DigitalObject, DigitalObjectRepository, serialization
+from ddolib.schema import digital_objects_table
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def test_auto_selects_the_cheapest_codec_that_round_trips():
+    cases = [
+        (b"raw", "bytes"),
+        ({"a": [1, 2.5, None, "s", True]}, "json"),
+        ((1, 2), "pickle"),
+        ({1: "int key"}, "pickle"),
+        (math.nan, "pickle"),
+        (Point(1, 2), "pickle"),
+        (lambda x: x + 1, "dill"),
+    ]
+    for value, expected in cases:
+        codec, payload = serialization.encode(value)
+        assert codec == expected, value
+        decoded = serialization.decode(payload, codec)
+        if expected == "dill":
+            assert decoded(1) == 2
+        elif isinstance(value, Point):
+            assert (decoded.x, decoded.y) == (1, 2)
+        elif value is math.nan:
+            assert math.isnan(decoded)
+        else:
+            assert decoded == value and type(decoded) is type(value)
+
+
+def test_explicit_and_unknown_codecs():
+    assert serialization.encode({"a": 1}, "dill")[0] == "dill"
+    with pytest.raises(ValueError):
+        serialization.encode(1, "nope")
+    with pytest.raises(ValueError):
+        serialization.decode(b"", "nope")
+
+
+def test_repository_stores_the_codec_with_each_row(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject({"a": 1}, {}, "j"), DigitalObject((1, 2), {}, "p"),
+                    DigitalObject(b"b", {}, "b")])
+    with repo.get_engine().connect() as connection:
+        codecs = dict(connection.execute(
+            select(digital_objects_table.c.doid, digital_objects_table.c.codec)).fetchall())
+    assert codecs == {"j": "json", "p": "pickle", "b": "bytes"}
+    assert [do.data for do in repo.load_many(["j", "p", "b"])] == [{"a": 1}, (1, 2), b"b"]
+    pickled = DigitalObjectRepository(db_url, codec="pickle")
+    pickled.save(DigitalObject({"a": 1}, {}, "forced"))
+    assert pickled.load("forced").data == {"a": 1}
+
+
+def test_rows_without_a_codec_are_read_as_dill(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save(DigitalObject(0, {}, "legacy"))
+    with repo.get_engine().begin() as connection:
+        connection.execute(update(digital_objects_table).where(digital_objects_table.c.doid == "legacy").values(
+            data=dill.dumps({"written": "before codecs"}), codec=None))
+    assert DigitalObjectRepository(db_url).load("legacy").data == {"written": "before codecs"}
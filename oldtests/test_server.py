@@ -0,0 +1,134 @@
+import json
+import re
+
+import pytest
+from sqlalchemy import create_engine, select, update
+
+from ddolib import DDOInstance, DigitalObject, DigitalObjectRepository
+from ddolib.engine import EngineRegistry
+from ddolib.schema import digital_objects_table, schema_version_table
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def make_client(db_url, **options):
+    return DDOInstance(repo_url=db_url, **options).create_app().test_client()
+
+
+def test_batch_create_accepts_duplicate_payloads(db_url):
+    client = make_client(db_url)
+    lines = ndjson(client.post("/batch/create", json={"objects": [{"data": 7, "metadata": {}}] * 3}))
+    assert [line["status"] for line in lines] == [201, 201, 201]
+    assert len({line["doid"] for line in lines}) == 3
+
+
+def test_batch_create_uses_the_id_mode_of_create(db_url):
+    client = make_client(db_url, id_mode="content")
+    single = client.post("/create", json={"data": 7, "metadata": {"k": 1}}).get_json()["doid"]
+    objects = [{"data": 8, "metadata": {}}, {"data": 8, "metadata": {}}, {"data": 7, "metadata": {"k": 1}}]
+    lines = ndjson(client.post("/batch/create", json={"objects": objects}))
+    assert [line["status"] for line in lines] == [201, 500, 500]
+    assert lines[0]["doid"] == lines[1]["doid"] and lines[0]["doid"].startswith("sha256-")
+    assert lines[2]["doid"] == single
+
+
+def test_batch_create_in_hash_mode(tmp_path):
+    client = make_client(f"sqlite:///{tmp_path / 'hash.db'}", id_mode="hash")
+    single = client.post("/create", json={"data": 1, "metadata": {}}).get_json()["doid"]
+    lines = ndjson(client.post("/batch/create", json={"objects": [{"data": 2, "metadata": {}}]}))
+    assert lines[0]["status"] == 201
+    assert re.fullmatch(r"\d+_[0-9a-f]{64}", single) and re.fullmatch(r"\d+_[0-9a-f]{64}", lines[0]["doid"])
+
+
+def test_batch_endpoints_report_per_item_status(db_url):
+    client = make_client(db_url)
+    body = "\n".join(json.dumps(item) for item in [{"data": 1, "metadata": {}}, {"data": 2}, "bad"])
+    created = ndjson(client.post("/batch/create", data=body, content_type="application/x-ndjson"))
+    assert [line["status"] for line in created] == [201, 400, 400]
+    doid = created[0]["doid"]
+    retrieved = ndjson(client.post("/batch/retrieve", json={"doids": [doid, "missing", 3]}))
+    assert [line["status"] for line in retrieved] == [200, 404, 400]
+    assert retrieved[0]["data"] == 1
+    deleted = ndjson(client.post("/batch/delete", json={"doids": [doid, doid]}))
+    assert [line["status"] for line in deleted] == [200, 404]
+    assert client.post("/batch/create", json={"wrong": []}).status_code == 400
+
+
+def test_binary_objects_redirect_to_the_stream_endpoint(db_url, monkeypatch):
+    instance = DDOInstance(repo_url=db_url)
+    assert instance.repo.save_stream("blob", [b"a" * 10, b"b" * 10], chunk_size=8)
+    assert instance.repo.save(DigitalObject(b"raw", {}, "raw"))
+    client = instance.create_app().test_client()
+
+    def load(*args, **kwargs):
+        raise AssertionError("the payload was loaded")
+    monkeypatch.setattr(instance.repo, "load", load)
+    assert client.get("/retrieve/raw").status_code == 303
+    response = client.get("/retrieve/blob")
+    assert response.status_code == 303
+    assert response.headers["Location"].endswith("/retrieve/blob/stream")
+    streamed = client.get("/retrieve/blob/stream", headers={"Range": "bytes=5-14"})
+    assert streamed.status_code == 206
+    assert streamed.data == b"a" * 5 + b"b" * 5
+
+
+def legacy_etags(db_url, version=None):
+    # Clears the stored etags, as in a database written before they existed.
+    repo = DigitalObjectRepository(db_url, engines=EngineRegistry())
+    with repo.get_engine().begin() as connection:
+        connection.execute(update(digital_objects_table).values(etag=None))
+        if version is not None:
+            connection.execute(update(schema_version_table).values(version=version))
+    repo.close()
+
+
+def stored_etags(db_url):
+    with create_engine(db_url).connect() as connection:
+        return connection.execute(select(digital_objects_table.c.etag)).scalars().all()
+
+
+def test_migration_backfills_etags(db_url):
+    repo = DigitalObjectRepository(db_url, engines=EngineRegistry())
+    repo.save(DigitalObject({"a": 1}, {"m": 1}, "x"))
+    repo.save_stream("s", [b"abc", b"def"], chunk_size=3)
+    expected = [repo.get_etag("s"), repo.get_etag("x")]
+    repo.close()
+    legacy_etags(db_url, version=7)
+    DigitalObjectRepository(db_url, engines=EngineRegistry()).close()
+    assert sorted(stored_etags(db_url)) == sorted(expected)
+
+
+def test_retrieve_does_not_write_missing_etags(db_url):
+    instance = DDOInstance(repo_url=db_url, engines=EngineRegistry())
+    instance.repo.save(DigitalObject({"a": 1}, {}, "x"))
+    etag = instance.repo.get_etag("x")
+    legacy_etags(db_url)
+    client = instance.create_app().test_client()
+    response = client.get("/retrieve/x")
+    assert response.status_code == 200 and response.headers["ETag"] == f'"{etag}"'
+    assert client.get("/retrieve/x", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+    assert stored_etags(db_url) == [None]
+
+
+@pytest.mark.parametrize("store", ["sql", "files"])
+def test_conditional_requests(db_url, tmp_path, store):
+    client = make_client(db_url if store == "sql" else str(tmp_path / "store"))
+    doid = client.post("/create", json={"data": 1, "metadata": {}}).get_json()["doid"]
+    first = client.get(f"/retrieve/{doid}")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    revalidated = client.get(f"/retrieve/{doid}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.data == b""
+
+    updated = client.put(f"/update/{doid}", json={"data": 2, "metadata": {}}, headers={"If-Match": etag})
+    assert updated.status_code == 200 and updated.headers["ETag"] != etag
+    # The client's copy is stale now: a conditional update is refused and a revalidation returns the new copy.
+    stale = client.put(f"/update/{doid}", json={"data": 3, "metadata": {}}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    refreshed = client.get(f"/retrieve/{doid}", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.get_json()["data"] == 2
+    assert refreshed.headers["ETag"] == updated.headers["ETag"]
+    missing = client.put("/update/missing", json={"data": 3, "metadata": {}}, headers={"If-Match": etag})
+    assert missing.status_code == 404
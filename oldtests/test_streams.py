@@ -0,0 +1,29 @@
+from ddolib import DigitalObject, DigitalObjectRepository
+
+
+def test_save_stream_round_trip(db_url):
+    repo = DigitalObjectRepository(db_url)
+    payload = bytes(range(256)) * 40
+    assert repo.save_stream("s", (payload[i:i + 1000] for i in range(0, len(payload), 1000)), chunk_size=4096)
+    assert repo.load("s").data == payload
+    assert repo.read_range("s", 5000, 100) == payload[5000:5100]
+
+
+def test_raw_payload_column_is_read_in_ranges(db_url, monkeypatch):
+    monkeypatch.setattr("ddolib.core.DEFAULT_CHUNK_SIZE", 64)
+    repo = DigitalObjectRepository(db_url)
+    payload = bytes(range(256)) * 4
+    assert repo.save(DigitalObject(payload, {}, "raw"))
+    monkeypatch.setattr(repo, "load", lambda *args, **kwargs: None)
+    reader = repo.open_stream("raw")
+    assert reader.raw.size == len(payload)
+    reader.seek(100)
+    assert reader.read(200) == payload[100:300]
+    assert reader.raw._current == payload[256:320]
+
+
+def test_non_bytes_objects_are_not_streamed(db_url):
+    repo = DigitalObjectRepository(db_url)
+    assert repo.save(DigitalObject({"a": 1}, {}, "json"))
+    assert repo.open_stream("json") is None
+    assert repo.open_stream("missing") is None
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from ddolib import DigitalObject, DigitalObjectRepository, Relationship
+
+
+def test_writes_commit_together(db_url):
+    repo = DigitalObjectRepository(db_url, cache=True)
+    with repo.transaction():
+        assert repo.save(DigitalObject(1, {}, "a"))
+        # Reads in the block see its uncommitted writes.
+        assert repo.load("a").data == 1
+        Relationship(["a"], ["b"], {"k": 1}, url=db_url)
+        assert repo.save(DigitalObject(2, {}, "b"))
+    assert repo.load("b").data == 2
+    assert len(repo.relationships()) == 1
+
+
+def test_failed_write_rolls_back_the_whole_unit(db_url, caplog):
+    repo = DigitalObjectRepository(db_url, cache=True)
+    repo.save(DigitalObject(1, {}, "a"))
+    Relationship(["a"], ["b"], {}, repo=repo)
+    with caplog.at_level(logging.CRITICAL), pytest.raises(IntegrityError):
+        with repo.transaction():
+            repo.save(DigitalObject(3, {}, "c"))
+            repo.update("a", DigitalObject(10, {}))
+            assert repo.load("a").data == 10
+            Relationship(["c"], ["a"], {}, repo=repo)
+            repo.save(DigitalObject(4, {}, "a"))
+    assert not repo.exists("c")
+    # The cache must not keep the rolled back update either.
+    assert repo.load("a").data == 1
+    assert len(repo.relationships()) == 1
+    # Outside a transaction a failing save still returns False.
+    with caplog.at_level(logging.CRITICAL):
+        assert repo.save(DigitalObject(4, {}, "a")) is False
+
+
+def test_exception_in_block_rolls_back(db_url):
+    repo = DigitalObjectRepository(db_url)
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.save(DigitalObject(1, {}, "a"))
+            raise RuntimeError("abort")
+    assert not repo.exists("a")
+
+
+def test_nested_transaction_joins_the_outer_one(db_url):
+    repo = DigitalObjectRepository(db_url)
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            with repo.transaction():
+                repo.save(DigitalObject(5, {}, "e"))
+            assert repo.exists("e")
+            raise RuntimeError("abort")
+    assert not repo.exists("e")
+
+
+def test_file_store_has_no_transactions(tmp_path):
+    with pytest.raises(ValueError):
+        DigitalObjectRepository(str(tmp_path / "store")).transaction()
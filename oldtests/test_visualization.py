@@ -0,0 +1,56 @@
+import os
+import re
+
+import ddolib
+from ddolib import DigitalObject, DigitalObjectRepository, Relationship
+from ddolib.visualization import NetworkRenderer
+
+
+def make_repo(db_url):
+    repo = DigitalObjectRepository(db_url)
+    repo.save_many([DigitalObject(i, {"step": i}, f"doid-{i}") for i in range(4)])
+    for i in range(3):
+        Relationship([f"doid-{i}"], [f"doid-{i + 1}"], {"func": "f"}, repo=repo)
+    return repo
+
+
+def test_unchanged_network_is_not_read_again(db_url, tmp_path, monkeypatch):
+    repo = make_repo(db_url)
+    renderer = NetworkRenderer(repo, cache_dir=str(tmp_path / "cache"))
+    path = str(tmp_path / "network.html")
+    first = renderer.render(path, show_ddo_metadata=True)
+    assert first["written"] and first["nodes"] == 5
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the graph was read again")
+    monkeypatch.setattr(renderer, "graph", fail)
+    second = renderer.render(path, show_ddo_metadata=True)
+    assert second == dict(first, placed=0, fragments=0, written=False)
+    monkeypatch.undo()
+
+    Relationship(["doid-3"], ["doid-4"], {"func": "f"}, repo=repo)
+    third = renderer.render(path, show_ddo_metadata=True)
+    assert third["written"] and third["nodes"] == 6 and third["placed"] == 1
+
+    # A metadata change of a displayed object is picked up as well.
+    assert repo.update("doid-0", DigitalObject(0, {"step": "first"}, "doid-0"))
+    fourth = renderer.render(path, show_ddo_metadata=True)
+    assert fourth["written"] and fourth["placed"] == 0
+    with open(path, encoding="utf-8") as file:
+        assert "first" in file.read()
+
+
+def test_page_is_self_contained(db_url, tmp_path):
+    # show.py embeds the page as an iframe srcdoc, where neither relative nor offline URLs load.
+    renderer = NetworkRenderer(make_repo(db_url))
+    path = str(tmp_path / "network.html")
+    renderer.render(path)
+    with open(path, encoding="utf-8") as file:
+        page = file.read()
+    assert not re.search(r"<(script|link|img)\b[^>]*\b(src|href)\s*=", page)
+    assert all(url.startswith("data:") for url in re.findall(r"""url\(["']?([^"')]*)""", page))
+    # vis-network itself is inlined.
+    with open(os.path.join(os.path.dirname(ddolib.__file__), "lib", "vis-9.1.2", "vis-network.min.js"),
+              encoding="utf-8") as file:
+        assert file.read()[:1000] in page
+    assert not os.path.exists(tmp_path / "lib")
@@ -0,0 +1,29 @@
+import os
+from setuptools import setup, find_packages
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_requirements():
+    with open(os.path.join(HERE, "requirements.txt")) as f:
+        # uuid is part of the standard library; the PyPI package of that name is an obsolete backport.
+        return [line.strip() for line in f if line.strip() and line.strip() != "uuid"]
+
+
+setup(
+    name="ddolib",
+    version="0.1.0",
+    packages=find_packages(include=["ddolib", "ddolib.*"]),
+    package_data={"ddolib": ["network.html", "lib/*/*"]},
+    install_requires=read_requirements(),
+    extras_require={
+        # AsyncDigitalObjectRepository: SQLAlchemy's asyncio engine and the async drivers.
+        "async": ["aiosqlite", "aiomysql", "greenlet"],
+        # The orjson serialization codec.
+        "fast": ["orjson"],
+        # DDOInstance.start_server(environment='production', workers>1).
+        "server": ["gunicorn"],
+        "test": ["pytest"],
+    },
+    python_requires=">=3.8",
+)